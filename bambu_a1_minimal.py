@@ -22,6 +22,8 @@ import sys
 import signal
 import paho.mqtt.client as mqtt
 
+from bambu_state import PrinterStatus
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_PORT = 8883
@@ -33,6 +35,8 @@ TOPIC_REPORT = f"device/{PRINTER_SERIAL}/report"
 TOPIC_REQUEST = f"device/{PRINTER_SERIAL}/request"
 
 connected = False
+# Partial reports only carry the fields that moved; this keeps the rest
+status = PrinterStatus()
 
 
 def on_connect(client, userdata, flags, rc):
@@ -61,12 +65,8 @@ def on_message(client, userdata, msg):
         payload = json.loads(msg.payload.decode())
         
         # Print status updates
-        if 'print' in payload:
-            p = payload['print']
-            state = p.get('gcode_state', 'unknown')
-            progress = p.get('mc_percent', 0)
-            layer = p.get('layer_num', 0)
-            print(f"[STATUS] State: {state}, Progress: {progress}%, Layer: {layer}")
+        if status.update(payload):
+            print(f"[STATUS] State: {status.state}, Progress: {status.progress}%, Layer: {status.layer}")
             
     except Exception as e:
         print(f"[ERROR] {e}")
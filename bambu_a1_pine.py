@@ -3,6 +3,7 @@
 Bambu Lab A1 - DEFINITIVE MINIMAL WORKING SCRIPT (Pine A64 Version)
 
 This version downloads the cert automatically or uses a local path.
+Copy bambu_state.py next to it when deploying.
 """
 
 import json
@@ -13,6 +14,8 @@ import os
 import urllib.request
 import paho.mqtt.client as mqtt
 
+from bambu_state import PrinterStatus
+
 # ==================== CONFIGURATION ====================
 PRINTER_IP = "192.168.1.140"
 PRINTER_PORT = 8883
@@ -38,6 +41,9 @@ if not os.path.exists(CERT_FILE):
 TOPIC_REPORT = f"device/{PRINTER_SERIAL}/report"
 TOPIC_REQUEST = f"device/{PRINTER_SERIAL}/request"
 
+# Partial reports only carry the fields that moved; this keeps the rest
+status = PrinterStatus()
+
 
 def on_connect(client, userdata, flags, rc):
     """Called when connected - subscribe here!"""
@@ -63,19 +69,11 @@ def on_message(client, userdata, msg):
     try:
         payload = json.loads(msg.payload.decode())
         
-        # Print print status
-        if 'print' in payload:
-            p = payload['print']
-            state = p.get('gcode_state', 'unknown')
-            progress = p.get('mc_percent', 0)
-            layer = p.get('layer_num', 0)
-            total_layers = p.get('total_layer_num', 0)
-            bed_temp = p.get('bed_temper', 0)
-            nozzle_temp = p.get('nozzle_temper', 0)
-            
-            print(f"[STATUS] State: {state} | Progress: {progress}% | "
-                  f"Layer: {layer}/{total_layers} | "
-                  f"Bed: {bed_temp}°C | Nozzle: {nozzle_temp}°C")
+        # Print print status when it changed
+        if status.update(payload):
+            print(f"[STATUS] State: {status.state} | Progress: {status.progress}% | "
+                  f"Layer: {status.layer}/{status.total_layers} | "
+                  f"Bed: {status.bed_temp}°C | Nozzle: {status.nozzle_temp}°C")
             
     except Exception as e:
         print(f"[ERROR] Failed to parse message: {e}")
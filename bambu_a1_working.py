@@ -21,6 +21,7 @@ DISCONNECT CODE 7 EXPLANATION:
   c) Using incorrect client_id format
 """
 
+import asyncio
 import json
 import os
 import ssl
@@ -28,10 +29,18 @@ import sys
 import threading
 import time
 import uuid
+from collections import deque
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+from bambu_commands import DEFAULT_TIMEOUT, CommandTracker
+from bambu_pushall import MAX_AGE, PushallPolicy
+from bambu_ready import ReadyEvent
+from bambu_scheduler import CommandScheduler, merge_key, priority_for
+from bambu_state import PrinterState, PrinterStatus, touches
+from bambu_tls import get_ssl_context
+
 # ==================== CONFIGURATION ====================
 PRINTER_IP = "192.168.1.140"
 PRINTER_PORT = 8883
@@ -46,9 +55,8 @@ CERT_DIR = Path(__file__).parent / "bambu_certs"
 TOPIC_REPORT = f"device/{PRINTER_SERIAL}/report"
 TOPIC_REQUEST = f"device/{PRINTER_SERIAL}/request"
 
-# Commands
-GET_VERSION = {"info": {"sequence_id": "0", "command": "get_version"}}
-PUSH_ALL = {"pushing": {"sequence_id": "0", "command": "pushall"}}
+# Fields shown in the per-message status line
+STATUS_LINE_PATHS = (("print", "gcode_state"), ("print", "mc_percent"), ("print", "layer_num"))
 
 
 class BambuA1Client:
@@ -59,19 +67,81 @@ class BambuA1Client:
     - TLS 1.2 is REQUIRED (not default TLS)
     - Subscribe in on_connect callback
     - Unique client_id with proper format
+    
+    get_status() is lock-free: every change publishes a new PrinterStatus
+    with one reference assignment, so pollers never contend with the MQTT
+    network thread.
+    
+    get_metrics() reports drops, reconnects, time to first report after
+    a drop and the TLS handshake/resumption stats.
+    
+    Readiness is event driven: `connected` and `first_report` are
+    ReadyEvents set from the network thread, so wait_connected() and
+    wait_first_report() (or their *_async variants) wake as soon as the
+    CONNACK or the first report arrives. wait_for_status() blocks until
+    the status changes.
+    
+    send_command() tags each command with its own sequence_id and returns
+    a Future that resolves with the printer's answer (CommandResponse) or
+    fails with CommandTimeout, so several commands can be in flight.
+    Everything outbound goes through a CommandScheduler: rate limited,
+    control commands first, duplicate queued pushalls merged.
+    
+    Pushalls are only sent when the state is incomplete, a report was
+    missed (sequence_id gap) or the last full report is older than
+    pushall_max_age; see bambu_pushall.
     """
     
-    def __init__(self):
+    def __init__(self, ssl_context=None, pushall_max_age=MAX_AGE):
         self.client = None
         self._connected = False
-        self._status = {}
+        self._state = PrinterState()
+        # Serializes writers (network thread, disconnect()); readers never take it
         self._lock = threading.Lock()
+        self._status = PrinterStatus()
+        # Notified whenever a new status is published
+        self._status_changed = threading.Condition(self._lock)
+        self._ssl_context = ssl_context
+        self.commands = CommandTracker()
+        self.scheduler = CommandScheduler(self._publish_payload)
+        self.pushall = PushallPolicy(max_age=pushall_max_age)
+        
+        # Readiness: set on CONNACK 0 / the first report of a connection,
+        # cleared when the connection goes away
+        self.connected = ReadyEvent()
+        self.first_report = ReadyEvent()
+        self._connack = threading.Event()  # any CONNACK, so connect() can fail fast
+        
+        # Reconnect metrics
+        self.drops = 0
+        self.reconnects = 0
+        self.time_to_first_report = deque(maxlen=100)  # seconds, most recent last
+        self._since = None            # when we started waiting for a report
+        self._awaiting_report = False
+    
+    def _set_connected(self, connected):
+        with self._lock:
+            self._connected = connected
+            if self._status.connected != connected:
+                status = self._status.copy()
+                status.connected = connected
+                status.version += 1
+                self._status = status
+                self._status_changed.notify_all()
+        if connected:
+            self.connected.set()
+        else:
+            self.connected.clear()
+            self.first_report.clear()
         
     def on_connect(self, client, userdata, flags, rc):
         """Called when connected to MQTT broker"""
         if rc == 0:
             print(f"[MQTT] Connected successfully (flags={flags})")
-            self._connected = True
+            if self.drops:
+                self.reconnects += 1
+            self._awaiting_report = True
+            self._set_connected(True)
             
             # CRITICAL: Subscribe INSIDE on_connect callback
             print(f"[MQTT] Subscribing to {TOPIC_REPORT}")
@@ -79,11 +149,12 @@ class BambuA1Client:
             
             # Request initial data
             print("[MQTT] Requesting printer status...")
-            self.publish(GET_VERSION)
-            self.publish(PUSH_ALL)
+            self.send_command("info", "get_version").add_done_callback(self._log_response)
+            self.request_pushall()
         else:
             print(f"[MQTT] Connection failed with code: {rc}")
-            self._connected = False
+            self._set_connected(False)
+        self._connack.set()
     
     def on_disconnect(self, client, userdata, rc):
         """Called when disconnected from MQTT broker"""
@@ -91,24 +162,48 @@ class BambuA1Client:
             print("[MQTT] Disconnected cleanly")
         else:
             print(f"[MQTT] Disconnected with error code: {rc}")
-        self._connected = False
+            self.drops += 1
+            self._since = time.monotonic()
+        self._set_connected(False)
+        # Answers to commands sent on this connection won't come on the next
+        self.commands.cancel_all(ConnectionError("connection lost"))
     
     def on_message(self, client, userdata, msg):
         """Handle incoming MQTT messages"""
         try:
+            if self._awaiting_report:
+                self._awaiting_report = False
+                if self._since is not None:
+                    elapsed = time.monotonic() - self._since
+                    self.time_to_first_report.append(elapsed)
+                    print(f"[MQTT] First report {elapsed * 1000:.0f} ms after "
+                          f"{'drop' if self.drops else 'connect()'}")
+                    self._since = None
+            
             payload = msg.payload.decode('utf-8')
             data = json.loads(payload)
             
+            # Deep-merge: partial reports only carry the fields that moved
             with self._lock:
-                self._status.update(data)
+                changed = self._state.merge(data)
+                # Reports are patches, so the status can be updated from this one alone
+                status = self._status.updated(data)
+                if status is not self._status:
+                    self._status = status
+                    self._status_changed.notify_all()
+            # After the merge, so command callbacks see the answer in the state
+            self.commands.match(data)
+            self.first_report.set()
+            
+            self.pushall.observe(data)
+            if self._connected:
+                reason = self.pushall.due(self._state)
+                if reason:
+                    self._send_pushall(reason)
             
-            # Print key status info
-            if 'print' in data:
-                print_data = data['print']
-                state = print_data.get('gcode_state', 'unknown')
-                progress = print_data.get('mc_percent', 0)
-                layer = print_data.get('layer_num', 0)
-                print(f"[STATUS] State: {state}, Progress: {progress}%, Layer: {layer}")
+            # Print key status info when it changed
+            if any(touches(changed, path) for path in STATUS_LINE_PATHS):
+                print(f"[STATUS] State: {status.state}, Progress: {status.progress}%, Layer: {status.layer}")
                 
         except json.JSONDecodeError as e:
             print(f"[ERROR] JSON decode error: {e}")
@@ -116,48 +211,75 @@ class BambuA1Client:
             print(f"[ERROR] Message handling error: {e}")
     
     def publish(self, msg):
-        """Publish a message to the request topic"""
+        """Queue a message for the request topic; the Future resolves to True once sent"""
+        return self.scheduler.publish(json.dumps(msg), priority_for(next(iter(msg), None)))
+    
+    def _publish_payload(self, payload):
         if self.client and self._connected:
-            payload = json.dumps(msg)
             result = self.client.publish(TOPIC_REQUEST, payload)
             return result.rc == 0
         return False
     
-    def create_ssl_context(self):
+    def send_command(self, section, command, timeout=DEFAULT_TIMEOUT, **params):
         """
-        Create SSL context with proper settings for Bambu A1
+        Send {section: {command, sequence_id, **params}} and return a Future
         
-        CRITICAL: Must use TLS 1.2 - A1 doesn't work with default TLS
+        e.g. send_command("print", "pause").result() -> CommandResponse
         """
-        # Create context with TLS 1.2 (REQUIRED for A1)
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.minimum_version = ssl.TLSVersion.TLSv1_2
-        context.maximum_version = ssl.TLSVersion.TLSv1_2
-        
-        # Load Bambu CA certificates
-        cert_files = ["bambu.cert", "bambu_p2s_250626.cert", "bambu_h2c_251122.cert"]
-        certs_loaded = 0
-        for filename in cert_files:
-            cert_path = CERT_DIR / filename
-            if cert_path.exists():
-                try:
-                    context.load_verify_locations(cafile=str(cert_path))
-                    print(f"[SSL] Loaded certificate: {filename}")
-                    certs_loaded += 1
-                except Exception as e:
-                    print(f"[SSL] Failed to load {filename}: {e}")
+        def send(publish):
+            return self.commands.send(publish, section, command, timeout, **params)
+        return self.scheduler.submit(send, priority_for(section), merge_key(section, command))
+    
+    async def send_command_async(self, section, command, timeout=DEFAULT_TIMEOUT, **params):
+        return await asyncio.wrap_future(self.send_command(section, command, timeout, **params))
+    
+    def request_pushall(self, force=False):
+        """
+        Ask for a full report if the state needs one (or `force`).
         
-        if certs_loaded == 0:
-            print("[SSL] WARNING: No certificates loaded, using insecure mode")
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
+        Returns the command's Future, or None if none was sent: the state is
+        complete and fresh, or a pushall is already in flight (wait on
+        self.pushall.pending for that one).
+        """
+        reason = self.pushall.check(self._state, force)
+        if reason:
+            return self._send_pushall(reason)
+        if self.pushall.in_flight:
+            print("[MQTT] Pushall already in flight, not asking again")
         else:
-            # Allow connections even if cert doesn't match hostname exactly
-            context.check_hostname = False
-            # Ignore strict X509 verification (needed for Python 3.13+)
-            context.verify_flags &= ~ssl.VERIFY_X509_STRICT
+            print("[MQTT] State complete and fresh, pushall skipped")
+        return None
+    
+    def _send_pushall(self, reason):
+        print(f"[MQTT] Requesting pushall ({reason})")
+        future = self.send_command("pushing", "pushall")
+        future.add_done_callback(self._pushall_done)
+        return future
+    
+    def _pushall_done(self, future):
+        if future.exception() is None:
+            self.pushall.answered()
+        else:
+            self.pushall.failed()
+        self._log_response(future)
+    
+    def _log_response(self, future):
+        try:
+            response = future.result()
+            print(f"[MQTT] {response.command} answered in {response.latency * 1000:.0f} ms")
+        except Exception as e:
+            print(f"[MQTT] No answer: {e}")
+    
+    def create_ssl_context(self):
+        """
+        SSL context with proper settings for Bambu A1
         
-        return context
+        CRITICAL: Must use TLS 1.2 - A1 doesn't work with default TLS.
+        Built once per process from the pinned CA bundle (see bambu_tls)
+        and shared, so reconnects don't reload certificates. It also
+        resumes the last TLS session on reconnect.
+        """
+        return self._ssl_context or get_ssl_context()
     
     def connect(self):
         """Connect to the Bambu A1 printer"""
@@ -205,17 +327,15 @@ class BambuA1Client:
             
             # Connect to printer
             print(f"[CONNECT] Connecting to {PRINTER_IP}:{PRINTER_PORT}...")
+            self._connack.clear()
+            self._since = time.monotonic()
             self.client.connect(PRINTER_IP, PRINTER_PORT, keepalive=5)
             
             # Start network loop in background thread
             self.client.loop_start()
             
-            # Wait for connection to establish
-            timeout = 10
-            start = time.time()
-            while not self._connected and time.time() - start < timeout:
-                time.sleep(0.1)
-            
+            # Wait for the CONNACK (accepted or refused), up to 10s
+            self._connack.wait(10)
             return self._connected
             
         except Exception as e:
@@ -229,23 +349,51 @@ class BambuA1Client:
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
-        self._connected = False
+        self._set_connected(False)
         print("[DISCONNECT] Disconnected from printer")
     
     def get_status(self):
-        """Get current printer status"""
-        with self._lock:
-            print_data = self._status.get("print", {})
-            return {
-                "connected": self._connected,
-                "state": print_data.get("gcode_state", "unknown"),
-                "progress": print_data.get("mc_percent", 0),
-                "time_remaining": print_data.get("mc_remaining_time", 0),
-                "bed_temp": print_data.get("bed_temper", 0),
-                "nozzle_temp": print_data.get("nozzle_temper", 0),
-                "layer": print_data.get("layer_num", 0),
-                "total_layers": print_data.get("total_layer_num", 0),
-            }
+        """Get current printer status (a shared PrinterStatus - do not modify)"""
+        return self._status
+    
+    @property
+    def status_version(self):
+        return self._status.version
+    
+    def wait_connected(self, timeout=None):
+        """Block until connected. Returns False on timeout."""
+        return self.connected.wait(timeout)
+    
+    def wait_first_report(self, timeout=None):
+        """Block until the current connection has delivered a report. False on timeout."""
+        return self.first_report.wait(timeout)
+    
+    async def wait_connected_async(self, timeout=None):
+        return await self.connected.wait_async(timeout)
+    
+    async def wait_first_report_async(self, timeout=None):
+        return await self.first_report.wait_async(timeout)
+    
+    def wait_for_status(self, version, timeout=None):
+        """Block until the status version differs from `version`; returns the status."""
+        with self._status_changed:
+            self._status_changed.wait_for(lambda: self._status.version != version, timeout)
+            return self._status
+    
+    def get_metrics(self):
+        """Reconnect and TLS metrics (TLS stats are shared by the process' connections)"""
+        ttfr = list(self.time_to_first_report)
+        tls_stats = getattr(self.create_ssl_context(), "stats", None)
+        return {
+            "drops": self.drops,
+            "reconnects": self.reconnects,
+            "last_time_to_first_report_ms": ttfr[-1] * 1000 if ttfr else None,
+            "avg_time_to_first_report_ms": sum(ttfr) / len(ttfr) * 1000 if ttfr else None,
+            "commands": self.commands.stats(),
+            "outbound": self.scheduler.stats(),
+            "pushall": self.pushall.stats(),
+            "tls": tls_stats() if tls_stats else None,
+        }
 
 
 def main():
@@ -279,21 +427,24 @@ def main():
     print()
     
     try:
+        client.wait_first_report(10)
+        status = client.get_status()
         while True:
-            status = client.get_status()
             print(f"\r[{time.strftime('%H:%M:%S')}] "
-                  f"State: {status['state']:<12} "
-                  f"Progress: {status['progress']:>3}% "
-                  f"Layer: {status['layer']}/{status['total_layers']} "
-                  f"Bed: {status['bed_temp']:>3}°C "
-                  f"Nozzle: {status['nozzle_temp']:>3}°C",
+                  f"State: {status.state:<12} "
+                  f"Progress: {status.progress:>3}% "
+                  f"Layer: {status.layer}/{status.total_layers} "
+                  f"Bed: {status.bed_temp:>5.1f}°C "
+                  f"Nozzle: {status.nozzle_temp:>5.1f}°C",
                   end='', flush=True)
-            time.sleep(2)
+            # Redraw when something changes (and every 30s to refresh the clock)
+            status = client.wait_for_status(status.version, timeout=30)
             
     except KeyboardInterrupt:
         print("\n\n[EXIT] Interrupted by user")
     finally:
         client.disconnect()
+        print(f"[EXIT] Metrics: {client.get_metrics()}")
         print("[EXIT] Done")
 
 
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Record and replay raw printer report traffic.
+
+A capture is a gzip file of length-prefixed records, one per MQTT report:
+
+    struct ">dI"  monotonic timestamp (seconds), payload length
+    payload       the raw message bytes, exactly as received
+
+Captures are written by the bridge (scripts/printer_bridge.py --capture
+FILE) and can be appended to across runs. Each run starts with a run
+marker (length RUN_MARKER, wall-clock timestamp, no payload). Monotonic
+clocks are only comparable within a run, so replay restarts its pacing
+at every marker instead of sleeping through the downtime between runs.
+
+Records are buffered and written as one complete gzip member per flush
+(every FLUSH_INTERVAL), so a bridge that is killed loses at most its
+unflushed buffer, plus the member it was writing at the time. The
+reader keeps every complete record, skips a damaged member and carries
+on with the next one, e.g. the next run appended to the same file.
+Replay feeds the records back into any client's on_message() at the
+original pace, N times faster, or as fast as possible, which gives
+repeatable benchmarks of the parse/merge/write pipeline with real A1
+traffic.
+
+Usage:
+    python3 bambu_capture.py info capture.gz
+    python3 bambu_capture.py replay capture.gz [speed|max] [module:Class]
+
+    python3 bambu_capture.py replay a1.gz max printer_bridge:PrinterBridge
+    python3 bambu_capture.py replay a1.gz 10 bambu_a1_working:BambuA1Client
+"""
+
+import gzip
+import importlib
+import struct
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+RECORD_HEADER = struct.Struct(">dI")
+RUN_MARKER = 0xFFFFFFFF  # record length that marks the start of a run
+FLUSH_INTERVAL = 1.0  # seconds; a crash loses at most this much capture
+GZIP_MAGIC = b"\x1f\x8b\x08"  # start of a gzip member (deflate)
+READ_CHUNK = 1 << 20
+DEFAULT_TOPIC = "device/03919c460100975/report"
+DEFAULT_CLIENT = "bambu_a1_working:BambuA1Client"
+
+
+class CaptureWriter:
+    """Appends raw payloads with monotonic timestamps to a gzip capture."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = 0
+        self.bytes = 0
+        self._file = open(self.path, "ab")
+        self._buffer = bytearray(RECORD_HEADER.pack(time.time(), RUN_MARKER))
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def write(self, payload, timestamp=None):
+        now = time.monotonic()
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer += RECORD_HEADER.pack(now if timestamp is None else timestamp, len(payload))
+            self._buffer += payload
+            self.records += 1
+            self.bytes += len(payload)
+            # A member per record would wreck compression; write one periodically
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+                self._last_flush = now
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(gzip.compress(bytes(self._buffer)))
+            self._file.flush()
+            self._buffer.clear()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._file = None
+
+
+def _members(f):
+    """
+    Yield the decompressed contents of each gzip member in a file.
+
+    A truncated or corrupt member yields whatever decompressed before the
+    damage; reading resumes at the next member header after it.
+    """
+    raw = b""
+    while True:
+        start = raw.find(GZIP_MAGIC)
+        if start < 0:
+            more = f.read(READ_CHUNK)
+            if not more:
+                return
+            raw = raw[-(len(GZIP_MAGIC) - 1):] + more
+            continue
+        chunks = [raw[start:]]  # raw bytes of this member, for resyncing
+        decompressor = zlib.decompressobj(wbits=31)  # gzip framing
+        out = []
+        damaged = False
+        data = chunks[0]
+        try:
+            while True:
+                out.append(decompressor.decompress(data))
+                if decompressor.eof:
+                    break
+                data = f.read(READ_CHUNK)
+                if not data:
+                    damaged = True  # file ends mid-member
+                    break
+                chunks.append(data)
+        except zlib.error:
+            damaged = True
+        yield b"".join(out)
+        if damaged:
+            raw = b"".join(chunks)[1:]  # look for the next member past this header
+        else:
+            raw = decompressor.unused_data
+
+
+def _records(data):
+    """Yield (timestamp, payload) for every complete record in `data`."""
+    end = len(data)
+    pos = 0
+    while pos + RECORD_HEADER.size <= end:
+        timestamp, length = RECORD_HEADER.unpack_from(data, pos)
+        pos += RECORD_HEADER.size
+        if length == RUN_MARKER:
+            yield timestamp, None
+            continue
+        if pos + length > end:
+            return  # cut off by a crash
+        yield timestamp, data[pos:pos + length]
+        pos += length
+
+
+def read_capture(path):
+    """
+    Yield (timestamp, payload) for every complete record in a capture.
+
+    A run marker comes out as (wall-clock start time, None).
+    """
+    with open(path, "rb") as f:
+        for data in _members(f):
+            yield from _records(data)
+
+
+class ReplayMessage:
+    """Stands in for paho's MQTTMessage in on_message(client, userdata, msg)."""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "timestamp")
+
+    def __init__(self, topic, payload, timestamp):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+        self.timestamp = timestamp
+
+
+def replay(path, on_message, speed=1.0, topic=DEFAULT_TOPIC):
+    """
+    Feed a capture to on_message(client, userdata, msg).
+
+    speed=1 keeps the recorded pacing, speed=N plays N times faster and
+    speed=None (or 0) plays as fast as possible. The time between runs
+    is skipped: the first record of a run plays right after the last one
+    of the previous run. (Captures from before run markers only skip
+    gaps where the clock went backwards, e.g. after a reboot.)
+    Returns stats: messages, bytes, runs, elapsed seconds, messages/s and
+    the worst lag behind schedule.
+    """
+    messages = total_bytes = runs = 0
+    max_lag = 0.0
+    start = time.perf_counter()
+    offset = 0.0
+    previous = None
+    for timestamp, payload in read_capture(path):
+        if payload is None:
+            runs += 1
+            previous = None
+            continue
+        if speed:
+            if previous is not None:
+                offset += max(0.0, timestamp - previous) / speed
+            previous = timestamp
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        on_message(None, None, ReplayMessage(topic, payload, timestamp))
+        messages += 1
+        total_bytes += len(payload)
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": messages,
+        "bytes": total_bytes,
+        "runs": runs,
+        "elapsed": elapsed,
+        "rate": messages / elapsed if elapsed else 0.0,
+        "max_lag": max_lag,
+    }
+
+
+def load_client(spec):
+    """Instantiate a client class from "module:Class" (repo root and scripts/ are importable)."""
+    root = Path(__file__).resolve().parent
+    for path in (root, root / "scripts"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def info(path):
+    first = last = None
+    records = total = 0
+    span = 0.0
+    runs = []  # wall-clock start of each run
+    for timestamp, payload in read_capture(path):
+        if payload is None:
+            runs.append(timestamp)
+            if first is not None:
+                span += last - first
+            first = last = None
+            continue
+        first = timestamp if first is None else first
+        last = timestamp
+        records += 1
+        total += len(payload)
+    if first is not None:
+        span += last - first
+    size = Path(path).stat().st_size
+    print(f"{path}: {records} records, {total:,} payload bytes, {size:,} bytes on disk "
+          f"({total / size if size else 0:.1f}x)")
+    if records:
+        print(f"Recorded span: {span:.1f}s")
+    for i, started in enumerate(runs, 1):
+        print(f"  run {i}: started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}")
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("info", "replay"):
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[2]
+    if sys.argv[1] == "info":
+        info(path)
+        return
+
+    speed_arg = sys.argv[3] if len(sys.argv) > 3 else "1"
+    speed = None if speed_arg == "max" else float(speed_arg)
+    client = load_client(sys.argv[4] if len(sys.argv) > 4 else DEFAULT_CLIENT)
+    print(f"[REPLAY] {path} -> {type(client).__name__}.on_message at "
+          f"{'max speed' if not speed else f'{speed:g}x'}")
+    stats = replay(path, client.on_message, speed)
+    print(f"[REPLAY] {stats['messages']} messages ({stats['runs']} runs), "
+          f"{stats['bytes']:,} bytes in {stats['elapsed']:.2f}s "
+          f"({stats['rate']:,.0f} msg/s, max lag {stats['max_lag'] * 1000:.1f} ms)")
+    writer = getattr(client, "status_writer", None)
+    if writer is not None:
+        writer.close()
+        print(f"[REPLAY] Status file writes: {writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
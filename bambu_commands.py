@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Match printer responses to the commands that caused them.
+
+Every request to a Bambu printer carries a sequence_id, and the printer
+echoes it in the section of the report that answers it:
+
+    request  {"print": {"sequence_id": "20000007", "command": "pause"}}
+    response {"print": {"sequence_id": "20000007", "command": "pause", "result": "success"}}
+
+A pushall is the exception: it is requested in "pushing" and answered
+by a full push_status report in "print" (RESPONSE_SECTIONS).
+
+CommandTracker.send() publishes a command with a unique sequence id and
+returns a concurrent.futures Future; match(), called from on_message(),
+resolves it with a CommandResponse including the round-trip latency. Commands that get no
+answer fail with CommandTimeout after their own timeout. asyncio callers
+wrap the future with asyncio.wrap_future().
+
+Ids start at a random high offset so they don't collide with the
+printer's own push_status counter or with ids another client
+(Bambu Studio, Home Assistant) is using on the same printer.
+"""
+
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import NamedTuple
+
+DEFAULT_TIMEOUT = 10.0  # seconds
+
+# Request section -> section of the report that answers it, where they differ
+RESPONSE_SECTIONS = {"pushing": "print"}
+
+
+class CommandTimeout(TimeoutError):
+    """The printer did not answer a command in time."""
+
+
+class CommandResponse(NamedTuple):
+    sequence_id: str
+    command: str
+    data: dict        # the answering report section (shared - do not modify)
+    latency: float    # seconds from publish to response
+
+    @property
+    def ok(self):
+        return str(self.data.get("result", "success")).lower() == "success"
+
+
+class _Pending:
+    __slots__ = ("sequence_id", "section", "command", "future", "sent", "deadline")
+
+    def __init__(self, sequence_id, section, command, future, sent, deadline):
+        self.sequence_id = sequence_id
+        self.section = section
+        self.command = command
+        self.future = future
+        self.sent = sent
+        self.deadline = deadline
+
+
+class CommandTracker:
+    """
+    Assigns sequence ids and resolves futures from matching reports.
+
+    Thread-safe: send() is called from caller threads, match() from the
+    MQTT network thread. One daemon thread expires timed-out commands.
+    """
+
+    def __init__(self, first_id=None):
+        if first_id is None:
+            first_id = random.randrange(10_000_000, 90_000_000)
+        self._ids = itertools.count(first_id)
+        self._pending = {}    # sequence_id -> _Pending
+        self._deadlines = []  # heap of (deadline, sequence_id)
+        self._cond = threading.Condition()
+        self._expirer = None
+        self.sent = 0
+        self.answered = 0
+        self.timeouts = 0
+        self.latencies = deque(maxlen=100)  # seconds, most recent last
+
+    def send(self, publish, section, command, timeout=DEFAULT_TIMEOUT, **params):
+        """
+        Publish a command and return a Future for its response.
+
+        publish(payload) gets the JSON request and returns True if it went
+        out; if it returns False the future fails with ConnectionError.
+        """
+        sequence_id = str(next(self._ids))
+        body = {"sequence_id": sequence_id, "command": command}
+        body.update(params)
+        future = Future()
+        now = time.monotonic()
+        pending = _Pending(sequence_id, RESPONSE_SECTIONS.get(section, section), command, future,
+                           now, now + timeout)
+        with self._cond:
+            # Registered before publishing: the answer can beat publish() back
+            self._pending[sequence_id] = pending
+            heapq.heappush(self._deadlines, (pending.deadline, sequence_id))
+            if self._expirer is None:
+                self._expirer = threading.Thread(target=self._expire_loop, name="command-timeouts",
+                                                 daemon=True)
+                self._expirer.start()
+            self._cond.notify()
+        if publish(json.dumps({section: body})):
+            with self._cond:
+                self.sent += 1
+        else:
+            with self._cond:
+                self._pending.pop(sequence_id, None)
+            future.set_exception(ConnectionError(f"{section}.{command} not sent: not connected"))
+        return future
+
+    def match(self, report):
+        """Resolve the commands answered by `report`. Returns how many."""
+        if not self._pending:
+            return 0
+        resolved = []
+        now = time.monotonic()
+        with self._cond:
+            for section, data in report.items():
+                if not isinstance(data, dict):
+                    continue
+                pending = self._pending.get(str(data.get("sequence_id")))
+                if pending is not None and pending.section == section:
+                    del self._pending[pending.sequence_id]
+                    self.answered += 1
+                    self.latencies.append(now - pending.sent)
+                    resolved.append((pending, data))
+        # Resolve outside the lock: done callbacks may issue new commands
+        for pending, data in resolved:
+            if not pending.future.done():
+                pending.future.set_result(CommandResponse(
+                    pending.sequence_id, pending.command, data, now - pending.sent))
+        return len(resolved)
+
+    def cancel_all(self, exc):
+        """Fail every command in flight, e.g. when the connection drops."""
+        with self._cond:
+            pending, self._pending = list(self._pending.values()), {}
+            self._deadlines = []
+        for p in pending:
+            if not p.future.done():
+                p.future.set_exception(exc)
+        return len(pending)
+
+    def _expire_loop(self):
+        while True:
+            expired = []
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, sequence_id = heapq.heappop(self._deadlines)
+                    pending = self._pending.pop(sequence_id, None)
+                    if pending is not None:
+                        self.timeouts += 1
+                        expired.append(pending)
+                if not expired:
+                    if self._deadlines:
+                        self._cond.wait(self._deadlines[0][0] - now)
+                    continue
+            for p in expired:
+                if not p.future.done():
+                    p.future.set_exception(CommandTimeout(
+                        f"{p.command} (sequence_id {p.sequence_id}) not answered "
+                        f"within {p.deadline - p.sent:.1f}s"))
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "sent": self.sent,
+            "answered": self.answered,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "last_latency_ms": latencies[-1] * 1000 if latencies else None,
+            "avg_latency_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+        }
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Bambu Lab printer fleet manager - many printers, one event loop
+
+Every other script here talks to one hard-coded printer and runs one paho
+loop_start() thread per client. FleetManager reads a list of printers from
+a config file and drives all of their MQTT/TLS connections from a single
+selector loop using paho's external-loop API (loop_read / loop_write /
+loop_misc plus the on_socket_* callbacks), so a farm of A1s costs one
+loop thread (plus a small pool for connection attempts) instead of one
+thread (or process) per printer.
+
+Config (JSON):
+    {
+        "ca_file": "optional CA file, defaults to the pinned Bambu bundle",
+        "printers": [
+            {"name": "a1-01", "host": "192.168.1.140", "serial": "03919c460100975",
+             "access_code": "33125022"},
+            {"name": "a1-02", "host": "192.168.1.141", "port": 8883, ...}
+        ]
+    }
+
+Per-printer state is a PrinterState plus a copy-on-write PrinterStatus, so
+other threads can read fleet.get(name).status and fleet.summary() without
+locking. Each printer has its own PushallPolicy: a reconnect only costs
+the printer a pushall when its state has a gap or is stale. Requests from other threads go through publish(), which hands
+them to the loop thread.
+
+Usage:
+    python3 bambu_fleet.py fleet.json
+"""
+
+import json
+import selectors
+import socket
+import ssl
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as mqtt
+
+from bambu_pushall import PushallPolicy
+from bambu_state import PrinterState, PrinterStatus
+from bambu_tls import get_ssl_context
+
+DEFAULT_PORT = 8883
+KEEPALIVE = 5               # seconds, same as the HA integration
+CONNECT_TIMEOUT = 5.0       # TCP connect + TLS handshake, per attempt
+CONNECT_WORKERS = 8         # connection attempts running at once, off the loop thread
+MISC_INTERVAL = 1.0         # seconds between loop_misc() passes (keepalive pings)
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+GET_VERSION = {"info": {"sequence_id": "0", "command": "get_version"}}
+PUSH_ALL = {"pushing": {"sequence_id": "0", "command": "pushall"}}
+
+
+class FleetPrinter:
+    """One printer in the fleet: its config, MQTT client and published status."""
+
+    def __init__(self, name, host, serial, access_code, port=DEFAULT_PORT):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.serial = serial
+        self.access_code = access_code
+        self.topic_report = f"device/{serial}/report"
+        self.topic_request = f"device/{serial}/request"
+
+        self.state = PrinterState()
+        self.pushall = PushallPolicy()
+        # Swapped (never mutated) by the loop thread; safe to read from anywhere
+        self.status = PrinterStatus()
+        self.client = None
+        self.sock = None
+        self.connecting = False  # an attempt is running on the connect pool
+        self.messages = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.next_connect = 0.0
+        self._delay = RECONNECT_MIN_DELAY
+
+    @classmethod
+    def from_config(cls, entry):
+        try:
+            return cls(
+                name=entry.get("name", entry["serial"]),
+                host=entry["host"],
+                serial=entry["serial"],
+                access_code=entry["access_code"],
+                port=int(entry.get("port", DEFAULT_PORT)),
+            )
+        except KeyError as e:
+            raise ValueError(f"printer entry {entry!r} is missing {e}") from None
+
+    @property
+    def connected(self):
+        return self.status.connected
+
+    def _set_connected(self, connected):
+        if self.status.connected != connected:
+            status = self.status.copy()
+            status.connected = connected
+            status.version += 1
+            self.status = status
+
+    def __repr__(self):
+        return f"<FleetPrinter {self.name} {self.host}:{self.port} connected={self.connected}>"
+
+
+class FleetManager:
+    """
+    Drives every printer's MQTT connection from one selector loop.
+
+    run() blocks in the calling thread; start() runs it in a background
+    thread. Connection attempts (TCP connect + TLS handshake) block for up
+    to CONNECT_TIMEOUT, so they run on a pool of CONNECT_WORKERS threads
+    and the loop only picks up the finished socket: an unreachable printer
+    or a reconnect storm never stalls reads and keepalives for the rest of
+    the fleet. Dropped connections are retried with exponential backoff.
+    """
+
+    def __init__(self, printers, ssl_context=None):
+        self.printers = {}
+        for printer in printers:
+            if printer.name in self.printers:
+                raise ValueError(f"duplicate printer name {printer.name!r}")
+            self.printers[printer.name] = printer
+        self.ssl_context = ssl_context or get_ssl_context()
+        self._selector = selectors.DefaultSelector()
+        self._commands = deque()
+        self._connect_pool = ThreadPoolExecutor(CONNECT_WORKERS, thread_name_prefix="fleet-connect")
+        self._connected = deque()  # (printer, error) from finished connection attempts
+        self._stop = threading.Event()
+        self._thread = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        printers = [FleetPrinter.from_config(entry) for entry in config.get("printers", [])]
+        if not printers:
+            raise ValueError(f"{path}: no printers configured")
+        context = get_ssl_context(config.get("ca_file"))
+        return cls(printers, ssl_context=context)
+
+    # ---- public API (any thread) ----
+
+    def get(self, name):
+        return self.printers[name]
+
+    def statuses(self):
+        """{name: PrinterStatus} for every printer."""
+        return {name: printer.status for name, printer in self.printers.items()}
+
+    def summary(self):
+        """Aggregate view of the whole fleet."""
+        statuses = [printer.status for printer in self.printers.values()]
+        running = [s for s in statuses if s.state == "RUNNING"]
+        return {
+            "printers": len(statuses),
+            "connected": sum(1 for s in statuses if s.connected),
+            "by_state": dict(Counter(s.state for s in statuses)),
+            "running": len(running),
+            "avg_progress": sum(s.progress for s in running) / len(running) if running else 0,
+            "max_time_remaining": max((s.time_remaining for s in running), default=0),
+            "messages": sum(p.messages for p in self.printers.values()),
+            "disconnects": sum(p.disconnects for p in self.printers.values()),
+            "pushalls": sum(sum(p.pushall.requested.values()) for p in self.printers.values()),
+            "pushalls_avoided": sum(p.pushall.avoided for p in self.printers.values()),
+            # Handshake times and session resumption hit rate (bambu_tls contexts)
+            "tls": self.ssl_context.stats() if hasattr(self.ssl_context, "stats") else None,
+        }
+
+    def publish(self, name, msg):
+        """Queue a request for printer `name`; sent from the loop thread."""
+        self._commands.append((self.printers[name], json.dumps(msg)))
+        self._wake()
+
+    def request_pushall(self, name=None):
+        """Ask one printer (or all of them) for a full status report, needed or not."""
+        for printer_name in ([name] if name else self.printers):
+            printer = self.printers[printer_name]
+            if printer.pushall.check(printer.state, force=True):
+                self.publish(printer_name, PUSH_ALL)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="fleet-loop", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    # ---- paho callbacks (loop thread) ----
+
+    def _make_client(self, printer):
+        client = mqtt.Client(
+            client_id=f"ha-bambulab-{uuid.uuid4()}",
+            protocol=mqtt.MQTTv311,
+            clean_session=True,
+            userdata=printer,
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION1,
+        )
+        client.tls_set_context(self.ssl_context)
+        client.username_pw_set("bblp", printer.access_code)
+        client.connect_timeout = CONNECT_TIMEOUT
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        return client
+
+    def _on_connect(self, client, printer, flags, rc):
+        if rc != 0:
+            print(f"[FLEET] {printer.name}: connection refused ({rc})")
+            return
+        printer.connects += 1
+        printer._delay = RECONNECT_MIN_DELAY
+        printer._set_connected(True)
+        # Subscribe inside on_connect, as the A1 requires
+        client.subscribe(printer.topic_report)
+        client.publish(printer.topic_request, json.dumps(GET_VERSION))
+        self._maybe_pushall(printer, printer.pushall.check(printer.state))
+
+    def _maybe_pushall(self, printer, reason):
+        # Answers are recognised by "msg": 0, so no sequence id tracking is needed
+        if reason:
+            print(f"[FLEET] {printer.name}: requesting pushall ({reason})")
+            printer.client.publish(printer.topic_request, json.dumps(PUSH_ALL))
+
+    def _on_disconnect(self, client, printer, rc):
+        printer.disconnects += 1
+        printer.pushall.failed()
+        printer._set_connected(False)
+        if not self._stop.is_set():
+            retry = max(0.0, printer.next_connect - time.monotonic())
+            print(f"[FLEET] {printer.name}: disconnected ({rc}), retrying in {retry:.0f}s")
+
+    def _on_message(self, client, printer, msg):
+        try:
+            data = json.loads(msg.payload)
+        except ValueError as e:
+            print(f"[FLEET] {printer.name}: bad payload: {e}")
+            return
+        printer.messages += 1
+        printer.state.merge(data)
+        printer.status = printer.status.updated(data)
+        printer.pushall.observe(data)
+        if printer.connected:
+            self._maybe_pushall(printer, printer.pushall.due(printer.state))
+
+    def _on_socket_close(self, client, printer, sock):
+        if printer.sock is sock:
+            self._selector.unregister(sock)
+            printer.sock = None
+            self._schedule_reconnect(printer)
+
+    def _on_socket_register_write(self, client, printer, sock):
+        if printer.sock is sock:
+            self._selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, printer)
+
+    def _on_socket_unregister_write(self, client, printer, sock):
+        if printer.sock is sock:
+            self._selector.modify(sock, selectors.EVENT_READ, printer)
+
+    # ---- loop ----
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # already pending
+
+    def _schedule_reconnect(self, printer):
+        printer.next_connect = time.monotonic() + printer._delay
+        printer._delay = min(printer._delay * 2, RECONNECT_MAX_DELAY)
+
+    def _connect(self, printer):
+        """Start a connection attempt on the pool; the loop leaves the client alone until it ends."""
+        if printer.client is None:
+            printer.client = self._make_client(printer)
+            printer.client.connect_async(printer.host, printer.port, keepalive=KEEPALIVE)
+        printer.connecting = True
+        self._connect_pool.submit(self._connect_blocking, printer)
+
+    def _connect_blocking(self, printer):
+        # Pool thread. The new socket isn't registered yet, so the
+        # on_socket_* callbacks fired from here ignore it
+        error = None
+        try:
+            printer.client.reconnect()
+        except (OSError, ssl.SSLError) as e:
+            error = e
+        self._connected.append((printer, error))
+        self._wake()
+
+    def _finish_connects(self):
+        while self._connected:
+            printer, error = self._connected.popleft()
+            printer.connecting = False
+            if error is not None:
+                print(f"[FLEET] {printer.name}: connect to {printer.host}:{printer.port} failed: {error}")
+                self._schedule_reconnect(printer)
+                continue
+            printer.sock = printer.client.socket()
+            # CONNECT is already queued in the client
+            self._selector.register(printer.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, printer)
+
+    def _send_commands(self):
+        while self._commands:
+            printer, payload = self._commands.popleft()
+            if printer.client is not None and printer.connected:
+                printer.client.publish(printer.topic_request, payload)
+
+    def run(self):
+        """Run the fleet loop until stop() is called."""
+        print(f"[FLEET] Managing {len(self.printers)} printers")
+        last_misc = 0.0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                self._finish_connects()
+                for printer in self.printers.values():
+                    if printer.sock is None and not printer.connecting and printer.next_connect <= now:
+                        self._connect(printer)
+                self._send_commands()
+
+                # TLS may already hold decrypted bytes select() cannot see
+                pending = [p for p in self.printers.values()
+                           if p.sock is not None and hasattr(p.sock, "pending") and p.sock.pending()]
+                timeout = 0 if pending else MISC_INTERVAL
+                for key, events in self._selector.select(timeout):
+                    printer = key.data
+                    if printer is None:
+                        try:
+                            self._wake_r.recv(4096)
+                        except BlockingIOError:
+                            pass
+                        continue
+                    if events & selectors.EVENT_READ and printer.sock is key.fileobj:
+                        printer.client.loop_read()
+                    if events & selectors.EVENT_WRITE and printer.sock is key.fileobj:
+                        printer.client.loop_write()
+                for printer in pending:
+                    if printer.sock is not None:
+                        printer.client.loop_read()
+
+                now = time.monotonic()
+                if now - last_misc >= MISC_INTERVAL:
+                    last_misc = now
+                    for printer in self.printers.values():
+                        if printer.sock is not None:
+                            printer.client.loop_misc()
+        finally:
+            self._connect_pool.shutdown(wait=True, cancel_futures=True)
+            self._finish_connects()
+            for printer in self.printers.values():
+                if printer.sock is not None:
+                    printer.client.disconnect()
+                    printer.client.loop_write()  # best effort: flush DISCONNECT
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+            print("[FLEET] Stopped")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} fleet.json")
+        sys.exit(1)
+    fleet = FleetManager.from_config(sys.argv[1])
+    fleet.start()
+    try:
+        while True:
+            time.sleep(5)
+            s = fleet.summary()
+            states = ", ".join(f"{state}: {n}" for state, n in sorted(s["by_state"].items()))
+            print(f"[{time.strftime('%H:%M:%S')}] {s['connected']}/{s['printers']} connected | "
+                  f"{states} | running avg {s['avg_progress']:.0f}% | {s['messages']} messages")
+    except KeyboardInterrupt:
+        print("\n[EXIT] Interrupted by user")
+    finally:
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
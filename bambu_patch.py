@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Versioned state stream: keyframes plus JSON merge patches (RFC 7396).
+
+Remote consumers of the bridge (over Tailscale, or a browser) want the
+merged printer state, not the raw report stream. Sending the whole state
+on every change wastes bandwidth and parse time, so PatchStream turns
+each PrinterState change set into a merge patch holding only the fields
+that changed:
+
+    {"version": 41, "keyframe": true, "state": {...the whole state...}}
+    {"version": 42, "patch": {"print": {"mc_percent": 43, "layer_num": 120}}}
+
+A consumer applies patch N on top of state N-1 (merge_patch(), or
+PatchFollower which also checks versions). A keyframe is sent every
+KEYFRAME_EVERY patches or KEYFRAME_INTERVAL seconds, whichever comes
+first (and the first message is always one), so a consumer that missed
+a message is back in sync soon. Late joiners get snapshot() when they
+subscribe. It is serialized at most once per version however many
+clients join.
+
+The printer's reports only ever add or overwrite fields, so the patches
+never need RFC 7396's null-means-delete. A field whose value becomes
+null is dropped by consumers, which reads the same as null.
+"""
+
+import json
+import threading
+import time
+
+KEYFRAME_EVERY = 100        # patches
+KEYFRAME_INTERVAL = 30.0    # seconds
+
+
+def _dumps(message):
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+def make_patch(data, changed):
+    """Merge patch that turns the previous state into `data`, given merge()'s changed paths."""
+    patch = {}
+    for path in changed:
+        node, target = data, patch
+        for key in path[:-1]:
+            node = node[key]
+            target = target.setdefault(key, {})
+        target[path[-1]] = node[path[-1]]
+    return patch
+
+
+def merge_patch(target, patch):
+    """Apply an RFC 7396 merge patch. Returns a new dict; `target` is not modified."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+class PatchStream:
+    """
+    Encodes state changes as versioned merge patches with periodic keyframes.
+
+    update() is called by the single thread that merges reports;
+    snapshot() may be called from any thread.
+    """
+
+    def __init__(self, keyframe_every=KEYFRAME_EVERY, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_every = keyframe_every
+        self.keyframe_interval = keyframe_interval
+        self.version = 0
+        self._data = {}
+        self._lock = threading.Lock()
+        self._snapshot = None        # (version, bytes) cache
+        self._since_keyframe = 0
+        self._keyframe_at = time.monotonic()
+        # Metrics
+        self.patches = 0
+        self.keyframes = 0
+        self.patch_bytes = 0
+        self.keyframe_bytes = 0
+        self.full_bytes = 0          # roughly what sending the whole state every time would cost
+        self._full_size = 0          # size of the last serialized snapshot
+
+    def update(self, data, changed):
+        """
+        Record a new state (a shared, unmodified snapshot) and its changed paths.
+
+        Returns the message to broadcast, as bytes: a patch, or a keyframe
+        when one is due. Returns None if nothing changed.
+        """
+        if not changed:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self.version += 1
+            self._data = data
+            self._snapshot = None
+            keyframe = (self.keyframes == 0
+                        or self._since_keyframe + 1 >= self.keyframe_every
+                        or now - self._keyframe_at >= self.keyframe_interval)
+        if keyframe:
+            message = self.snapshot()
+            with self._lock:
+                self._since_keyframe = 0
+                self._keyframe_at = now
+                self.keyframes += 1
+                self.keyframe_bytes += len(message)
+                self.full_bytes += len(message)
+            return message
+        message = _dumps({"version": self.version, "patch": make_patch(data, changed)})
+        with self._lock:
+            self._since_keyframe += 1
+            self.patches += 1
+            self.patch_bytes += len(message)
+            self.full_bytes += self._full_size
+        return message
+
+    def snapshot(self):
+        """The current state as a keyframe message (cached per version)."""
+        with self._lock:
+            if self._snapshot is None or self._snapshot[0] != self.version:
+                self._snapshot = (self.version, _dumps(
+                    {"version": self.version, "keyframe": True, "state": self._data}))
+                self._full_size = len(self._snapshot[1])
+            return self._snapshot[1]
+
+    def stats(self):
+        sent = self.patch_bytes + self.keyframe_bytes
+        return {
+            "version": self.version,
+            "patches": self.patches,
+            "keyframes": self.keyframes,
+            "bytes_sent": sent,
+            "avg_patch_bytes": self.patch_bytes / self.patches if self.patches else None,
+            "saved": 1 - sent / self.full_bytes if self.full_bytes else 0.0,
+        }
+
+
+class PatchFollower:
+    """Consumer side: rebuilds the state from keyframes and patches."""
+
+    def __init__(self):
+        self.version = None
+        self.state = None
+
+    def apply(self, message):
+        """
+        Apply a decoded stream message. Returns False if it can't be applied
+        (a missed patch): keep feeding messages until the next keyframe, or
+        resubscribe to get one right away.
+        """
+        if message.get("keyframe"):
+            self.version, self.state = message["version"], message["state"]
+            return True
+        if self.version is not None and message["version"] <= self.version:
+            return True  # already in the keyframe we started from
+        if self.version is None or message["version"] != self.version + 1:
+            return False
+        self.state = merge_patch(self.state, message["patch"])
+        self.version = message["version"]
+        return True
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Decide when a pushall is actually needed.
+
+A pushall makes the A1 build and send its full report, which is large
+and slow for the printer. Once a client holds a complete state, the
+incremental push_status stream keeps it exact as long as no report was
+missed. The A1 numbers its push_status reports with an incrementing
+sequence_id, so a missed report shows up as a gap.
+
+PushallPolicy watches the stream and asks for a pushall only when:
+
+- a field the clients rely on (bambu_state.STATUS_FIELDS) is missing
+  and no full report has arrived yet (once one has, a missing field is
+  one this printer doesn't send, and asking again won't change that);
+- the sequence_id jumped or went backwards (missed reports, e.g. across
+  a reconnect, or a printer reboot);
+- the last full report is older than max_age (a safety net for fields
+  that change without being reported).
+
+Every other pushall request (on connect, or from a bridge's
+request_status()) is skipped: counted as avoided when the state is
+complete and fresh, or as joined when a pushall is already in flight.
+`pending` is a Future for the one in flight, so a caller that wants the
+full report can wait for it instead of asking again.
+
+Full reports (the answer to a pushall) are recognised by "msg": 0, or
+by the client calling answered() when its pushall's sequence_id comes
+back. They carry the request's sequence_id rather than the stream's, so
+the stream is re-anchored on the next partial report.
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from bambu_state import STATUS_FIELDS
+
+MAX_AGE = 300.0          # seconds before a full refresh is due anyway
+REQUEST_TIMEOUT = 10.0   # don't ask again while a pushall is this fresh and unanswered
+
+REQUIRED_PATHS = tuple(path for _, path, _, _ in STATUS_FIELDS)
+
+
+class PushallPolicy:
+    """Tracks report freshness and sequence gaps for one printer connection."""
+
+    def __init__(self, required=REQUIRED_PATHS, max_age=MAX_AGE):
+        self.required = required
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_sequence = None
+        self._full_at = None       # monotonic time of the last full report
+        self._requested_at = None  # pushall sent and not yet answered
+        self._requested_reason = None
+        self._gap = False
+        # Resolves to True when the pushall in flight is answered, False if it fails
+        self.pending = None
+        self.reports = 0
+        self.gaps = 0
+        self.requested = Counter()  # reason -> pushalls sent
+        self.avoided = 0
+        self.joined = 0             # requests that found a pushall already in flight
+
+    def observe(self, report):
+        """Account for a report from the printer."""
+        print_section = report.get("print")
+        if not isinstance(print_section, dict) or print_section.get("command") != "push_status":
+            return
+        with self._lock:
+            self.reports += 1
+            if print_section.get("msg") == 0:
+                pending = self._mark_full()
+            else:
+                pending = None
+                try:
+                    sequence = int(print_section.get("sequence_id"))
+                except (TypeError, ValueError):
+                    return
+                last, self._last_sequence = self._last_sequence, sequence
+                if last is not None and sequence != last + 1:
+                    self.gaps += 1
+                    self._gap = True
+        if pending is not None:
+            pending.set_result(True)
+
+    def answered(self):
+        """The pushall we sent was answered (matched by its sequence_id)."""
+        with self._lock:
+            pending = self._mark_full()
+        if pending is not None:
+            pending.set_result(True)
+
+    def failed(self):
+        """The pushall we sent went unanswered (timeout, connection lost)."""
+        with self._lock:
+            if self._requested_at is None:
+                return  # already answered, e.g. by a msg 0 report
+            self._requested_at = None
+            if self._requested_reason == "sequence gap":
+                self._gap = True  # still missing those reports
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            pending.set_result(False)
+
+    def _mark_full(self):
+        # Returns the pending Future for the caller to resolve outside the lock
+        self._full_at = time.monotonic()
+        self._requested_at = None
+        self._last_sequence = None
+        self._gap = False
+        pending, self.pending = self.pending, None
+        return pending
+
+    def _in_flight(self, now):
+        return self._requested_at is not None and now - self._requested_at < REQUEST_TIMEOUT
+
+    @property
+    def in_flight(self):
+        """True while a pushall we sent is waiting for its answer."""
+        with self._lock:
+            return self._in_flight(time.monotonic())
+
+    def reason(self, state, now=None):
+        """Why a pushall is needed now, or None if it isn't (or one is in flight)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._in_flight(now):
+                return None  # one is on its way
+            if self._gap:
+                return "sequence gap"
+            full_at = self._full_at
+        if full_at is None:
+            for path in self.required:
+                if state.get(path) is None:
+                    return "missing fields"
+        if full_at is None or now - full_at > self.max_age:
+            return "stale"
+        return None
+
+    def check(self, state, force=False):
+        """
+        Decide whether to send a pushall now; returns the reason or None.
+
+        A None answer is counted as joined if a pushall is in flight (wait
+        on `pending` for it) and as avoided otherwise. A reason marks the
+        pushall as requested and creates a new `pending`, so callers must
+        send it.
+        """
+        now = time.monotonic()
+        reason = "forced" if force else self.reason(state, now)
+        with self._lock:
+            if reason is None:
+                if self._in_flight(now):
+                    self.joined += 1
+                else:
+                    self.avoided += 1
+                return None
+            stale = None
+            if not self._in_flight(now):
+                # A request that timed out without failed() being called is given up on
+                stale, self.pending = self.pending, Future()
+            self._requested_at = now
+            self._requested_reason = reason
+            self._gap = False
+            self.requested[reason] += 1
+        if stale is not None:
+            stale.set_result(False)
+        return reason
+
+    def due(self, state):
+        """Like check(), but silent when nothing is due (for polling from on_message)."""
+        reason = self.reason(state)
+        if reason is None:
+            return None
+        return self.check(state)
+
+    def stats(self):
+        with self._lock:
+            age = time.monotonic() - self._full_at if self._full_at is not None else None
+            return {
+                "reports": self.reports,
+                "gaps": self.gaps,
+                "pushalls": sum(self.requested.values()),
+                "pushall_reasons": dict(self.requested),
+                "avoided": self.avoided,
+                "joined": self.joined,
+                "full_report_age_s": age,
+            }
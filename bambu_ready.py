@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Readiness events shared between paho's network thread and waiters.
+
+paho calls on_connect/on_message on its own thread. ReadyEvent lets any
+other thread block on that (wait()) and lets asyncio code await it
+(wait_async()) without a polling loop or a thread per waiter: set() wakes
+threads through a threading.Event and resolves asyncio waiters through
+their loop's call_soon_threadsafe().
+"""
+
+import asyncio
+import threading
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class ReadyEvent:
+    """A threading.Event that asyncio code can await as well."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = []  # (loop, future) pairs
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def clear(self):
+        self._event.clear()
+
+    def wait(self, timeout=None):
+        """Block until set. Returns False on timeout."""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout=None):
+        """Await until set. Returns False on timeout."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._event.is_set():
+                return True
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Local MQTT fan-out endpoint for one printer connection.
+
+The A1 only accepts a handful of MQTT clients, and each one costs the
+printer a TLS session. The bridge (scripts/printer_bridge.py --relay)
+keeps the one upstream connection and serves everything else from a
+RelayServer:
+
+- reports received upstream are republished, byte for byte, on
+  device/<serial>/report to every local subscriber;
+- local PUBLISHes to device/<serial>/request are handed to the bridge,
+  which forwards them upstream through its rate-limited scheduler (or
+  answers a pushall from its own state);
+- the merged state is published on device/<serial>/state as versioned
+  merge patches with periodic keyframes (bambu_patch); a client that
+  subscribes to it gets the current keyframe straight away;
+- the endpoint is plain MQTT 3.1.1 (mqtt_lite) on a TCP port or a Unix
+  socket, so existing paho scripts only change host/port and drop TLS.
+
+With an access code set, clients log in as bblp/<access code> exactly
+like on the printer.
+
+Addresses:
+    1883                 TCP on 127.0.0.1
+    0.0.0.0:1883         TCP on all interfaces (e.g. for Tailscale peers)
+    unix:/tmp/bambu.sock Unix socket
+"""
+
+import asyncio
+import os
+import threading
+from collections import Counter
+
+import mqtt_lite as mq
+
+CONNECT_TIMEOUT = 10.0
+
+
+def parse_address(address):
+    """Returns ("unix", path) or ("tcp", (host, port))."""
+    address = str(address)
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class RelayServer:
+    """
+    Serves one printer's report/request topics to local MQTT clients.
+
+    Runs its own event loop thread (start()). publish() and reply() may be
+    called from any thread; on_request(session, payload) is called on the
+    relay's loop thread and must not block.
+    """
+
+    def __init__(self, serial, on_request, access_code=None, snapshot=None):
+        self.topic_report = f"device/{serial}/report"
+        self.topic_request = f"device/{serial}/request"
+        self.topic_state = f"device/{serial}/state"
+        self.on_request = on_request
+        self.snapshot = snapshot  # () -> current state keyframe, sent to new state subscribers
+        self.access_code = access_code
+        self.address = None
+        self.sessions = set()
+        self.stats = Counter()
+        self._loop = None
+        self._server = None
+        self._unix_path = None
+
+    # ---- lifecycle ----
+
+    def start(self, address):
+        """Start listening on `address` in a background thread. Raises OSError if it can't bind."""
+        self.address = address
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        error = []
+
+        async def run():
+            try:
+                await self._listen(address)
+            except OSError as e:
+                error.append(e)
+                return
+            finally:
+                ready.set()
+            async with self._server:
+                await self._server.serve_forever()
+
+        threading.Thread(target=self._run_loop, args=(run(),), name="bambu-relay", daemon=True).start()
+        ready.wait(5)
+        if error:
+            raise error[0]
+        print(f"[RELAY] Serving {self.topic_report} on {address}")
+
+    def _run_loop(self, main):
+        try:
+            self._loop.run_until_complete(main)
+        except asyncio.CancelledError:
+            pass
+
+    async def _listen(self, address):
+        kind, where = parse_address(address)
+        if kind == "unix":
+            if os.path.exists(where):
+                os.unlink(where)  # stale socket from a previous run
+            self._server = await asyncio.start_unix_server(self._handle, where)
+            self._unix_path = where
+        else:
+            self._server = await asyncio.start_server(self._handle, *where)
+
+    def stop(self):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        def shutdown():
+            self._server.close()
+            for session in list(self.sessions):
+                session.writer.transport.abort()
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+
+        loop.call_soon_threadsafe(shutdown)
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+
+    # ---- fan-out ----
+
+    def publish(self, payload, topic=None):
+        """Send a payload (default: a raw report) to every subscriber (thread-safe)."""
+        if self._loop is None or not self.sessions:
+            return
+        topic = topic or self.topic_report
+        packet = mq.encode_publish(topic, payload)
+        self._loop.call_soon_threadsafe(self._fanout, topic, packet)
+
+    def reply(self, session, payload):
+        """Send a report payload to one session only (thread-safe)."""
+        packet = mq.encode_publish(self.topic_report, payload)
+        self._loop.call_soon_threadsafe(self._send, session, packet)
+
+    def _fanout(self, topic, packet):
+        for session in list(self.sessions):
+            if session.wants(topic):
+                self._send(session, packet)
+
+    def _send(self, session, packet):
+        if session.send(packet):
+            self.stats["messages_out"] += 1
+        elif session in self.sessions:
+            self.stats["slow_clients_dropped"] += 1
+            self.sessions.discard(session)
+
+    # ---- connections ----
+
+    async def _handle(self, reader, writer):
+        session = mq.Session(writer, writer.get_extra_info("peername"))
+        try:
+            packet_type, _, body = await asyncio.wait_for(mq.read_packet(reader), CONNECT_TIMEOUT)
+            if packet_type != mq.CONNECT:
+                return
+            info = mq.parse_connect(body)
+            if info["protocol"] != "MQTT" or info["level"] != 4:
+                writer.write(mq.encode_connack(mq.CONNACK_BAD_PROTOCOL))
+                return
+            if self.access_code and (info["username"] != "bblp"
+                                     or info["password"] != self.access_code):
+                self.stats["auth_failures"] += 1
+                writer.write(mq.encode_connack(mq.CONNACK_BAD_CREDENTIALS))
+                return
+            session.client_id = info["client_id"]
+            writer.write(mq.encode_connack(mq.CONNACK_ACCEPTED))
+            self.sessions.add(session)
+            self.stats["connections"] += 1
+            timeout = info["keepalive"] * 1.5 or None
+
+            while True:
+                packet_type, flags, body = await asyncio.wait_for(mq.read_packet(reader), timeout)
+                if packet_type == mq.PUBLISH:
+                    topic, payload, qos, packet_id = mq.parse_publish(flags, body)
+                    if qos == 1:
+                        session.send(mq.encode_puback(packet_id))
+                    if topic == self.topic_request:
+                        self.stats["requests"] += 1
+                        self.on_request(session, payload)
+                elif packet_type == mq.SUBSCRIBE:
+                    packet_id, filters = mq.parse_subscribe(body)
+                    session.filters.update(f for f, _ in filters)
+                    session.send(mq.encode_suback(packet_id, [0] * len(filters)))
+                    if self.snapshot and any(mq.topic_matches(f, self.topic_state) for f, _ in filters):
+                        self.stats["keyframes_on_subscribe"] += 1
+                        self._send(session, mq.encode_publish(self.topic_state, self.snapshot()))
+                elif packet_type == mq.UNSUBSCRIBE:
+                    packet_id, filters = mq.parse_unsubscribe(body)
+                    session.filters.difference_update(filters)
+                    session.send(mq.encode_unsuback(packet_id))
+                elif packet_type == mq.PINGREQ:
+                    session.send(mq.PINGRESP_PACKET)
+                elif packet_type == mq.DISCONNECT:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, mq.ProtocolError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            await mq.close_writer(writer)
+
+    @property
+    def clients(self):
+        return len(self.sessions)
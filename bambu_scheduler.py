@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Rate-limited, prioritized outbound queue for printer commands.
+
+Bursts of requests (a pushall from every bridge on reconnect plus a few
+control commands) are enough to make the A1 drop the connection. The
+CommandScheduler sits between callers and paho's publish():
+
+- a token bucket caps the send rate (RATE per second, BURST at once);
+- queued commands go out by priority: control commands (pause, stop,
+  light...) before version queries before status pulls;
+- a pushall submitted while another is still queued is merged into it:
+  the caller gets the queued command's Future instead of a second
+  request on the wire.
+
+submit() returns a concurrent.futures Future right away. The command is
+built and published on the scheduler's thread when its turn comes; the
+Future resolves with whatever the send function produced (chained
+through if that is itself a Future, e.g. from CommandTracker.send()).
+stats() reports queue depth and the time commands waited for their turn.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+RATE = 2.0   # commands per second, sustained
+BURST = 4    # commands that may go out back to back
+
+PRIORITY_CONTROL = 0
+PRIORITY_INFO = 1
+PRIORITY_STATUS = 2
+
+# Request section -> priority; anything else is a control command
+SECTION_PRIORITIES = {"info": PRIORITY_INFO, "pushing": PRIORITY_STATUS}
+
+# Commands where a queued duplicate adds nothing
+MERGEABLE = {("pushing", "pushall")}
+
+
+def priority_for(section):
+    return SECTION_PRIORITIES.get(section, PRIORITY_CONTROL)
+
+
+def merge_key(section, command):
+    return (section, command) if (section, command) in MERGEABLE else None
+
+
+def _chain(source, target):
+    """Copy the outcome of `source` into `target` when it completes."""
+    def copy(f):
+        if target.done():
+            return
+        exc = f.exception()
+        if exc is not None:
+            target.set_exception(exc)
+        else:
+            target.set_result(f.result())
+    source.add_done_callback(copy)
+
+
+class _Item:
+    __slots__ = ("send", "key", "future", "queued")
+
+    def __init__(self, send, key, future, queued):
+        self.send = send
+        self.key = key
+        self.future = future
+        self.queued = queued
+
+
+class CommandScheduler:
+    """
+    Token-bucket scheduler with priority classes and pushall merging.
+
+    `publish(payload) -> bool` is handed to each command's send function
+    when the command is dispatched.
+    """
+
+    def __init__(self, publish, rate=RATE, burst=BURST):
+        self._publish = publish
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._queue = []  # heap of (priority, order, _Item)
+        self._order = itertools.count()
+        self._merge = {}  # merge key -> queued _Item
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # Metrics
+        self.submitted = 0
+        self.dispatched = 0
+        self.merged = 0
+        self.max_depth = 0
+        self.waits = deque(maxlen=100)  # seconds from submit to dispatch
+
+    def submit(self, send, priority=PRIORITY_CONTROL, key=None):
+        """
+        Queue send(publish) and return a Future for its result.
+
+        If `key` matches a command that is still queued, nothing new is
+        queued and that command's Future is returned.
+        """
+        with self._cond:
+            self.submitted += 1
+            if key is not None and key in self._merge:
+                self.merged += 1
+                return self._merge[key].future
+            item = _Item(send, key, Future(), time.monotonic())
+            heapq.heappush(self._queue, (priority, next(self._order), item))
+            if key is not None:
+                self._merge[key] = item
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="command-scheduler",
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return item.future
+
+    def publish(self, payload, priority=PRIORITY_CONTROL):
+        """Queue a prepared payload; the Future resolves to publish()'s result."""
+        return self.submit(lambda publish: publish(payload), priority)
+
+    def close(self, exc=None):
+        """Stop the scheduler, failing anything still queued."""
+        with self._cond:
+            self._closed = True
+            queued, self._queue = self._queue, []
+            self._merge.clear()
+            self._cond.notify()
+        for _, _, item in queued:
+            if not item.future.done():
+                item.future.set_exception(exc or ConnectionError("scheduler closed"))
+
+    def _take(self):
+        """Wait for a queued command and a token. Returns the item or None when closed."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens < 1:
+                    self._cond.wait((1 - self._tokens) / self.rate)
+                    continue
+                self._tokens -= 1
+                _, _, item = heapq.heappop(self._queue)
+                if item.key is not None:
+                    del self._merge[item.key]
+                self.dispatched += 1
+                self.waits.append(now - item.queued)
+                return item
+
+    def _run(self):
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            try:
+                result = item.send(self._publish)
+            except Exception as e:
+                item.future.set_exception(e)
+                continue
+            if isinstance(result, Future):
+                _chain(result, item.future)
+            else:
+                item.future.set_result(result)
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        waits = list(self.waits)
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "merged": self.merged,
+            "avg_wait_ms": sum(waits) / len(waits) * 1000 if waits else None,
+            "max_wait_ms": max(waits) * 1000 if waits else None,
+        }
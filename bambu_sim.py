@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Local Bambu Lab A1 simulator - an MQTT broker stand-in for load tests
+
+Speaks MQTT 3.1.1 over TLS 1.2 with the printer's bblp/access-code login,
+so every client in this repo can run against it instead of the physical
+printer at 192.168.1.140. One simulator can play any number of printers:
+
+- answers pushall (full report) and get_version on device/<serial>/request
+- streams partial push_status reports on device/<serial>/report at --rate
+  per printer, driven by a simulated print job (progress, layers, temps)
+- handles pause/resume/stop print commands
+- can inject disconnect code 7: the A1 drops connections without an MQTT
+  DISCONNECT, which paho reports as rc=7 (connection lost)
+
+A self-signed certificate is generated with the openssl CLI on first run
+(or pass --cert/--key). Point clients at it as their CA file.
+
+Usage:
+    python3 bambu_sim.py --printers 50 --rate 2 --fleet-config /tmp/fleet.json
+    python3 bambu_fleet.py /tmp/fleet.json
+
+    python3 bambu_sim.py --drop-every 30      # every connection dies after ~30s
+    python3 bambu_sim.py --drop-rate 0.01     # 1% chance per report sent
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import ssl
+import subprocess
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import mqtt_lite as mq
+
+DEFAULT_PORT = 8883
+DEFAULT_ACCESS_CODE = "12345678"
+DEFAULT_CERT_DIR = Path(__file__).parent / "sim_certs"
+CONNECT_TIMEOUT = 10.0
+FIRMWARE_VERSION = "01.04.00.00"
+
+FILES = ["benchy.gcode.3mf", "calibration_cube.gcode.3mf", "cable_clip.gcode.3mf",
+         "phone_stand.gcode.3mf", "spool_holder.gcode.3mf"]
+
+
+def ensure_certificate(cert_dir=DEFAULT_CERT_DIR):
+    """Return (cert, key) paths, generating a self-signed pair with openssl if needed."""
+    cert_dir = Path(cert_dir)
+    cert, key = cert_dir / "sim.cert", cert_dir / "sim.key"
+    if not (cert.exists() and key.exists()):
+        cert_dir.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "365",
+             "-subj", "/CN=bambu-sim", "-keyout", str(key), "-out", str(cert)],
+            check=True, capture_output=True,
+        )
+        print(f"[SIM] Generated self-signed certificate {cert}")
+    return cert, key
+
+
+def create_server_context(cert, key):
+    """TLS 1.2 only, like the printer."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.maximum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(str(cert), str(key))
+    return context
+
+
+class SimPrinter:
+    """One simulated A1: a print job loop that produces push_status reports."""
+
+    def __init__(self, serial, job_seconds=600.0, rng=None):
+        self.serial = serial
+        self.topic_report = f"device/{serial}/report"
+        self.topic_request = f"device/{serial}/request"
+        self.job_seconds = job_seconds
+        self.rng = rng or random.Random()
+        self.sequence = 0
+        self.fields = {
+            "gcode_state": "IDLE", "mc_percent": 0, "mc_remaining_time": 0,
+            "layer_num": 0, "total_layer_num": 0, "gcode_file": "",
+            "bed_temper": 25.0, "bed_target_temper": 0.0,
+            "nozzle_temper": 25.0, "nozzle_target_temper": 0.0,
+            "wifi_signal": "-45dBm", "spd_lvl": 2, "print_error": 0,
+            "lights_report": [{"node": "chamber_light", "mode": "on"}],
+        }
+        self._sent = {}
+        self._elapsed = 0.0
+        self._idle_until = 0.0
+        self._last_tick = time.monotonic()
+        # Stagger printers so the fleet is not in lockstep
+        self._start_job(progress=self.rng.random())
+
+    def _start_job(self, progress=0.0):
+        total = self.rng.randrange(150, 400)
+        self._elapsed = progress * self.job_seconds
+        self.fields.update(
+            gcode_state="RUNNING", gcode_file=self.rng.choice(FILES), total_layer_num=total,
+            bed_target_temper=60.0, nozzle_target_temper=220.0,
+        )
+
+    def command(self, name):
+        """Apply a print command. Returns True if it was understood."""
+        state = self.fields["gcode_state"]
+        if name == "pause" and state == "RUNNING":
+            self.fields["gcode_state"] = "PAUSE"
+        elif name == "resume" and state == "PAUSE":
+            self.fields["gcode_state"] = "RUNNING"
+        elif name == "stop" and state in ("RUNNING", "PAUSE"):
+            self._finish("FAILED")
+        elif name not in ("pause", "resume", "stop"):
+            return False
+        return True
+
+    def _finish(self, state):
+        self.fields.update(gcode_state=state, mc_remaining_time=0,
+                           bed_target_temper=0.0, nozzle_target_temper=0.0)
+        self._idle_until = self._elapsed + self.job_seconds / 5
+
+    def _approach(self, name, target, rate, dt):
+        current = self.fields[name]
+        current += (target - current) * min(1.0, rate * dt)
+        noise = self.rng.uniform(-0.4, 0.4) if target > 30 else 0.0
+        self.fields[name] = round(current + noise, 1)
+
+    def tick(self):
+        """Advance the simulation to now."""
+        now = time.monotonic()
+        dt, self._last_tick = now - self._last_tick, now
+        state = self.fields["gcode_state"]
+        if state != "PAUSE":
+            self._elapsed += dt
+        if state == "RUNNING":
+            fraction = min(1.0, self._elapsed / self.job_seconds)
+            self.fields["mc_percent"] = int(fraction * 100)
+            self.fields["layer_num"] = int(fraction * self.fields["total_layer_num"])
+            self.fields["mc_remaining_time"] = int((self.job_seconds - self._elapsed) / 60)
+            if fraction >= 1.0:
+                self._finish("FINISH")
+        elif state in ("FINISH", "FAILED") and self._elapsed >= self._idle_until:
+            self._elapsed = 0.0
+            self.fields.update(mc_percent=0, layer_num=0)
+            self._start_job()
+        self._approach("bed_temper", self.fields["bed_target_temper"] or 25.0, 0.2, dt)
+        self._approach("nozzle_temper", self.fields["nozzle_target_temper"] or 25.0, 0.5, dt)
+
+    def _report(self, fields):
+        self.sequence += 1
+        report = {"command": "push_status", "msg": 1, "sequence_id": str(self.sequence)}
+        report.update(fields)
+        return {"print": report}
+
+    def partial_report(self):
+        """A push_status report with only the fields that moved since the last one."""
+        changed = {k: v for k, v in self.fields.items() if self._sent.get(k) != v}
+        self._sent.update(changed)
+        return self._report(changed)
+
+    def full_report(self):
+        self._sent = dict(self.fields)
+        report = self._report(self.fields)
+        report["print"]["msg"] = 0
+        return report
+
+    def version_report(self, sequence_id):
+        return {"info": {
+            "command": "get_version", "sequence_id": sequence_id, "result": "success", "reason": "",
+            "module": [
+                {"name": "ota", "sw_ver": FIRMWARE_VERSION, "hw_ver": "OTA", "sn": self.serial},
+                {"name": "mc", "sw_ver": "00.00.30.00", "hw_ver": "MC_A1", "sn": self.serial},
+            ],
+        }}
+
+
+class BambuSimulator:
+    """Serves any number of SimPrinters from one asyncio MQTT endpoint."""
+
+    def __init__(self, serials, access_code=DEFAULT_ACCESS_CODE, rate=1.0, job_seconds=600.0,
+                 drop_every=None, drop_rate=0.0, seed=None):
+        rng = random.Random(seed)
+        self.printers = {s: SimPrinter(s, job_seconds, random.Random(rng.random())) for s in serials}
+        self._by_request_topic = {p.topic_request: p for p in self.printers.values()}
+        self.access_code = access_code
+        self.rate = rate
+        self.drop_every = drop_every
+        self.drop_rate = drop_rate
+        self.rng = rng
+        self.sessions = set()
+        self.stats = Counter()
+
+    # ---- fault injection ----
+
+    def drop(self, session):
+        """Cut a connection the way the A1 does: no DISCONNECT, just gone (paho rc=7)."""
+        self.stats["drops"] += 1
+        session.writer.transport.abort()
+
+    def drop_all(self):
+        for session in list(self.sessions):
+            self.drop(session)
+
+    async def _drop_later(self, session):
+        await asyncio.sleep(self.drop_every * self.rng.uniform(0.8, 1.2))
+        if session in self.sessions:
+            self.drop(session)
+
+    # ---- fan-out ----
+
+    def publish(self, topic, message):
+        packet = mq.encode_publish(topic, json.dumps(message).encode())
+        for session in list(self.sessions):
+            if session.wants(topic):
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    self.drop(session)
+                elif session.send(packet):
+                    self.stats["messages_out"] += 1
+
+    async def stream_reports(self):
+        interval = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while True:
+            next_tick += interval
+            for printer in self.printers.values():
+                printer.tick()
+                # Like the printer, keep numbering reports with nobody listening:
+                # a client that was away sees the sequence_id gap
+                report = printer.partial_report()
+                if any(s.wants(printer.topic_report) for s in self.sessions):
+                    self.publish(printer.topic_report, report)
+                    self.stats["reports"] += 1
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    # ---- requests ----
+
+    def handle_request(self, printer, payload):
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            return
+        self.stats["requests"] += 1
+        if not isinstance(request, dict):
+            return
+        pushing = request.get("pushing")
+        if isinstance(pushing, dict) and pushing.get("command") == "pushall":
+            self.stats["pushalls"] += 1
+            printer.tick()
+            report = printer.full_report()
+            report["print"]["sequence_id"] = str(pushing.get("sequence_id", printer.sequence))
+            self.publish(printer.topic_report, report)
+        info = request.get("info")
+        if isinstance(info, dict) and info.get("command") == "get_version":
+            self.publish(printer.topic_report, printer.version_report(info.get("sequence_id", "0")))
+        command = request.get("print")
+        if isinstance(command, dict) and "command" in command:
+            ok = printer.command(command["command"])
+            self.publish(printer.topic_report, {"print": {
+                "command": command["command"], "sequence_id": command.get("sequence_id", "0"),
+                "result": "success" if ok else "failed",
+            }})
+
+    # ---- connections ----
+
+    async def handle(self, reader, writer):
+        session = mq.Session(writer, writer.get_extra_info("peername"))
+        dropper = None
+        try:
+            packet_type, _, body = await asyncio.wait_for(mq.read_packet(reader), CONNECT_TIMEOUT)
+            if packet_type != mq.CONNECT:
+                return
+            info = mq.parse_connect(body)
+            if info["protocol"] != "MQTT" or info["level"] != 4:
+                writer.write(mq.encode_connack(mq.CONNACK_BAD_PROTOCOL))
+                return
+            if info["username"] != "bblp" or info["password"] != self.access_code:
+                self.stats["auth_failures"] += 1
+                writer.write(mq.encode_connack(mq.CONNACK_BAD_CREDENTIALS))
+                return
+            session.client_id = info["client_id"]
+            writer.write(mq.encode_connack(mq.CONNACK_ACCEPTED))
+            self.sessions.add(session)
+            self.stats["connections"] += 1
+            if self.drop_every:
+                dropper = asyncio.ensure_future(self._drop_later(session))
+            # Broker side of keepalive: 1.5x the client's interval
+            timeout = info["keepalive"] * 1.5 or None
+
+            while True:
+                packet_type, flags, body = await asyncio.wait_for(mq.read_packet(reader), timeout)
+                if packet_type == mq.PUBLISH:
+                    topic, payload, qos, packet_id = mq.parse_publish(flags, body)
+                    if qos == 1:
+                        session.send(mq.encode_puback(packet_id))
+                    printer = self._by_request_topic.get(topic)
+                    if printer is not None:
+                        self.handle_request(printer, payload)
+                elif packet_type == mq.SUBSCRIBE:
+                    packet_id, filters = mq.parse_subscribe(body)
+                    session.filters.update(f for f, _ in filters)
+                    session.send(mq.encode_suback(packet_id, [0] * len(filters)))
+                elif packet_type == mq.UNSUBSCRIBE:
+                    packet_id, filters = mq.parse_unsubscribe(body)
+                    session.filters.difference_update(filters)
+                    session.send(mq.encode_unsuback(packet_id))
+                elif packet_type == mq.PINGREQ:
+                    session.send(mq.PINGRESP_PACKET)
+                elif packet_type == mq.DISCONNECT:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError,
+                ssl.SSLError, mq.ProtocolError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            if dropper is not None:
+                dropper.cancel()
+            await mq.close_writer(writer)
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ssl_context=None, report_interval=10.0):
+        server = await asyncio.start_server(self.handle, host, port, ssl=ssl_context)
+        reports = asyncio.ensure_future(self.stream_reports())
+        scheme = "mqtts" if ssl_context else "mqtt"
+        print(f"[SIM] {len(self.printers)} printers on {scheme}://{host}:{port} "
+              f"({self.rate:g} reports/s each)")
+        try:
+            async with server:
+                while True:
+                    await asyncio.sleep(report_interval)
+                    s = self.stats
+                    print(f"[SIM] {len(self.sessions)} clients | {s['reports']} reports, "
+                          f"{s['messages_out']} messages out | {s['requests']} requests "
+                          f"({s['pushalls']} pushall) | {s['drops']} drops")
+        finally:
+            reports.cancel()
+
+
+def start_in_thread(simulator, host="127.0.0.1", port=DEFAULT_PORT, ssl_context=None):
+    """
+    Run a simulator on a background event loop (for benchmarks and tests).
+
+    Returns the loop; call simulator methods such as drop_all() through
+    loop.call_soon_threadsafe().
+    """
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def run():
+        loop.call_later(0.1, ready.set)
+        await simulator.serve(host, port, ssl_context, report_interval=3600)
+
+    threading.Thread(target=loop.run_until_complete, args=(run(),), name="bambu-sim", daemon=True).start()
+    ready.wait(5)
+    return loop
+
+
+def write_fleet_config(path, host, port, serials, access_code, ca_file):
+    """Write a bambu_fleet.py config pointing at the simulated printers."""
+    config = {
+        "ca_file": str(ca_file) if ca_file else None,
+        "printers": [{"name": f"sim-{i + 1:03d}", "host": host, "port": port,
+                      "serial": serial, "access_code": access_code}
+                     for i, serial in enumerate(serials)],
+    }
+    Path(path).write_text(json.dumps(config, indent=2))
+    print(f"[SIM] Wrote fleet config for {len(serials)} printers to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Bambu Lab A1 simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--printers", type=int, default=1, help="number of simulated printers")
+    parser.add_argument("--serial", action="append", help="explicit serial (repeatable)")
+    parser.add_argument("--access-code", default=DEFAULT_ACCESS_CODE)
+    parser.add_argument("--rate", type=float, default=1.0, help="reports per second per printer")
+    parser.add_argument("--job-seconds", type=float, default=600.0, help="length of a simulated print")
+    parser.add_argument("--drop-every", type=float, help="drop each connection after ~N seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance to drop per report sent")
+    parser.add_argument("--cert", help="server certificate (default: generated)")
+    parser.add_argument("--key", help="server private key")
+    parser.add_argument("--cert-dir", default=DEFAULT_CERT_DIR, help="where to keep the generated cert")
+    parser.add_argument("--no-tls", action="store_true", help="plain MQTT, no TLS")
+    parser.add_argument("--fleet-config", help="write a bambu_fleet.py config for these printers")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    serials = args.serial or [f"SIM{i:09d}" for i in range(1, args.printers + 1)]
+    context = cert = None
+    if not args.no_tls:
+        if args.cert:
+            cert, key = args.cert, args.key or args.cert
+        else:
+            cert, key = ensure_certificate(args.cert_dir)
+        context = create_server_context(cert, key)
+    if args.fleet_config:
+        write_fleet_config(args.fleet_config, args.host, args.port, serials, args.access_code, cert)
+
+    simulator = BambuSimulator(serials, args.access_code, args.rate, args.job_seconds,
+                               args.drop_every, args.drop_rate, args.seed)
+    try:
+        asyncio.run(simulator.serve(args.host, args.port, context))
+    except KeyboardInterrupt:
+        print("\n[SIM] Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Incremental printer state for Bambu Lab MQTT reports.
+
+The A1 sends a full report after `pushall` and partial reports afterwards,
+e.g. {"print": {"mc_percent": 42, "command": "push_status", ...}} with only
+the fields that moved. A shallow dict.update() replaces the whole "print"
+section with that partial one and drops everything else in it until the
+next pushall. PrinterState deep-merges reports instead and tells the caller
+exactly which field paths changed.
+
+Paths are tuples of keys, e.g. ("print", "nozzle_temper"). Lists are
+treated as values: a list that differs replaces the old one wholesale.
+
+PrinterStatus is the compact typed view (state, progress, temperatures...)
+that status consumers read instead of digging through the nested dicts.
+"""
+
+from typing import NamedTuple
+
+_MISSING = object()
+
+
+def _merge(current, patch, prefix, changed):
+    """
+    Copy-on-write merge of `patch` into `current`.
+
+    Returns `current` itself if nothing changed, otherwise a new dict that
+    shares every unchanged subtree with `current`. Only dicts on changed
+    paths are copied; `current` is never modified.
+    """
+    updated = None
+    for key, value in patch.items():
+        old = current.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(old, dict):
+            new = _merge(old, value, prefix + (key,), changed)
+            if new is old:
+                continue
+        elif old == value:
+            continue
+        else:
+            # New (or retyped) subtrees are taken as-is; only their root is reported
+            new = value
+            changed.add(prefix + (key,))
+        if updated is None:
+            updated = dict(current)
+        updated[key] = new
+    return current if updated is None else updated
+
+
+class Snapshot(NamedTuple):
+    """An immutable (by contract) view of the state at one version."""
+    version: int
+    data: dict
+
+
+def touches(changed, path):
+    """True if any changed path is `path`, inside it, or contains it."""
+    n = len(path)
+    for c in changed:
+        m = min(n, len(c))
+        if c[:m] == path[:m]:
+            return True
+    return False
+
+
+class PrinterState:
+    """
+    Deep-merged printer state published as copy-on-write snapshots.
+
+    merge() runs in time proportional to the report (plus one shallow copy
+    per dict on a changed path), returns the set of changed paths, and
+    publishes the result as a new Snapshot with a single reference
+    assignment. Readers use `snapshot` (or `data`/`version`) without any
+    locking and always see a consistent version; snapshots are shared and
+    must not be mutated.
+
+    Merges must come from one thread at a time (the MQTT network thread, or
+    callers holding their own lock). merge() takes ownership of `report`.
+    """
+
+    def __init__(self):
+        self.snapshot = Snapshot(0, {})
+
+    @property
+    def data(self):
+        return self.snapshot.data
+
+    @property
+    def version(self):
+        """Bumped on every merge that changed something."""
+        return self.snapshot.version
+
+    def merge(self, report):
+        """Merge a decoded report. Returns the set of changed paths."""
+        current = self.snapshot
+        changed = set()
+        data = _merge(current.data, report, (), changed)
+        if changed:
+            self.snapshot = Snapshot(current.version + 1, data)
+        return changed
+
+    def get(self, path, default=None):
+        """Look up a value by path, e.g. get(("print", "mc_percent"), 0)."""
+        node = self.snapshot.data
+        for key in path:
+            if not isinstance(node, dict):
+                return default
+            node = node.get(key, _MISSING)
+            if node is _MISSING:
+                return default
+        return node
+
+    def section(self, name):
+        """Return a top-level section such as "print" (empty dict if absent)."""
+        return self.snapshot.data.get(name, {})
+
+
+def _convert(kind, value):
+    if value is None and kind is str:
+        return None  # not "None"
+    # Older firmware sends some numbers as strings, e.g. "mc_percent": "42"
+    if kind is not str and isinstance(value, str):
+        value = float(value)
+    return kind(value)
+
+
+# Typed status fields: (attribute, report path, type, default)
+STATUS_FIELDS = (
+    ("state", ("print", "gcode_state"), str, "unknown"),
+    ("progress", ("print", "mc_percent"), int, 0),
+    ("time_remaining", ("print", "mc_remaining_time"), int, 0),
+    ("layer", ("print", "layer_num"), int, 0),
+    ("total_layers", ("print", "total_layer_num"), int, 0),
+    ("bed_temp", ("print", "bed_temper"), float, 0.0),
+    ("nozzle_temp", ("print", "nozzle_temper"), float, 0.0),
+    ("filename", ("print", "gcode_file"), str, "unknown"),
+)
+
+
+def _compile_extractors(fields):
+    """Group fields by report section: ((section, {key: (attr, type, default)}), ...)."""
+    sections = {}
+    for attr, (section, key), kind, default in fields:
+        sections.setdefault(section, {})[key] = (attr, kind, default)
+    return tuple(sections.items())
+
+
+_EXTRACTORS = _compile_extractors(STATUS_FIELDS)
+
+
+class PrinterStatus:
+    """
+    The typed fields status consumers care about, as plain attributes.
+
+    Filled from reports by a precompiled extractor table (STATUS_FIELDS)
+    instead of chains of print_data.get(...). Reports are patches: fields
+    absent from a report keep their value, so feeding every report to
+    update() (or updated()) keeps the status current without a merged
+    state. Values that fail to convert fall back to the field default.
+
+    Supports status["state"] for code that used the old status dicts.
+    """
+
+    __slots__ = ("version", "connected") + tuple(f[0] for f in STATUS_FIELDS)
+
+    def __init__(self):
+        self.version = 0
+        self.connected = False
+        for attr, _, _, default in STATUS_FIELDS:
+            setattr(self, attr, default)
+
+    @classmethod
+    def from_report(cls, report):
+        status = cls()
+        status.update(report)
+        return status
+
+    def _changes(self, report):
+        changes = []
+        for section, extractors in _EXTRACTORS:
+            data = report.get(section)
+            if data.__class__ is not dict:
+                continue
+            # Walk the report rather than the table: partial reports carry a
+            # few keys, and one that touches no field costs no attribute reads
+            for key, value in data.items():
+                extractor = extractors.get(key)
+                if extractor is None:
+                    continue
+                attr, kind, default = extractor
+                if value.__class__ is not kind:
+                    try:
+                        value = _convert(kind, value)
+                    except (TypeError, ValueError, OverflowError):
+                        value = default
+                if value != getattr(self, attr):
+                    changes.append((attr, value))
+        return changes
+
+    def update(self, report):
+        """Apply a report in place. Returns True if any field changed."""
+        changes = self._changes(report)
+        for attr, value in changes:
+            setattr(self, attr, value)
+        return bool(changes)
+
+    def updated(self, report):
+        """Copy-on-write update: a new status with version + 1, or self if unchanged."""
+        changes = self._changes(report)
+        if not changes:
+            return self
+        status = self.copy()
+        status.version += 1
+        for attr, value in changes:
+            setattr(status, attr, value)
+        return status
+
+    def copy(self):
+        new = PrinterStatus.__new__(PrinterStatus)
+        for attr in self.__slots__:
+            setattr(new, attr, getattr(self, attr))
+        return new
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr in self.__slots__)
+        return f"PrinterStatus({fields})"
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Shared TLS setup for Bambu Lab printer connections.
+
+All clients here need the same thing: TLS 1.2 (the A1 requires it), the
+Bambu CA certificates, no hostname check (printer certs are issued to the
+serial, not the IP) and no strict X509 flags (needed for Python 3.13+).
+get_ssl_context() builds that context once per process and hands the same
+object to every client, bridge and fleet connection, so reconnect storms
+no longer reload certificates from disk.
+
+The CAs come from bambu_certs/bambu_ca_bundle.pem, a concatenation of
+the individual .cert files. Every certificate in it must match one of
+the pinned SHA-256 fingerprints below; a bundle with anything else in it
+is refused instead of trusted. Rebuild it after adding a certificate
+(and its pin) with:
+
+    python3 bambu_tls.py
+
+Contexts offer TLS session resumption: the session from the last good
+handshake with a printer is offered again on reconnect, which turns the
+full RSA handshake on the printer's weak CPU into an abbreviated one
+when the printer accepts it. Handshake times and the resumption hit rate
+are kept on the context (context.stats()).
+"""
+
+import functools
+import hashlib
+import os
+import re
+import ssl
+import threading
+import time
+from pathlib import Path
+
+CERT_DIR = Path(__file__).parent / "bambu_certs"
+CERT_FILES = ("bambu.cert", "bambu_p2s_250626.cert", "bambu_h2c_251122.cert")
+BUNDLE_FILE = CERT_DIR / "bambu_ca_bundle.pem"
+
+# SHA-256 of the DER encoding, as printed by `openssl x509 -fingerprint -sha256`
+PINNED_SHA256 = {
+    "030bca81cece18b7eff3cfd2b75d09d3efca893bc069609e37fa04257fe4d840": "BBL CA",
+    "6a854d546ed6e3ce7a2112657e53f4555374413e6f5cb55f995d1ddd7c06dc69": "BBL Device CA N7-V2",
+    "ce667b6c001d26c34ed97333fb6099699409fc3d4e12429c37baebb05c46c60a": "BBL Device CA O1C2-V2",
+}
+
+_PEM_RE = re.compile(r"-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----", re.DOTALL)
+
+
+class PinningError(ValueError):
+    """A CA certificate did not match any pinned fingerprint."""
+
+
+def split_pem(text):
+    """Return the individual PEM certificates in `text`."""
+    return _PEM_RE.findall(text)
+
+
+def fingerprint(pem):
+    """SHA-256 hex digest of a PEM certificate's DER encoding."""
+    return hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem)).hexdigest()
+
+
+def check_pins(pems, pinned=PINNED_SHA256, source="bundle"):
+    for pem in pems:
+        digest = fingerprint(pem)
+        if digest not in pinned:
+            raise PinningError(f"{source}: certificate {digest} is not pinned")
+    missing = set(pinned) - {fingerprint(pem) for pem in pems}
+    if missing:
+        print(f"[SSL] WARNING: {source} lacks {', '.join(pinned[d] for d in sorted(missing))}")
+
+
+def build_bundle(cert_dir=CERT_DIR, bundle_file=BUNDLE_FILE):
+    """Concatenate the individual CA files into the bundle, checking every pin."""
+    pems = []
+    for name in CERT_FILES:
+        path = Path(cert_dir) / name
+        if path.exists():
+            pems.extend(split_pem(path.read_text()))
+    check_pins(pems, source=str(cert_dir))
+    tmp_path = f"{bundle_file}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(pems) + "\n")
+    os.replace(tmp_path, bundle_file)
+    return pems
+
+
+def load_bundle(bundle_file=BUNDLE_FILE):
+    """
+    Return the pinned CA bundle as PEM text, or None if there are no certs.
+
+    Falls back to concatenating the individual .cert files in memory when
+    the bundle has not been built.
+    """
+    bundle_file = Path(bundle_file)
+    if bundle_file.exists():
+        pems = split_pem(bundle_file.read_text())
+        source = bundle_file.name
+    else:
+        pems = []
+        for name in CERT_FILES:
+            path = CERT_DIR / name
+            if path.exists():
+                pems.extend(split_pem(path.read_text()))
+        source = str(CERT_DIR)
+    if not pems:
+        return None
+    check_pins(pems, source=source)
+    return "\n".join(pems)
+
+
+class TimedSSLSocket(ssl.SSLSocket):
+    """SSLSocket that reports handshake duration and outcome to its context."""
+
+    _handshake_started = None
+
+    def do_handshake(self, block=False):
+        # Non-blocking callers retry on SSLWantRead/Write: time from the first try
+        if self._handshake_started is None:
+            self._handshake_started = time.perf_counter()
+        super().do_handshake(block)
+        self.context.record_handshake(self, time.perf_counter() - self._handshake_started)
+
+
+def _session_key(server_hostname, sock):
+    try:
+        peer = sock.getpeername()[:2]
+    except OSError:
+        peer = None
+    return server_hostname, peer
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    Client context that resumes TLS sessions per server.
+
+    wrap_socket() offers the session saved from the last successful
+    handshake with the same server_hostname and peer address. Sessions
+    the server no longer accepts just cost a full handshake.
+    """
+
+    sslsocket_class = TimedSSLSocket
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT, resume=True):
+        self.resume = resume
+        self._sessions = {}
+        self._stats_lock = threading.Lock()
+        self.handshakes = 0
+        self.offered = 0          # handshakes where a saved session was offered
+        self.resumed = 0          # ... and the server accepted it
+        self.full_time = 0.0      # total seconds spent in full handshakes
+        self.resumed_time = 0.0   # total seconds spent in resumed handshakes
+        self.last_handshake = None
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and self.resume and not server_side:
+            session = self._sessions.get(_session_key(server_hostname, sock))
+        return super().wrap_socket(
+            sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname,
+            session=session,
+        )
+
+    def record_handshake(self, sock, seconds):
+        key = _session_key(sock.server_hostname, sock)
+        with self._stats_lock:
+            self.handshakes += 1
+            if sock.session_reused:
+                self.resumed += 1
+                self.resumed_time += seconds
+            else:
+                self.full_time += seconds
+            if self.resume and sock.session is not None:
+                if key in self._sessions:
+                    self.offered += 1
+                self._sessions[key] = sock.session
+            self.last_handshake = {"seconds": seconds, "resumed": sock.session_reused}
+
+    def stats(self):
+        with self._stats_lock:
+            full = self.handshakes - self.resumed
+            return {
+                "handshakes": self.handshakes,
+                "resumed": self.resumed,
+                "hit_rate": self.resumed / self.offered if self.offered else 0.0,
+                "avg_full_ms": self.full_time / full * 1000 if full else 0.0,
+                "avg_resumed_ms": self.resumed_time / self.resumed * 1000 if self.resumed else 0.0,
+            }
+
+
+def create_ssl_context(cadata, resume=True):
+    """A new (uncached) TLS 1.2 client context trusting `cadata`."""
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT, resume=resume)
+    # TLS 1.2 is REQUIRED - the A1 drops TLS 1.3 connections
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.maximum_version = ssl.TLSVersion.TLSv1_2
+    context.check_hostname = False
+    if cadata is None:
+        print("[SSL] WARNING: No certificates loaded, using insecure mode")
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    context.load_verify_locations(cadata=cadata)
+    context.verify_flags &= ~ssl.VERIFY_X509_STRICT
+    return context
+
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context(ca_file=None):
+    """
+    The process-wide TLS 1.2 client context for Bambu printers.
+
+    With no argument the pinned Bambu bundle is used. `ca_file` trusts a
+    different CA instead (e.g. the local simulator's self-signed cert) and
+    is not pin-checked. Contexts are cached per ca_file and shared: do not
+    modify the returned object.
+    """
+    if ca_file:
+        context = create_ssl_context(Path(ca_file).read_text())
+        print(f"[SSL] TLS 1.2 context with CA {ca_file}")
+    else:
+        cadata = load_bundle()
+        context = create_ssl_context(cadata)
+        if cadata is not None:
+            print(f"[SSL] TLS 1.2 context with {len(split_pem(cadata))} pinned Bambu CAs")
+    return context
+
+
+if __name__ == "__main__":
+    pems = build_bundle()
+    print(f"Wrote {BUNDLE_FILE} with {len(pems)} certificates:")
+    for pem in pems:
+        digest = fingerprint(pem)
+        print(f"  {digest}  {PINNED_SHA256[digest]}")
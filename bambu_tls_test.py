@@ -12,17 +12,19 @@ import sys
 import time
 import paho.mqtt.client as mqtt
 
+from bambu_tls import BUNDLE_FILE, get_ssl_context, load_bundle
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_PORT = 8883
 PRINTER_SERIAL = "03919c460100975"
 ACCESS_CODE = "33125022"
-CERT_FILE = "/root/.openclaw/workspace/bambu_certs/bambu.cert"
+CERT_FILE = str(BUNDLE_FILE)
 
 TOPIC_REPORT = f"device/{PRINTER_SERIAL}/report"
 
 
-def test_connection(name, tls_version=None, use_ssl_context=False):
+def test_connection(name, tls_version=None, use_ssl_context=False, context=None):
     """Test a specific TLS configuration"""
     print(f"\n{'='*60}")
     print(f"TEST: {name}")
@@ -62,13 +64,17 @@ def test_connection(name, tls_version=None, use_ssl_context=False):
     client.username_pw_set("bblp", ACCESS_CODE)
     
     try:
-        if use_ssl_context:
+        if context is not None:
+            # The shared context every client uses
+            client.tls_set_context(context)
+            print(f"  Using shared SSLContext (bambu_tls)")
+        elif use_ssl_context:
             # Test with SSLContext
             context = ssl.create_default_context()
             if tls_version:
                 context.minimum_version = tls_version
                 context.maximum_version = tls_version
-            context.load_verify_locations(cafile=CERT_FILE)
+            context.load_verify_locations(cadata=load_bundle())
             context.check_hostname = False
             context.verify_flags &= ~ssl.VERIFY_X509_STRICT
             client.tls_set_context(context)
@@ -152,6 +158,18 @@ def main():
     
     time.sleep(1)
     
+    # Test 2b: the shared TLS 1.2 context the clients actually use
+    try:
+        results.append(("Shared TLS 1.2 context", test_connection(
+            "Shared TLS 1.2 context (bambu_tls.get_ssl_context)",
+            context=get_ssl_context()
+        )))
+    except Exception as e:
+        print(f"Test error: {e}")
+        results.append(("Shared TLS 1.2 context", False))
+    
+    time.sleep(1)
+    
     # Test 3: TLS 1.3 (if supported)
     try:
         results.append(("TLS 1.3", test_connection(
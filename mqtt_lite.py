@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Minimal MQTT 3.1.1 packet codec for local broker stand-ins.
+
+Just enough of the protocol for what the printer speaks and paho sends:
+CONNECT/CONNACK, PUBLISH (QoS 0/1), PUBACK, SUBSCRIBE/SUBACK,
+UNSUBSCRIBE/UNSUBACK, PINGREQ/PINGRESP and DISCONNECT. Used by the A1
+simulator (bambu_sim.py) and the bridge's local relay endpoint.
+
+Packets are read from an asyncio StreamReader with read_packet() and
+built as bytes by the encode_* helpers; the parse_* helpers raise
+ProtocolError for malformed bodies. Session is the broker-side view
+of one connected client (subscriptions, backpressure).
+"""
+
+import functools
+import struct
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# CONNACK return codes
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+CONNACK_BAD_CREDENTIALS = 4
+CONNACK_NOT_AUTHORIZED = 5
+
+MAX_PACKET_SIZE = 1 << 20  # the printer's reports are a few KB
+MAX_WRITE_BUFFER = 1 << 20  # slow subscribers beyond this are cut off
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_remaining_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_packet(packet_type, flags, body=b""):
+    return bytes([(packet_type << 4) | flags]) + encode_remaining_length(len(body)) + body
+
+
+def encode_string(value):
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    return struct.pack(">H", len(data)) + data
+
+
+async def read_packet(reader):
+    """Read one packet. Returns (type, flags, body); raises IncompleteReadError at EOF."""
+    header = (await reader.readexactly(1))[0]
+    length, multiplier = 0, 1
+    for _ in range(4):
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    else:
+        raise ProtocolError("malformed remaining length")
+    if length > MAX_PACKET_SIZE:
+        raise ProtocolError(f"packet too large ({length} bytes)")
+    body = await reader.readexactly(length) if length else b""
+    return header >> 4, header & 0x0F, body
+
+
+def _read_string(body, pos):
+    (length,) = struct.unpack_from(">H", body, pos)
+    pos += 2
+    if pos + length > len(body):
+        raise ProtocolError("string runs past the end of the packet")
+    return body[pos:pos + length], pos + length
+
+
+def _parser(parse):
+    """Report a truncated or undecodable packet body as ProtocolError."""
+    @functools.wraps(parse)
+    def wrapper(*args):
+        try:
+            return parse(*args)
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ProtocolError(f"malformed {parse.__name__[6:].upper()}: {e}") from e
+    return wrapper
+
+
+@_parser
+def parse_connect(body):
+    """Returns a dict with protocol, level, client_id, username, password, keepalive, clean_session."""
+    protocol, pos = _read_string(body, 0)
+    level, flags = body[pos], body[pos + 1]
+    (keepalive,) = struct.unpack_from(">H", body, pos + 2)
+    pos += 4
+    client_id, pos = _read_string(body, pos)
+    if flags & 0x04:  # will topic + message
+        _, pos = _read_string(body, pos)
+        _, pos = _read_string(body, pos)
+    username = password = None
+    if flags & 0x80:
+        username, pos = _read_string(body, pos)
+        username = username.decode("utf-8")
+    if flags & 0x40:
+        password, pos = _read_string(body, pos)
+        password = password.decode("utf-8")
+    return {
+        "protocol": protocol.decode("utf-8", "replace"),
+        "level": level,
+        "client_id": client_id.decode("utf-8", "replace"),
+        "username": username,
+        "password": password,
+        "keepalive": keepalive,
+        "clean_session": bool(flags & 0x02),
+    }
+
+
+@_parser
+def parse_publish(flags, body):
+    """Returns (topic, payload, qos, packet_id)."""
+    topic, pos = _read_string(body, 0)
+    qos = (flags >> 1) & 0x03
+    packet_id = None
+    if qos:
+        (packet_id,) = struct.unpack_from(">H", body, pos)
+        pos += 2
+    return topic.decode("utf-8"), body[pos:], qos, packet_id
+
+
+@_parser
+def parse_subscribe(body):
+    """Returns (packet_id, [(topic_filter, qos), ...])."""
+    (packet_id,) = struct.unpack_from(">H", body, 0)
+    pos, filters = 2, []
+    while pos < len(body):
+        topic, pos = _read_string(body, pos)
+        filters.append((topic.decode("utf-8"), body[pos] & 0x03))
+        pos += 1
+    return packet_id, filters
+
+
+@_parser
+def parse_unsubscribe(body):
+    """Returns (packet_id, [topic_filter, ...])."""
+    (packet_id,) = struct.unpack_from(">H", body, 0)
+    pos, filters = 2, []
+    while pos < len(body):
+        topic, pos = _read_string(body, pos)
+        filters.append(topic.decode("utf-8"))
+    return packet_id, filters
+
+
+def encode_connack(return_code, session_present=False):
+    return encode_packet(CONNACK, 0, bytes([1 if session_present else 0, return_code]))
+
+
+def encode_publish(topic, payload, qos=0, packet_id=None, retain=False):
+    body = encode_string(topic)
+    if qos:
+        body += struct.pack(">H", packet_id)
+    return encode_packet(PUBLISH, (qos << 1) | (1 if retain else 0), body + payload)
+
+
+def encode_puback(packet_id):
+    return encode_packet(PUBACK, 0, struct.pack(">H", packet_id))
+
+
+def encode_suback(packet_id, granted):
+    return encode_packet(SUBACK, 0, struct.pack(">H", packet_id) + bytes(granted))
+
+
+def encode_unsuback(packet_id):
+    return encode_packet(UNSUBACK, 0, struct.pack(">H", packet_id))
+
+
+PINGRESP_PACKET = encode_packet(PINGRESP, 0)
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter match with + and # wildcards."""
+    if topic_filter == topic:
+        return True
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+async def close_writer(writer):
+    """Close a StreamWriter, ignoring errors from an already-dead connection."""
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+
+class Session:
+    """One connected MQTT client."""
+
+    def __init__(self, writer, peer):
+        self.writer = writer
+        self.peer = peer
+        self.client_id = ""
+        self.filters = set()
+
+    def wants(self, topic):
+        return topic in self.filters or any(topic_matches(f, topic) for f in self.filters)
+
+    def send(self, packet):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return False
+        if transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            transport.abort()
+            return False
+        self.writer.write(packet)
+        return True
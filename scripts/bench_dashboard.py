@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark dashboard data extraction on a synthetic usage database.
+
+Times the dashboard's three generations separately, so each step's gain
+is visible on its own:
+
+- one SQL statement per widget, each scanning usage_logs/api_calls;
+- the same per-widget statements against the daily rollup tables;
+- get_dashboard_data()'s single pass: one grouped result set per rollup
+  table, everything else derived in Python.
+
+Usage:
+    python3 bench_dashboard.py [rows] [db_path]
+
+The database is built once and reused on later runs with the same path.
+"""
+
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from generate_dashboard import build_dashboard_data, fetch_dashboard_rows
+from usage_db import init_db
+from usage_tracker import MODEL_COSTS, API_COSTS, estimate_cost
+
+# The statements the dashboard used to run, one per widget, all on raw logs
+RAW_QUERIES = [
+    """SELECT date(timestamp) as day, COUNT(*), SUM(input_tokens), SUM(output_tokens),
+              SUM(total_tokens), SUM(estimated_cost_usd)
+       FROM usage_logs WHERE timestamp >= date('now', '-30 days')
+       GROUP BY date(timestamp) ORDER BY day""",
+    """SELECT date(timestamp) as day, model, SUM(estimated_cost_usd), 'model'
+       FROM usage_logs WHERE timestamp >= date('now', '-30 days')
+         AND model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'
+       GROUP BY date(timestamp), model""",
+    """SELECT date(timestamp) as day, model, COUNT(*)
+       FROM usage_logs WHERE timestamp >= date('now', '-30 days')
+         AND model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'
+       GROUP BY date(timestamp), model""",
+    """SELECT date(timestamp) as day, api_name, SUM(cost_usd), 'api'
+       FROM api_calls WHERE timestamp >= date('now', '-30 days')
+       GROUP BY date(timestamp), api_name""",
+    """SELECT date(timestamp) as day, api_name, COUNT(*)
+       FROM api_calls WHERE timestamp >= date('now', '-30 days')
+       GROUP BY date(timestamp), api_name""",
+    """SELECT model, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens),
+              SUM(estimated_cost_usd) as cost
+       FROM usage_logs WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'
+       GROUP BY model ORDER BY SUM(total_tokens) DESC""",
+    """SELECT api_name, COUNT(*), SUM(cost_usd) as cost FROM api_calls
+       GROUP BY api_name ORDER BY cost DESC""",
+    """SELECT model, SUM(estimated_cost_usd) FROM usage_logs
+       WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%' GROUP BY model""",
+    """SELECT api_name, SUM(cost_usd) FROM api_calls GROUP BY api_name""",
+    """SELECT api_name, COUNT(*) as calls FROM api_calls
+       GROUP BY api_name ORDER BY calls DESC LIMIT 1""",
+    """SELECT COUNT(*) FROM api_calls""",
+    """SELECT COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens),
+              SUM(estimated_cost_usd)
+       FROM usage_logs WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'""",
+    """SELECT SUM(cost_usd) FROM api_calls""",
+]
+
+# The same widgets once the rollup tables existed, before the single pass
+ROLLUP_QUERIES = [
+    """SELECT day, SUM(requests), SUM(input_tokens), SUM(output_tokens),
+              SUM(input_tokens + output_tokens), SUM(cost)
+       FROM daily_usage_rollup WHERE day >= date('now', '-30 days')
+       GROUP BY day ORDER BY day""",
+    """SELECT day, model, cost, 'model'
+       FROM daily_usage_rollup WHERE day >= date('now', '-30 days')
+         AND model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'""",
+    """SELECT day, model, requests
+       FROM daily_usage_rollup WHERE day >= date('now', '-30 days')
+         AND model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'""",
+    """SELECT day, api_name, cost, 'api'
+       FROM daily_api_rollup WHERE day >= date('now', '-30 days')""",
+    """SELECT day, api_name, calls
+       FROM daily_api_rollup WHERE day >= date('now', '-30 days')""",
+    """SELECT model, SUM(requests), SUM(input_tokens), SUM(output_tokens),
+              SUM(input_tokens + output_tokens) as total_tokens, SUM(cost)
+       FROM daily_usage_rollup WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'
+       GROUP BY model ORDER BY total_tokens DESC""",
+    """SELECT api_name, SUM(calls), SUM(cost) as cost FROM daily_api_rollup
+       GROUP BY api_name ORDER BY cost DESC""",
+    """SELECT model, SUM(cost) FROM daily_usage_rollup
+       WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%' GROUP BY model""",
+    """SELECT api_name, SUM(cost) FROM daily_api_rollup GROUP BY api_name""",
+    """SELECT api_name, SUM(calls) as calls FROM daily_api_rollup
+       GROUP BY api_name ORDER BY calls DESC LIMIT 1""",
+    """SELECT SUM(calls) FROM daily_api_rollup""",
+    """SELECT SUM(requests), SUM(input_tokens), SUM(output_tokens),
+              SUM(input_tokens + output_tokens), SUM(cost)
+       FROM daily_usage_rollup WHERE model NOT LIKE 'kimi-coding/%' AND model NOT LIKE 'kimi/%'""",
+    """SELECT SUM(cost) FROM daily_api_rollup""",
+]
+
+
+def build_database(db_path, rows, days=90):
+    """Fill a fresh database with `rows` usage rows and rows/10 API calls."""
+    conn = init_db(db_path)
+    models = list(MODEL_COSTS)
+    apis = list(API_COSTS)
+    now = datetime.utcnow()
+    rng = random.Random(42)
+
+    def stamp():
+        return (now - timedelta(seconds=rng.randrange(days * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+    def usage_batch(n):
+        for _ in range(n):
+            model = rng.choice(models)
+            inp, out = rng.randrange(100, 4000), rng.randrange(50, 2000)
+            yield (stamp(), "bench", model, inp, out, inp + out, estimate_cost(model, inp, out))
+
+    def api_batch(n):
+        for _ in range(n):
+            yield (stamp(), rng.choice(apis), "", rng.random() / 100)
+
+    batch = 50_000
+    for start in range(0, rows, batch):
+        with conn:
+            conn.executemany("""
+                INSERT INTO usage_logs (timestamp, session_key, model, input_tokens, output_tokens,
+                                        total_tokens, estimated_cost_usd)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, usage_batch(min(batch, rows - start)))
+    with conn:
+        conn.executemany(
+            "INSERT INTO api_calls (timestamp, api_name, endpoint, cost_usd) VALUES (?, ?, ?, ?)",
+            api_batch(rows // 10),
+        )
+    conn.close()
+
+
+def run(label, fn, conn, repeat=3):
+    statements = []
+    conn.set_trace_callback(lambda sql: statements.append(sql))
+    best = float("inf")
+    for _ in range(repeat):
+        statements.clear()
+        start = time.perf_counter()
+        fn(conn)
+        best = min(best, time.perf_counter() - start)
+    conn.set_trace_callback(None)
+    selects = sum(1 for sql in statements if sql.lstrip().upper().startswith("SELECT"))
+    print(f"{label:<28} {selects:>8} {best * 1000:>12.1f}")
+    return best
+
+
+def per_widget(queries):
+    def run_queries(conn):
+        for sql in queries:
+            conn.execute(sql).fetchall()
+    return run_queries
+
+
+def single_pass(conn):
+    usage_rows, api_rows = fetch_dashboard_rows(conn)
+    build_dashboard_data(usage_rows, api_rows)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    db_path = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(tempfile.gettempdir()) / f"mimir_bench_{rows}.db"
+
+    if not db_path.exists():
+        print(f"Building {rows:,} usage rows + {rows // 10:,} API calls in {db_path}...")
+        start = time.perf_counter()
+        build_database(db_path, rows)
+        print(f"Built in {time.perf_counter() - start:.1f}s")
+
+    conn = sqlite3.connect(db_path)
+    print()
+    print(f"{'Approach':<28} {'Queries':>8} {'Best (ms)':>12}")
+    print("-" * 50)
+    raw = run("per-widget queries (raw)", per_widget(RAW_QUERIES), conn)
+    rollup = run("per-widget queries (rollups)", per_widget(ROLLUP_QUERIES), conn)
+    single = run("single pass (rollups)", single_pass, conn)
+    print("-" * 50)
+    print(f"Rollup tables:  {raw / rollup:.0f}x (raw -> rollup per-widget queries)")
+    print(f"Single pass:    {rollup / single:.1f}x (rollup per-widget queries -> single pass)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
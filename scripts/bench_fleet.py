@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load test of FleetManager against 50 simulated printers.
+
+Runs the A1 simulator in-process, points a FleetManager at all of its
+printers and checks that every one of them connects and keeps receiving
+reports, then drops every connection at once (a router reboot, say) and
+checks the fleet reconnects and recovers. Connection attempts run on
+FleetManager's connect pool, so the loop keeps serving the printers that
+are already up while the others handshake; the loop-lag column is the
+longest gap between two passes over the selector.
+
+Usage:
+    python3 bench_fleet.py [printers] [seconds] [port]
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bambu_fleet
+import bambu_sim
+from bambu_tls import create_ssl_context
+
+RATE = 2.0  # reports per second per printer
+
+
+def wait_for(predicate, timeout):
+    start = time.monotonic()
+    while not predicate():
+        if time.monotonic() - start > timeout:
+            return None
+        time.sleep(0.01)
+    return time.monotonic() - start
+
+
+class LagProbe:
+    """Wraps the fleet's selector to record the longest loop pass outside select()."""
+
+    def __init__(self, selector):
+        self._selector = selector
+        self._returned = None
+        self.max_lag = 0.0
+
+    def select(self, timeout=None):
+        if self._returned is not None:
+            self.max_lag = max(self.max_lag, time.monotonic() - self._returned)
+        events = self._selector.select(timeout)
+        self._returned = time.monotonic()
+        return events
+
+    def reset(self):
+        self.max_lag = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+def receiving(fleet, seconds):
+    """Printers whose message count grew over `seconds`."""
+    before = {name: p.messages for name, p in fleet.printers.items()}
+    time.sleep(seconds)
+    return [name for name, p in fleet.printers.items() if p.messages > before[name]]
+
+
+def phase(label, fleet, probe, count, seconds, timeout):
+    probe.reset()
+    took = wait_for(lambda: fleet.summary()["connected"] == count, timeout)
+    connected = fleet.summary()["connected"]
+    assert took is not None, f"{label}: only {connected}/{count} printers connected after {timeout:.0f}s"
+    live = receiving(fleet, seconds)
+    assert len(live) == count, f"{label}: {count - len(live)} printers stopped receiving reports"
+    return (f"{label:<16} {connected:>5}/{count:<4} {took * 1000:>12.0f} {len(live):>10} "
+            f"{probe.max_lag * 1000:>14.1f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else 18884
+
+    cert, key = bambu_sim.ensure_certificate()
+    serials = [f"SIM{i:09d}" for i in range(1, count + 1)]
+    simulator = bambu_sim.BambuSimulator(serials, rate=RATE, seed=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loop = bambu_sim.start_in_thread(simulator, "127.0.0.1", port,
+                                         bambu_sim.create_server_context(cert, key))
+    printers = [bambu_fleet.FleetPrinter(f"sim-{i + 1:03d}", "127.0.0.1", serial,
+                                         bambu_sim.DEFAULT_ACCESS_CODE, port)
+                for i, serial in enumerate(serials)]
+    fleet = bambu_fleet.FleetManager(printers, ssl_context=create_ssl_context(Path(cert).read_text()))
+    probe = fleet._selector = LagProbe(fleet._selector)
+
+    print(f"{count} printers at {RATE:g} reports/s against the simulator on port {port}")
+    rows = []
+    # The fleet logs every (re)connect; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        fleet.start()
+        try:
+            rows.append(phase("connect", fleet, probe, count, seconds, timeout=30))
+            loop.call_soon_threadsafe(simulator.drop_all)
+            wait_for(lambda: fleet.summary()["connected"] < count, 5)
+            # Reconnects are due after the 1s backoff
+            rows.append(phase("after drop_all", fleet, probe, count, seconds, timeout=30))
+        finally:
+            fleet.stop()
+    print()
+    print(f"{'Phase':<16} {'Connected':>10} {'Time (ms)':>12} {'Receiving':>10} {'Loop lag (ms)':>14}")
+    print("-" * 66)
+    for row in rows:
+        print(row)
+    summary = fleet.summary()
+    print()
+    print(f"{summary['messages']} messages, {summary['disconnects']} disconnects, "
+          f"{summary['pushalls']} pushalls, TLS resumed {summary['tls']['hit_rate'] * 100:.0f}% of {summary['tls']['handshakes']} handshakes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark reconnects after a dropped connection, with and without TLS
+session resumption.
+
+Runs the A1 simulator in-process, connects a BambuA1Client to it, then
+repeatedly drops the connection the way the printer does (rc=7) and
+measures the TLS handshake and the time from the drop to the first
+report on the new connection. The client's 1s reconnect delay is part of
+time-to-first-report; the handshake column is what resumption saves on
+each reconnect (on a real A1 the full handshake is much slower than on
+localhost).
+
+Usage:
+    python3 bench_reconnect.py [drops] [port]
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bambu_a1_working as a1
+import bambu_sim
+from bambu_tls import create_ssl_context
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("simulator did not respond in time")
+        time.sleep(0.005)
+
+
+def run(label, cadata, resume, loop, simulator, drops):
+    client = a1.BambuA1Client(ssl_context=create_ssl_context(cadata, resume=resume))
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not client.connect():
+            raise RuntimeError("could not connect to the simulator")
+        wait_for(lambda: len(client.time_to_first_report) == 1)
+        for i in range(drops):
+            loop.call_soon_threadsafe(simulator.drop_all)
+            wait_for(lambda: len(client.time_to_first_report) == i + 2)
+        client.disconnect()
+    metrics = client.get_metrics()
+    tls = metrics["tls"]
+    after_drop = list(client.time_to_first_report)[1:]
+    handshake_ms = tls["avg_resumed_ms"] if resume and tls["resumed"] else tls["avg_full_ms"]
+    print(f"{label:<20} {tls['handshakes']:>10} {tls['hit_rate'] * 100:>9.0f}% "
+          f"{handshake_ms:>14.2f} {sum(after_drop) / len(after_drop) * 1000:>12.0f}")
+
+
+def main():
+    drops = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 18883
+
+    cert, key = bambu_sim.ensure_certificate()
+    simulator = bambu_sim.BambuSimulator([a1.PRINTER_SERIAL], access_code=a1.ACCESS_CODE, rate=5)
+    loop = bambu_sim.start_in_thread(simulator, "127.0.0.1", port,
+                                     bambu_sim.create_server_context(cert, key))
+    a1.PRINTER_IP, a1.PRINTER_PORT = "127.0.0.1", port
+    cadata = Path(cert).read_text()
+
+    print(f"{drops} drops per run against the simulator on port {port}")
+    print()
+    print(f"{'TLS sessions':<20} {'Handshakes':>10} {'Resumed':>10} {'Handshake (ms)':>14} "
+          f"{'TTFR (ms)':>12}")
+    print("-" * 70)
+    run("full handshake", cadata, False, loop, simulator, drops)
+    run("resumed", cadata, True, loop, simulator, drops)
+
+
+if __name__ == "__main__":
+    main()
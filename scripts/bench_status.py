@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of MQTT message -> printer status conversion.
+
+Compares the dict-building get_status() the clients used to run on every
+report (a chain of print_data.get(...) calls into a fresh dict) with
+PrinterStatus, whose precompiled extractor table fills typed slots.
+Payloads are decoded up front so only the conversion is timed; a second
+table times what a status poller pays per read.
+
+Usage:
+    python3 bench_status.py [messages]
+"""
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bambu_state import PrinterStatus
+
+
+def make_messages(count):
+    """A pushall-sized full report followed by partial push_status reports."""
+    rng = random.Random(42)
+    full = {"print": {
+        "command": "push_status", "sequence_id": "0", "gcode_state": "RUNNING",
+        "mc_percent": 0, "mc_remaining_time": 120, "layer_num": 0, "total_layer_num": 250,
+        "bed_temper": 60.0, "bed_target_temper": 60.0, "nozzle_temper": 220.0,
+        "nozzle_target_temper": 220.0, "gcode_file": "benchy.gcode", "wifi_signal": "-45dBm",
+        "ams": {"ams": [], "tray_now": "255"}, "lights_report": [{"node": "chamber_light", "mode": "on"}],
+    }}
+    messages = [full]
+    for i in range(1, count):
+        report = {"command": "push_status", "sequence_id": str(i)}
+        if i % 3 == 0:
+            report["mc_percent"] = min(100, i // 100)
+            report["layer_num"] = i // 40
+        report["nozzle_temper"] = round(220 + rng.uniform(-1, 1), 1)
+        report["bed_temper"] = round(60 + rng.uniform(-0.5, 0.5), 1)
+        messages.append({"print": report})
+    # Round-trip so the dicts look exactly like decoded MQTT payloads
+    return [json.loads(json.dumps(m)) for m in messages]
+
+
+def dict_status(print_data):
+    # What BambuA1Client.get_status() / PrinterBridge.get_status() used to do
+    return {
+        "state": print_data.get("gcode_state", "unknown"),
+        "progress": print_data.get("mc_percent", 0),
+        "time_remaining": print_data.get("mc_remaining_time", 0),
+        "layer": print_data.get("layer_num", 0),
+        "total_layers": print_data.get("total_layer_num", 0),
+        "bed_temp": print_data.get("bed_temper", 0),
+        "nozzle_temp": print_data.get("nozzle_temper", 0),
+        "filename": print_data.get("gcode_file", "unknown"),
+    }
+
+
+def legacy(messages):
+    print_data = {}
+    for report in messages:
+        print_data.update(report.get("print", {}))
+        status = dict_status(print_data)
+    return status
+
+
+def typed_in_place(messages):
+    status = PrinterStatus()
+    for report in messages:
+        status.update(report)
+    return status
+
+
+def typed_copy_on_write(messages):
+    status = PrinterStatus()
+    for report in messages:
+        status = status.updated(report)
+    return status
+
+
+def legacy_reads(print_data, count):
+    for _ in range(count):
+        status = dict_status(print_data)
+        status["state"], status["progress"], status["nozzle_temp"]
+
+
+def typed_reads(status, count):
+    for _ in range(count):
+        status.state, status.progress, status.nozzle_temp
+
+
+def run(label, fn, args, count, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {best * 1000:>10.1f} {best / count * 1e9:>10.0f}")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    messages = make_messages(count)
+
+    # Sanity check: both approaches agree on the final status
+    expected = legacy(messages)
+    actual = typed_in_place(messages).as_dict()
+    for key, value in expected.items():
+        assert actual[key] == value, (key, actual[key], value)
+
+    print(f"{count:,} messages")
+    print()
+    print(f"{'Message -> status':<32} {'Best (ms)':>10} {'ns/msg':>10}")
+    print("-" * 54)
+    run("dict get() chain", legacy, (messages,), count)
+    run("PrinterStatus.update()", typed_in_place, (messages,), count)
+    run("PrinterStatus.updated() (COW)", typed_copy_on_write, (messages,), count)
+    print()
+    print(f"{'Status read (3 fields)':<32} {'Best (ms)':>10} {'ns/read':>10}")
+    print("-" * 54)
+    print_data = messages[0]["print"]
+    run("get_status() dict", legacy_reads, (print_data, count), count)
+    run("PrinterStatus attributes", typed_reads, (PrinterStatus.from_report(messages[0]), count), count)
+
+
+if __name__ == "__main__":
+    main()
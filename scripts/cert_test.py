@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
 """
-Bambu Printer MQTT Bridge - With proper SSL certificates
+Bambu Printer MQTT Bridge - With proper SSL certificates (pinned bundle, see bambu_tls)
 """
 
 import json
-import ssl
 import sys
 import time
-import os
 from datetime import datetime
+from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+# Shared Bambu modules live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bambu_tls import get_ssl_context
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_SERIAL = "03919c460100975"
@@ -58,37 +61,10 @@ def on_message(client, userdata, msg):
     except Exception as e:
         print(f"Error: {e}")
 
-def download_cert():
-    """Download Bambu CA certificate from HA integration"""
-    import urllib.request
-    url = "https://raw.githubusercontent.com/greghesp/ha-bambulab/main/custom_components/bambu_lab/pybambu/bambu.cert"
-    cert_path = "/tmp/bambu_ca.crt"
-    try:
-        urllib.request.urlretrieve(url, cert_path)
-        print(f"Downloaded cert to {cert_path}")
-        return cert_path
-    except Exception as e:
-        print(f"Failed to download cert: {e}")
-        return None
-
-def create_ssl_context(cert_path):
-    """Create SSL context with Bambu CA cert"""
-    context = ssl.create_default_context(cafile=cert_path)
-    context.check_hostname = False  # IP address mismatch workaround
-    # Ignore "CA cert does not include key usage extension" error
-    context.verify_flags &= ~ssl.VERIFY_X509_STRICT
-    return context
-
 def main():
     print("Testing MQTT with Bambu CA certificate...")
     print("=" * 40)
     
-    # Download cert
-    cert_path = download_cert()
-    if not cert_path:
-        print("Failed to get certificate")
-        return
-    
     client = mqtt.Client(
         client_id=f"bambu_test_{int(time.time())}",
         protocol=mqtt.MQTTv311,
@@ -100,17 +76,8 @@ def main():
     client.on_disconnect = on_disconnect
     client.on_message = on_message
     
-    # TLS with Bambu CA cert
-    try:
-        context = create_ssl_context(cert_path)
-        client.tls_set_context(context)
-    except Exception as e:
-        print(f"SSL context error: {e}")
-        print("Falling back to no verification...")
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        client.tls_set_context(context)
+    # TLS with the pinned Bambu CA bundle (the HA integration's bambu.cert is in it)
+    client.tls_set_context(get_ssl_context())
     
     # Auth
     client.username_pw_set("bblp", PRINTER_ACCESS_CODE)
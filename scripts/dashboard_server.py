@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Built-in HTTP server for the usage dashboard.
+
+Serves the static page shell, its data as /data.json (alias /data) with
+ETag/If-None-Match support, the /refresh endpoint the page's refresh
+button POSTs to, and an /events Server-Sent Events stream that pushes
+payload deltas as new usage rows are committed. Started with:
+
+    python3 generate_dashboard.py serve [port] [host]
+"""
+
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import generate_dashboard as gd
+from usage_db import init_db
+
+DEFAULT_PORT = 8080
+DEFAULT_HOST = "127.0.0.1"
+POLL_INTERVAL = 1.0        # seconds between data_version checks while clients listen
+KEEPALIVE_INTERVAL = 15.0  # seconds between SSE keepalive comments
+SUBSCRIBER_QUEUE_SIZE = 32
+
+
+class Subscriber:
+    """One /events client: a bounded queue of (event, data) pairs."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the client fell too far behind; its stream is closed and
+        # the page resyncs from data.json on reconnect
+        self.overflowed = False
+
+
+class DashboardBuilder:
+    """
+    Regenerates the dashboard on demand.
+
+    Concurrent refresh() calls coalesce: a caller that arrives while a build
+    is running doesn't start its own. That build may have read the database
+    before the caller's rows were committed, so the caller asks for one
+    follow-up build and waits for it. Every caller that joins the same
+    running build shares that single follow-up.
+    A build is skipped entirely when the database has not changed since the
+    last one (checked with PRAGMA data_version on a dedicated connection).
+    Each build bumps `version` and sends the payload delta to subscribers.
+    If a build fails, its exception is raised in the caller and in every
+    caller that was waiting on it.
+    """
+
+    def __init__(self, db_path=None, output_path=None, state_path=None):
+        self.db_path = db_path
+        self.output_path = output_path or gd.OUTPUT_PATH
+        self.state_path = state_path or gd.STATE_PATH
+        self.html = gd.generate_html()
+        self.data_body = None
+        self.etag = None
+        self.payload = None
+        self.version = 0
+        self.builds = 0
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._building = False
+        self._generation = 0
+        self._follow_up = False  # a caller joined the running build
+        self._error = None  # exception from the last finished build, if it failed
+        self._built_version = None
+        self._version_conn = init_db(db_path or gd.DB_PATH)
+        self._version_lock = threading.Lock()
+
+    def _data_version(self):
+        # data_version only moves when *another* connection commits, which is
+        # exactly "someone wrote new usage rows"
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """Bring the dashboard data up to date. Returns (body, etag, rebuilt)."""
+        with self._cond:
+            if self._building:
+                # Wait for the follow-up build (generation + 2), not the
+                # running one (generation + 1)
+                self._follow_up = True
+                target = self._generation + 2
+                while self._generation < target:
+                    self._cond.wait()
+                if self._error is not None:
+                    raise self._error
+                return self.data_body, self.etag, False
+            self._building = True
+
+        rebuilt = False
+        while True:
+            error = None
+            try:
+                rebuilt = self._build() or rebuilt
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._error = error
+                self._generation += 1
+                again, self._follow_up = self._follow_up, False
+                if not again:
+                    self._building = False
+                self._cond.notify_all()
+            if not again:
+                break
+        if error is not None:
+            raise error
+        return self.data_body, self.etag, rebuilt
+
+    def _build(self):
+        """Rebuild if the database changed since the last build. Returns whether it did."""
+        version = self._data_version()
+        if self.data_body is not None and version == self._built_version:
+            return False
+        data = gd.get_dashboard_data(self.db_path, self.state_path)
+        payload = gd.build_chart_payload(data)
+        payload['version'] = self.version + 1
+        gd.write_dashboard(self.output_path, payload)
+        previous = self.payload
+        self.data_body, self.etag = gd.encode_payload(payload)
+        self.payload = payload
+        self.version = payload['version']
+        self._built_version = version
+        self.builds += 1
+        if previous is not None:
+            delta = gd.diff_payload(previous, payload)
+            delta['base'] = previous['version']
+            self.publish("delta", delta)
+        return True
+
+    def current(self):
+        """Return the last built (body, etag), building first if needed."""
+        if self.data_body is None:
+            return self.refresh()[:2]
+        return self.data_body, self.etag
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """Queue an event for every subscriber."""
+        message = (event, json.dumps(data, separators=(",", ":")))
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+
+    def watch(self, stop, interval=POLL_INTERVAL):
+        """Poll for new commits while anyone is listening, until `stop` is set."""
+        while not stop.wait(interval):
+            with self._subscribers_lock:
+                listening = bool(self._subscribers)
+            if not listening:
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[dashboard] Refresh failed: {e}")
+
+    def close(self):
+        self._version_conn.close()
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    builder = None  # set by serve()
+
+    def _send(self, status, body, content_type, etag=None, cache="no-cache"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache)
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_data(self):
+        try:
+            body, etag = self.builder.current()
+        except Exception as e:
+            # Nothing built yet to fall back on
+            body = json.dumps({"ok": False, "error": str(e)}).encode()
+            self._send(503, body, "application/json")
+            return
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+        self._send(200, body, "application/json", etag=etag)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/index.html"):
+            # The shell never changes while the server runs
+            self._send(200, self.builder.html.encode("utf-8"), "text/html; charset=utf-8",
+                       cache="max-age=300")
+        elif path in ("/data", "/data.json"):
+            self._send_data()
+        elif path == "/events" and self.command == "GET":
+            self._stream_events()
+        else:
+            self._send(404, b"Not found\n", "text/plain")
+
+    do_HEAD = do_GET
+
+    def _write_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+        subscriber = self.builder.subscribe()
+        try:
+            # Tells a (re)connecting page which version is current
+            self._write_event("hello", json.dumps({"version": self.builder.version}))
+            while not subscriber.overflowed:
+                try:
+                    event, data = subscriber.queue.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                self._write_event(event, data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.builder.unsubscribe(subscriber)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if path != "/refresh":
+            self._send(404, b"Not found\n", "text/plain")
+            return
+        try:
+            _, _, rebuilt = self.builder.refresh()
+        except Exception as e:
+            body = json.dumps({"ok": False, "error": str(e)}).encode()
+            self._send(500, body, "application/json")
+            return
+        body = json.dumps({"ok": True, "rebuilt": rebuilt}).encode()
+        self._send(200, body, "application/json")
+
+    def log_message(self, format, *args):
+        print(f"[dashboard] {self.address_string()} {format % args}")
+
+
+def serve(port=DEFAULT_PORT, host=DEFAULT_HOST, db_path=None):
+    """Serve the dashboard until interrupted."""
+    builder = DashboardBuilder(db_path)
+    builder.refresh()
+    handler = type("BoundDashboardHandler", (DashboardHandler,), {"builder": builder})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    stop = threading.Event()
+    threading.Thread(target=builder.watch, args=(stop,), name="dashboard-watch", daemon=True).start()
+    print(f"Serving dashboard on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        stop.set()
+        server.server_close()
+        builder.close()
+
+
+if __name__ == "__main__":
+    import sys
+    serve(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT,
+        sys.argv[2] if len(sys.argv) > 2 else DEFAULT_HOST,
+    )
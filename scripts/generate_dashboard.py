@@ -3,13 +3,19 @@
 Generate web dashboard HTML from usage data.
 """
 
-import sqlite3
+import hashlib
 import json
+import os
+import sys
 from pathlib import Path
 from datetime import datetime, timedelta
 
-DB_PATH = Path("/root/.openclaw/workspace/mimir.db")
+from usage_db import DB_PATH, init_db, get_schema_version
+from usage_tracker import MODEL_COSTS, API_COSTS
+
 OUTPUT_PATH = Path("/root/.openclaw/workspace/dashboard/index.html")
+# Saved aggregates + rowid watermarks for incremental regeneration
+STATE_PATH = OUTPUT_PATH.parent / "dashboard_state.json"
 
 
 # Consistent color mapping for all sources
@@ -50,217 +56,146 @@ def get_source_color(name):
     return colors[hash_val % len(colors)]
 
 
-def get_dashboard_data():
-    """Fetch all data needed for the dashboard."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def is_subscription_model(model):
+    """Kimi models are on a flat subscription, so they are left out of cost views."""
+    model = model.lower()
+    return model.startswith('kimi-coding/') or model.startswith('kimi/')
+
+
+def fetch_dashboard_rows(conn):
+    """
+    Read the per-day aggregates for every source, one query per table.
+
+    Returns (usage_rows, api_rows) where usage rows are
+    (day, model, requests, cost, input_tokens, output_tokens) and API rows are
+    (day, api_name, calls, cost).
+    """
+    usage_rows = conn.execute("""
+        SELECT day, model, requests, cost, input_tokens, output_tokens
+        FROM daily_usage_rollup
+    """).fetchall()
+    api_rows = conn.execute("""
+        SELECT day, api_name, calls, cost
+        FROM daily_api_rollup
+    """).fetchall()
+    return usage_rows, api_rows
+
+
+def pivot_daily_series(rows):
+    """
+    Pivot (day, name, cost, count) rows into stacked chart series.
+
+    Returns (days, cost_by_source, usage_by_source). Each source maps to
+    {'data': [...one value per day...], 'color': ...}; missing days are 0.
+    Both series are filled in a single pass over rows.
+    """
+    days = sorted({row[0] for row in rows})
+    names = sorted({row[1] for row in rows})
+    day_index = {day: i for i, day in enumerate(days)}
+    cost_data = {name: [0] * len(days) for name in names}
+    count_data = {name: [0] * len(days) for name in names}
+    
+    for day, name, cost, count in rows:
+        i = day_index[day]
+        cost_data[name][i] += cost
+        count_data[name][i] += count
+    
+    cost_by_source = {}
+    usage_by_source = {}
+    for name in names:
+        color = get_source_color(name)
+        cost_by_source[name] = {'data': cost_data[name], 'color': color}
+        usage_by_source[name] = {'data': count_data[name], 'color': color}
+    return days, cost_by_source, usage_by_source
+
+
+def build_dashboard_data(usage_rows, api_rows, window_days=30):
+    """Derive every dashboard structure from the per-day rows in one pass each."""
+    cutoff = (datetime.utcnow().date() - timedelta(days=window_days)).isoformat()
+    
+    daily_totals = {}      # day -> [requests, input, output, cost] (all models)
+    model_totals = {}      # model -> [requests, input, output, cost] (no Kimi)
+    stacked_rows = []      # (day, name, cost, count), models (no Kimi) + APIs
+    
+    for day, model, requests, cost, input_tokens, output_tokens in usage_rows:
+        cost = cost or 0
+        if day >= cutoff:
+            t = daily_totals.setdefault(day, [0, 0, 0, 0])
+            t[0] += requests
+            t[1] += input_tokens
+            t[2] += output_tokens
+            t[3] += cost
+        if is_subscription_model(model):
+            continue
+        t = model_totals.setdefault(model, [0, 0, 0, 0])
+        t[0] += requests
+        t[1] += input_tokens
+        t[2] += output_tokens
+        t[3] += cost
+        if day >= cutoff:
+            stacked_rows.append((day, model, cost, requests))
+    
+    api_totals = {}        # api_name -> [calls, cost]
+    for day, api_name, calls, cost in api_rows:
+        cost = cost or 0
+        t = api_totals.setdefault(api_name, [0, 0])
+        t[0] += calls
+        t[1] += cost
+        if day >= cutoff:
+            stacked_rows.append((day, api_name, cost, calls))
     
     # Daily stats for last 30 days
-    cursor.execute("""
-        SELECT date(timestamp) as day,
-               COUNT(*) as requests,
-               SUM(input_tokens) as input_tokens,
-               SUM(output_tokens) as output_tokens,
-               SUM(total_tokens) as total_tokens,
-               SUM(estimated_cost_usd) as cost
-        FROM usage_logs
-        WHERE timestamp >= date('now', '-30 days')
-        GROUP BY date(timestamp)
-        ORDER BY day
-    """)
-    daily = [dict(row) for row in cursor.fetchall()]
-    
-    # Daily cost by model (for stacked chart) - exclude Kimi subscription models
-    cursor.execute("""
-        SELECT date(timestamp) as day,
-               model as name,
-               SUM(estimated_cost_usd) as cost,
-               'model' as type
-        FROM usage_logs
-        WHERE timestamp >= date('now', '-30 days')
-          AND model NOT LIKE 'kimi-coding/%'
-          AND model NOT LIKE 'kimi/%'
-        GROUP BY date(timestamp), model
-    """)
-    daily_by_model_raw = [dict(row) for row in cursor.fetchall()]
-    
-    # Daily usage count by model (for stacked chart) - exclude Kimi
-    cursor.execute("""
-        SELECT date(timestamp) as day,
-               model as name,
-               COUNT(*) as count
-        FROM usage_logs
-        WHERE timestamp >= date('now', '-30 days')
-          AND model NOT LIKE 'kimi-coding/%'
-          AND model NOT LIKE 'kimi/%'
-        GROUP BY date(timestamp), model
-    """)
-    daily_usage_model_raw = [dict(row) for row in cursor.fetchall()]
-    
-    # Daily cost by API (for stacked chart)
-    cursor.execute("""
-        SELECT date(timestamp) as day,
-               api_name as name,
-               SUM(cost_usd) as cost,
-               'api' as type
-        FROM api_calls
-        WHERE timestamp >= date('now', '-30 days')
-        GROUP BY date(timestamp), api_name
-    """)
-    daily_by_api_raw = [dict(row) for row in cursor.fetchall()]
-    
-    # Daily usage count by API (for stacked chart)
-    cursor.execute("""
-        SELECT date(timestamp) as day,
-               api_name as name,
-               COUNT(*) as count
-        FROM api_calls
-        WHERE timestamp >= date('now', '-30 days')
-        GROUP BY date(timestamp), api_name
-    """)
-    daily_usage_api_raw = [dict(row) for row in cursor.fetchall()]
+    daily = [
+        {'day': day, 'requests': t[0], 'input_tokens': t[1], 'output_tokens': t[2],
+         'total_tokens': t[1] + t[2], 'cost': t[3]}
+        for day, t in sorted(daily_totals.items())
+    ]
     
     # Model stats (exclude Kimi) - all time
-    cursor.execute("""
-        SELECT model,
-               COUNT(*) as requests,
-               SUM(input_tokens) as input_tokens,
-               SUM(output_tokens) as output_tokens,
-               SUM(total_tokens) as total_tokens,
-               SUM(estimated_cost_usd) as cost
-        FROM usage_logs
-        WHERE model NOT LIKE 'kimi-coding/%'
-          AND model NOT LIKE 'kimi/%'
-        GROUP BY model
-        ORDER BY total_tokens DESC
-    """)
-    models = [dict(row) for row in cursor.fetchall()]
+    models = sorted((
+        {'model': model, 'requests': t[0], 'input_tokens': t[1], 'output_tokens': t[2],
+         'total_tokens': t[1] + t[2], 'cost': t[3]}
+        for model, t in model_totals.items()
+    ), key=lambda m: m['total_tokens'], reverse=True)
     
     # API stats - all time
-    cursor.execute("""
-        SELECT api_name,
-               COUNT(*) as calls,
-               SUM(cost_usd) as cost
-        FROM api_calls
-        GROUP BY api_name
-        ORDER BY cost DESC
-    """)
-    apis = [dict(row) for row in cursor.fetchall()]
+    apis = sorted((
+        {'api_name': name, 'calls': t[0], 'cost': t[1]}
+        for name, t in api_totals.items()
+    ), key=lambda a: a['cost'], reverse=True)
     
     # All-time costs for pie chart (models + APIs, exclude Kimi)
-    cursor.execute("""
-        SELECT model as name,
-               SUM(estimated_cost_usd) as cost
-        FROM usage_logs
-        WHERE model NOT LIKE 'kimi-coding/%'
-          AND model NOT LIKE 'kimi/%'
-        GROUP BY model
-    """)
-    all_time_models = [dict(row) for row in cursor.fetchall()]
-    
-    cursor.execute("""
-        SELECT api_name as name,
-               SUM(cost_usd) as cost
-        FROM api_calls
-        GROUP BY api_name
-    """)
-    all_time_apis = [dict(row) for row in cursor.fetchall()]
+    all_time_models = [{'name': name, 'cost': t[3]} for name, t in sorted(model_totals.items())]
+    all_time_apis = [{'name': name, 'cost': t[1]} for name, t in sorted(api_totals.items())]
+    pie_chart_data = all_time_models + all_time_apis
     
     # Find most costly source (model or API)
-    all_sources = all_time_models + all_time_apis
-    most_costly = max(all_sources, key=lambda x: x['cost'] or 0) if all_sources else {'name': 'None', 'cost': 0}
-    
-    # Calculate total cost for percentage
-    total_all_cost = sum(s['cost'] or 0 for s in all_sources)
+    most_costly = max(pie_chart_data, key=lambda x: x['cost']) if pie_chart_data else {'name': 'None', 'cost': 0}
+    total_all_cost = sum(s['cost'] for s in pie_chart_data)
     most_costly_pct = (most_costly['cost'] / total_all_cost * 100) if total_all_cost > 0 else 0
     
     # Find most used API by call count
-    cursor.execute("""
-        SELECT api_name as name,
-               COUNT(*) as calls
-        FROM api_calls
-        GROUP BY api_name
-        ORDER BY calls DESC
-        LIMIT 1
-    """)
-    most_used_row = cursor.fetchone()
-    most_used = {'name': most_used_row['name'], 'calls': most_used_row['calls']} if most_used_row else {'name': 'None', 'calls': 0}
-    
-    # Calculate total calls for percentage
-    cursor.execute("""
-        SELECT COUNT(*) as total_calls
-        FROM api_calls
-    """)
-    total_calls_row = cursor.fetchone()
-    total_api_calls = total_calls_row['total_calls'] if total_calls_row else 0
+    if api_totals:
+        name, t = max(sorted(api_totals.items()), key=lambda item: item[1][0])
+        most_used = {'name': name, 'calls': t[0]}
+    else:
+        most_used = {'name': 'None', 'calls': 0}
+    total_api_calls = sum(t[0] for t in api_totals.values())
     most_used_pct = (most_used['calls'] / total_api_calls * 100) if total_api_calls > 0 else 0
     
-    # Combine for pie chart
-    pie_chart_data = all_time_models + all_time_apis
-    
     # Totals - include all API costs (models are subscription, APIs are pay-as-you-go)
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_requests,
-            SUM(input_tokens) as total_input,
-            SUM(output_tokens) as total_output,
-            SUM(total_tokens) as total_tokens,
-            SUM(estimated_cost_usd) as total_cost
-        FROM usage_logs
-        WHERE model NOT LIKE 'kimi-coding/%'
-          AND model NOT LIKE 'kimi/%'
-    """)
-    model_totals = dict(cursor.fetchone())
-    
-    # Get total API costs separately
-    cursor.execute("""
-        SELECT SUM(cost_usd) as api_total_cost
-        FROM api_calls
-    """)
-    api_total = cursor.fetchone()[0] or 0
-    
-    # Combine for true total cost
-    totals = model_totals
-    totals['total_cost'] = (model_totals['total_cost'] or 0) + api_total
-    
-    # Process daily costs into stacked chart format (models + APIs, no Kimi)
-    all_daily_raw = daily_by_model_raw + daily_by_api_raw
-    days = sorted(set(d['day'] for d in all_daily_raw))
-    all_names = sorted(set(d['name'] for d in all_daily_raw))
-    
-    # Create datasets for each model/API using consistent colors
-    daily_by_source = {}
-    
-    for name in all_names:
-        source_data = []
-        for day in days:
-            cost = next((d['cost'] for d in all_daily_raw 
-                        if d['day'] == day and d['name'] == name), 0)
-            source_data.append(cost)
-            
-        daily_by_source[name] = {
-            'data': source_data,
-            'color': get_source_color(name)
-        }
-    
-    # Process daily usage counts into stacked chart format
-    all_usage_raw = daily_usage_model_raw + daily_usage_api_raw
-    usage_by_source = {}
-    
-    for name in all_names:
-        source_data = []
-        for day in days:
-            count = next((d['count'] for d in all_usage_raw 
-                         if d['day'] == day and d['name'] == name), 0)
-            source_data.append(count)
-            
-        usage_by_source[name] = {
-            'data': source_data,
-            'color': get_source_color(name)
-        }
+    total_input = sum(t[1] for t in model_totals.values())
+    total_output = sum(t[2] for t in model_totals.values())
+    totals = {
+        'total_requests': sum(t[0] for t in model_totals.values()),
+        'total_input': total_input,
+        'total_output': total_output,
+        'total_tokens': total_input + total_output,
+        'total_cost': sum(t[3] for t in model_totals.values()) + sum(t[1] for t in api_totals.values()),
+    }
     
-    conn.close()
+    # Stacked chart series (models + APIs, no Kimi)
+    days, daily_by_source, usage_by_source = pivot_daily_series(stacked_rows)
     
     return {
         "daily": daily,
@@ -279,53 +214,144 @@ def get_dashboard_data():
     }
 
 
-def generate_html(data):
-    """Generate the dashboard HTML."""
-    
-    # Build datasets for stacked chart (models + APIs)
-    days = data['days']
-    # Format days as DD-Mmm-YY
-    formatted_days = [datetime.strptime(d, '%Y-%m-%d').strftime('%d-%b-%y') for d in days]
-    daily_labels = json.dumps(formatted_days)
-    
-    datasets = []
-    for name, info in data['daily_by_source'].items():
-        name_short = name.split('/')[-1]
-        datasets.append({
-            'label': name_short,
-            'data': info['data'],
-            'backgroundColor': info['color'],
-        })
-    
-    datasets_json = json.dumps(datasets)
-    
-    # Build datasets for usage chart
-    usage_datasets = []
-    for name, info in data['usage_by_source'].items():
-        name_short = name.split('/')[-1]
-        usage_datasets.append({
-            'label': name_short,
-            'data': info['data'],
-            'backgroundColor': info['color'],
-        })
-    
-    usage_datasets_json = json.dumps(usage_datasets)
-    
-    # Pie chart data (models + APIs, all-time, no Kimi) with consistent colors
-    pie_data = data['pie_chart_data']
-    pie_names = json.dumps([p['name'].split('/')[-1] for p in pie_data])
-    pie_costs = json.dumps([p['cost'] for p in pie_data])
-    pie_colors = json.dumps([get_source_color(p['name']) for p in pie_data])
-    
-    # API chart data with consistent colors
-    api_data = data['apis']
-    api_names = json.dumps([a['api_name'] for a in api_data])
-    api_costs = json.dumps([a['cost'] for a in api_data])
-    api_colors = json.dumps([get_source_color(a['api_name']) for a in api_data])
-    
-    totals = data['totals']
-    
-    html = f'''<!DOCTYPE html>
+def state_fingerprint(conn):
+    """Hash of everything that invalidates saved aggregates: schema and price tables."""
+    payload = json.dumps({
+        'schema': get_schema_version(conn),
+        'model_costs': MODEL_COSTS,
+        'api_costs': API_COSTS,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_state(path):
+    """Load saved dashboard state, or None if missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(path, state):
+    """Write dashboard state atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _merge_rows(rows, new_rows, value_count):
+    """Add grouped (day, name, *values) rows into saved rows of the same shape."""
+    merged = {(row[0], row[1]): list(row) for row in rows}
+    for row in new_rows:
+        current = merged.get((row[0], row[1]))
+        if current is None:
+            merged[(row[0], row[1])] = list(row)
+        else:
+            for i in range(2, 2 + value_count):
+                current[i] += row[i]
+    return list(merged.values())
+
+
+def load_dashboard_rows(conn, state=None):
+    """
+    Return (usage_rows, api_rows, state) for build_dashboard_data().
+
+    If `state` matches this database, only usage_logs/api_calls rows above
+    its rowid watermarks are read and merged into the saved aggregates.
+    Otherwise (no state, schema or price change, or the tables were
+    truncated) the aggregates are rebuilt from the rollup tables.
+    
+    The state also records the row counts it covers and each table's
+    MIN(rowid). Old rows pruned below the watermark don't move MAX(rowid).
+    They do raise MIN(rowid), or make saved count + new rows differ from
+    the rollup totals, and either change forces a rebuild. The MIN check
+    matters when pruned rows are balanced exactly by new inserts.
+    """
+    fingerprint = state_fingerprint(conn)
+    # One read transaction so watermarks and aggregates come from the same snapshot
+    conn.execute("BEGIN")
+    try:
+        usage_max = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM usage_logs").fetchone()[0]
+        api_max = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM api_calls").fetchone()[0]
+        floors = {
+            'usage_logs': conn.execute("SELECT COALESCE(MIN(rowid), 0) FROM usage_logs").fetchone()[0],
+            'api_calls': conn.execute("SELECT COALESCE(MIN(rowid), 0) FROM api_calls").fetchone()[0],
+        }
+        # Cheap: the rollups hold one row per day and source
+        usage_count = conn.execute("SELECT COALESCE(SUM(requests), 0) FROM daily_usage_rollup").fetchone()[0]
+        api_count = conn.execute("SELECT COALESCE(SUM(calls), 0) FROM daily_api_rollup").fetchone()[0]
+        watermarks = state.get('watermarks', {}) if state else {}
+        usage_mark = watermarks.get('usage_logs', -1)
+        api_mark = watermarks.get('api_calls', -1)
+        
+        usage_rows = None
+        if (state is not None and state.get('fingerprint') == fingerprint
+                and 'counts' in state and usage_mark >= 0 and api_mark >= 0
+                and usage_max >= usage_mark and api_max >= api_mark):
+            new_usage = conn.execute("""
+                SELECT date(timestamp), COALESCE(model, ''), COUNT(*), TOTAL(estimated_cost_usd),
+                       COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0)
+                FROM usage_logs
+                WHERE rowid > ?
+                GROUP BY 1, 2
+            """, (usage_mark,)).fetchall()
+            new_api = conn.execute("""
+                SELECT date(timestamp), COALESCE(api_name, ''), COUNT(*), TOTAL(cost_usd)
+                FROM api_calls
+                WHERE rowid > ?
+                GROUP BY 1, 2
+            """, (api_mark,)).fetchall()
+            new_usage_count = sum(row[2] for row in new_usage)
+            new_api_count = sum(row[2] for row in new_api)
+            counts = state['counts']
+            if (counts['usage_logs'] + new_usage_count == usage_count
+                    and counts['api_calls'] + new_api_count == api_count
+                    and state.get('floors') == floors):
+                usage_rows = _merge_rows(state['usage'], new_usage, 4)
+                api_rows = _merge_rows(state['api'], new_api, 2)
+                print(f"[dashboard] Merged {new_usage_count} new usage rows, "
+                      f"{new_api_count} new API calls")
+            else:
+                print("[dashboard] Saved state no longer matches the rollups (rows pruned?)")
+        if usage_rows is None:
+            usage_rows, api_rows = fetch_dashboard_rows(conn)
+            print("[dashboard] Full rebuild from rollups")
+    finally:
+        conn.execute("COMMIT")
+    
+    state = {
+        'fingerprint': fingerprint,
+        'watermarks': {'usage_logs': usage_max, 'api_calls': api_max},
+        'counts': {'usage_logs': usage_count, 'api_calls': api_count},
+        'floors': floors,
+        'usage': [list(row) for row in usage_rows],
+        'api': [list(row) for row in api_rows],
+    }
+    return usage_rows, api_rows, state
+
+
+def get_dashboard_data(db_path=None, state_path=None, full=False):
+    """
+    Fetch all data needed for the dashboard.
+
+    With state_path, aggregates saved by the previous run are reused and
+    only newer rows are read (unless full=True); the updated state is saved.
+    """
+    state = load_state(state_path) if state_path and not full else None
+    conn = init_db(db_path or DB_PATH)
+    try:
+        usage_rows, api_rows, state = load_dashboard_rows(conn, state)
+    finally:
+        conn.close()
+    if state_path:
+        save_state(state_path, state)
+    return build_dashboard_data(usage_rows, api_rows)
+
+
+# Static page shell; all data is loaded from data.json and applied in place
+DASHBOARD_HTML = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -333,89 +359,89 @@ def generate_html(data):
     <title>Mimir Usage Dashboard</title>
     <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
     <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
             background: #0f172a;
             color: #e2e8f0;
             padding: 2rem;
-        }}
-        .container {{ max-width: 1200px; margin: 0 auto; }}
-        h1 {{
+        }
+        .container { max-width: 1200px; margin: 0 auto; }
+        h1 {
             font-size: 2rem;
             margin-bottom: 0.5rem;
             background: linear-gradient(135deg, #60a5fa, #a78bfa);
             -webkit-background-clip: text;
             -webkit-text-fill-color: transparent;
-        }}
-        .subtitle {{ color: #64748b; margin-bottom: 2rem; }}
-        .grid {{
+        }
+        .subtitle { color: #64748b; margin-bottom: 2rem; }
+        .grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
             gap: 1rem;
             margin-bottom: 2rem;
-        }}
-        .card {{
+        }
+        .card {
             background: #1e293b;
             border-radius: 12px;
             padding: 1.5rem;
             border: 1px solid #334155;
-        }}
-        .card h3 {{
+        }
+        .card h3 {
             font-size: 0.875rem;
             color: #94a3b8;
             text-transform: uppercase;
             letter-spacing: 0.05em;
             margin-bottom: 0.5rem;
-        }}
-        .card .value {{
+        }
+        .card .value {
             font-size: 2rem;
             font-weight: 700;
             color: #f8fafc;
-        }}
-        .card .subvalue {{
+        }
+        .card .subvalue {
             font-size: 0.875rem;
             color: #64748b;
             margin-top: 0.25rem;
-        }}
-        .chart-container {{
+        }
+        .chart-container {
             background: #1e293b;
             border-radius: 12px;
             padding: 1.5rem;
             border: 1px solid #334155;
             margin-bottom: 1rem;
-        }}
-        .chart-container h2 {{
+        }
+        .chart-container h2 {
             font-size: 1.25rem;
             margin-bottom: 1rem;
             color: #f8fafc;
-        }}
-        .chart-wrapper {{ height: 300px; }}
-        .two-col {{
+        }
+        .chart-wrapper { height: 300px; }
+        .two-col {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
             gap: 1rem;
-        }}
-        @media (max-width: 768px) {{
-            body {{ padding: 1rem; }}
-            h1 {{ font-size: 1.5rem; }}
-            .grid {{ grid-template-columns: repeat(2, 1fr); }}
-            .card {{ padding: 1rem; }}
-            .card .value {{ font-size: 1.5rem; }}
-            .two-col {{ grid-template-columns: 1fr; }}
-            .chart-wrapper {{ height: 250px; }}
-            .header-row {{ flex-direction: column; align-items: flex-start; }}
-        }}
-        @media (max-width: 480px) {{
-            .grid {{ grid-template-columns: 1fr; }}
-        }}
-        .updated {{
+        }
+        @media (max-width: 768px) {
+            body { padding: 1rem; }
+            h1 { font-size: 1.5rem; }
+            .grid { grid-template-columns: repeat(2, 1fr); }
+            .card { padding: 1rem; }
+            .card .value { font-size: 1.5rem; }
+            .two-col { grid-template-columns: 1fr; }
+            .chart-wrapper { height: 250px; }
+            .header-row { flex-direction: column; align-items: flex-start; }
+        }
+        @media (max-width: 480px) {
+            .grid { grid-template-columns: 1fr; }
+        }
+        .updated {
             text-align: center;
             color: #64748b;
             margin-top: 2rem;
             font-size: 0.875rem;
-        }}
-        .refresh-btn {{
+        }
+        .refresh-btn {
             background: linear-gradient(135deg, #60a5fa, #a78bfa);
             color: white;
             border: none;
@@ -425,15 +451,15 @@ def generate_html(data):
             cursor: pointer;
             margin-bottom: 1rem;
             transition: opacity 0.2s;
-        }}
-        .refresh-btn:hover {{ opacity: 0.9; }}
-        .refresh-btn:disabled {{ opacity: 0.5; cursor: not-allowed; }}
-        .header-row {{
+        }
+        .refresh-btn:hover { opacity: 0.9; }
+        .refresh-btn:disabled { opacity: 0.5; cursor: not-allowed; }
+        .header-row {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-bottom: 0.5rem;
-        }}
+        }
     </style>
 </head>
 <body>
@@ -449,24 +475,24 @@ def generate_html(data):
         <div class="grid">
             <div class="card">
                 <h3>Total Cost</h3>
-                <div class="value">${totals.get('total_cost', 0):.4f}</div>
+                <div class="value" id="totalCost">–</div>
                 <div class="subvalue">All time</div>
             </div>
             <div class="card">
                 <h3>Most Costly API</h3>
                 <div style="display: flex; justify-content: space-between; align-items: baseline; margin-bottom: 0.25rem;">
-                    <span style="font-size: 1.25rem; font-weight: 600; color: #f8fafc;">{data['most_costly']['name'].split('/')[-1]}</span>
-                    <span style="font-size: 2rem; font-weight: 700; color: #f8fafc;">${data['most_costly']['cost']:.4f}</span>
+                    <span style="font-size: 1.25rem; font-weight: 600; color: #f8fafc;" id="mostCostlyName">–</span>
+                    <span style="font-size: 2rem; font-weight: 700; color: #f8fafc;" id="mostCostlyCost">–</span>
                 </div>
-                <div class="subvalue">{data['most_costly_pct']:.1f}% of total cost</div>
+                <div class="subvalue" id="mostCostlyPct">–</div>
             </div>
             <div class="card">
                 <h3>Most Used API</h3>
                 <div style="display: flex; justify-content: space-between; align-items: baseline; margin-bottom: 0.25rem;">
-                    <span style="font-size: 1.25rem; font-weight: 600; color: #f8fafc;">{data['most_used']['name'].split('/')[-1]}</span>
-                    <span style="font-size: 2rem; font-weight: 700; color: #f8fafc;">{data['most_used']['calls']}</span>
+                    <span style="font-size: 1.25rem; font-weight: 600; color: #f8fafc;" id="mostUsedName">–</span>
+                    <span style="font-size: 2rem; font-weight: 700; color: #f8fafc;" id="mostUsedCalls">–</span>
                 </div>
-                <div class="subvalue">{data['most_used_pct']:.1f}% of total calls</div>
+                <div class="subvalue" id="mostUsedPct">–</div>
             </div>
         </div>
         
@@ -500,168 +526,340 @@ def generate_html(data):
             </div>
         </div>
         
-        <p class="updated">Last updated: {data['generated_at']}</p>
+        <p class="updated">Last updated: <span id="generatedAt">–</span></p>
     </div>
     
     <script>
         Chart.defaults.color = '#94a3b8';
         Chart.defaults.borderColor = '#334155';
         
-        // Daily cost chart (stacked by model)
-        new Chart(document.getElementById('costChart'), {{
-            type: 'bar',
-            data: {{
-                labels: {daily_labels},
-                datasets: {datasets_json}
-            }},
-            options: {{
+        const DATA_URL = 'data.json';
+        let dataEtag = null;
+        
+        function stackedOptions(footer, ticks) {
+            return {
                 responsive: true,
                 maintainAspectRatio: false,
-                plugins: {{
-                    legend: {{ position: 'top' }},
-                    tooltip: {{
-                        callbacks: {{
-                            footer: function(tooltipItems) {{
+                plugins: {
+                    legend: { position: 'top' },
+                    tooltip: {
+                        callbacks: {
+                            footer: function(tooltipItems) {
                                 let total = 0;
-                                tooltipItems.forEach(function(tooltipItem) {{
+                                tooltipItems.forEach(function(tooltipItem) {
                                     total += tooltipItem.parsed.y;
-                                }});
-                                return 'Total: $' + total.toFixed(4);
-                            }}
-                        }}
-                    }}
-                }},
-                scales: {{
-                    x: {{ 
+                                });
+                                return footer(total);
+                            }
+                        }
+                    }
+                },
+                scales: {
+                    x: { 
                         stacked: true,
-                        grid: {{ display: false }}
-                    }},
-                    y: {{ 
+                        grid: { display: false }
+                    },
+                    y: { 
                         stacked: true,
                         beginAtZero: true,
-                        grid: {{ color: '#334155' }}
-                    }}
-                }}
-            }}
-        }});
+                        grid: { color: '#334155' },
+                        ticks: ticks || {}
+                    }
+                }
+            };
+        }
+        
+        // Daily cost chart (stacked by model)
+        const costChart = new Chart(document.getElementById('costChart'), {
+            type: 'bar',
+            data: { labels: [], datasets: [] },
+            options: stackedOptions(function(total) { return 'Total: $' + total.toFixed(4); })
+        });
         
         // Daily usage count chart (stacked by source)
-        new Chart(document.getElementById('usageChart'), {{
+        const usageChart = new Chart(document.getElementById('usageChart'), {
             type: 'bar',
-            data: {{
-                labels: {daily_labels},
-                datasets: {usage_datasets_json}
-            }},
-            options: {{
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {{
-                    legend: {{ position: 'top' }},
-                    tooltip: {{
-                        callbacks: {{
-                            footer: function(tooltipItems) {{
-                                let total = 0;
-                                tooltipItems.forEach(function(tooltipItem) {{
-                                    total += tooltipItem.parsed.y;
-                                }});
-                                return 'Total: ' + total + ' calls';
-                            }}
-                        }}
-                    }}
-                }},
-                scales: {{
-                    x: {{ 
-                        stacked: true,
-                        grid: {{ display: false }}
-                    }},
-                    y: {{ 
-                        stacked: true,
-                        beginAtZero: true,
-                        grid: {{ color: '#334155' }},
-                        ticks: {{
-                            stepSize: 1
-                        }}
-                    }}
-                }}
-            }}
-        }});
+            data: { labels: [], datasets: [] },
+            options: stackedOptions(function(total) { return 'Total: ' + total + ' calls'; }, { stepSize: 1 })
+        });
         
         // Cost by Source chart (pie chart with models + APIs, all-time)
-        new Chart(document.getElementById('modelChart'), {{
+        const modelChart = new Chart(document.getElementById('modelChart'), {
             type: 'doughnut',
-            data: {{
-                labels: {pie_names},
-                datasets: [{{
-                    data: {pie_costs},
-                    backgroundColor: {pie_colors}
-                }}]
-            }},
-            options: {{
+            data: { labels: [], datasets: [{ data: [], backgroundColor: [] }] },
+            options: {
                 responsive: true,
                 maintainAspectRatio: false,
-                plugins: {{
-                    legend: {{ position: 'right' }}
-                }}
-            }}
-        }});
+                plugins: {
+                    legend: { position: 'right' }
+                }
+            }
+        });
         
         // API cost chart
-        new Chart(document.getElementById('apiChart'), {{
+        const apiChart = new Chart(document.getElementById('apiChart'), {
             type: 'bar',
-            data: {{
-                labels: {api_names},
-                datasets: [{{
-                    label: 'Cost ($)',
-                    data: {api_costs},
-                    backgroundColor: {api_colors}
-                }}]
-            }},
-            options: {{
+            data: { labels: [], datasets: [{ label: 'Cost ($)', data: [], backgroundColor: [] }] },
+            options: {
                 responsive: true,
                 maintainAspectRatio: false,
-                plugins: {{ legend: {{ display: false }} }},
-                scales: {{
-                    y: {{ beginAtZero: true }}
-                }}
-            }}
-        }});
+                plugins: { legend: { display: false } },
+                scales: {
+                    y: { beginAtZero: true }
+                }
+            }
+        });
+        
+        // Update stacked datasets in place, keyed by source name
+        function syncSeries(chart, labels, series) {
+            chart.data.labels = labels;
+            const byName = new Map(chart.data.datasets.map(function(ds) { return [ds.source, ds]; }));
+            chart.data.datasets = Object.keys(series).map(function(name) {
+                const info = series[name];
+                const ds = byName.get(name) || { source: name };
+                ds.label = info.label;
+                ds.data = info.data;
+                ds.backgroundColor = info.color;
+                return ds;
+            });
+            chart.update();
+        }
+        
+        function syncSimple(chart, info) {
+            chart.data.labels = info.labels;
+            chart.data.datasets[0].data = info.data;
+            chart.data.datasets[0].backgroundColor = info.colors;
+            chart.update();
+        }
+        
+        function setText(id, text) {
+            document.getElementById(id).textContent = text;
+        }
+        
+        // Apply a full payload, or only the keys listed in `changed`
+        function applyData(d, changed) {
+            const has = function(key) { return !changed || changed.indexOf(key) !== -1; };
+            if (has('cards')) {
+                const c = d.cards;
+                setText('totalCost', '$' + c.total_cost.toFixed(4));
+                setText('mostCostlyName', c.most_costly_name);
+                setText('mostCostlyCost', '$' + c.most_costly_cost.toFixed(4));
+                setText('mostCostlyPct', c.most_costly_pct.toFixed(1) + '% of total cost');
+                setText('mostUsedName', c.most_used_name);
+                setText('mostUsedCalls', c.most_used_calls);
+                setText('mostUsedPct', c.most_used_pct.toFixed(1) + '% of total calls');
+            }
+            setText('generatedAt', d.generated_at);
+            if (has('labels') || has('cost')) {
+                syncSeries(costChart, d.labels, d.cost);
+            }
+            if (has('labels') || has('usage')) {
+                syncSeries(usageChart, d.labels, d.usage);
+            }
+            if (has('pie')) {
+                syncSimple(modelChart, d.pie);
+            }
+            if (has('api')) {
+                syncSimple(apiChart, d.api);
+            }
+        }
+        
+        let currentData = null;
+        
+        // Merge a server delta into currentData and redraw only what changed
+        function applyDelta(delta) {
+            if (!currentData || delta.base !== currentData.version) {
+                loadData().catch(function(err) { console.error(err); });
+                return;
+            }
+            Object.keys(delta).forEach(function(key) {
+                const value = delta[key];
+                if (key === 'base') {
+                    return;
+                }
+                if (key === 'cost' || key === 'usage' || key === 'cards') {
+                    Object.keys(value).forEach(function(name) {
+                        if (value[name] === null) {
+                            delete currentData[key][name];
+                        } else {
+                            currentData[key][name] = value[name];
+                        }
+                    });
+                } else {
+                    currentData[key] = value;
+                }
+            });
+            applyData(currentData, Object.keys(delta));
+        }
+        
+        // Fetch data.json, skipping the download when the ETag still matches
+        async function loadData() {
+            const headers = dataEtag ? { 'If-None-Match': dataEtag } : {};
+            const response = await fetch(DATA_URL, { headers: headers, cache: 'no-store' });
+            if (response.status === 304) {
+                return false;
+            }
+            if (!response.ok) {
+                throw new Error('Failed to load ' + DATA_URL + ': ' + response.status);
+            }
+            dataEtag = response.headers.get('ETag');
+            currentData = await response.json();
+            applyData(currentData);
+            return true;
+        }
+        
+        // Live updates from the dashboard server (serve mode only)
+        function connectEvents() {
+            if (!window.EventSource || location.protocol === 'file:') {
+                return;
+            }
+            const events = new EventSource('/events');
+            events.addEventListener('hello', function(e) {
+                // (Re)connected: resync if we missed anything
+                const hello = JSON.parse(e.data);
+                if (!currentData || hello.version !== currentData.version) {
+                    loadData().catch(function(err) { console.error(err); });
+                }
+            });
+            events.addEventListener('delta', function(e) {
+                applyDelta(JSON.parse(e.data));
+            });
+        }
         
         // Refresh function
-        async function refreshDashboard() {{
+        async function refreshDashboard() {
             const btn = document.getElementById('refreshBtn');
             btn.disabled = true;
             btn.textContent = '⏳';
             
-            try {{
-                const response = await fetch('/refresh', {{ method: 'POST' }});
-                if (response.ok) {{
-                    location.reload();
-                }} else {{
-                    // Fallback: just reload anyway
-                    location.reload();
-                }}
-            }} catch (err) {{
-                // Fallback: just reload
-                location.reload();
-            }}
-        }}
+            try {
+                // Ask the server to regenerate; static hosting has no /refresh
+                await fetch('/refresh', { method: 'POST' });
+            } catch (err) {
+            }
+            try {
+                await loadData();
+            } catch (err) {
+                console.error(err);
+            } finally {
+                btn.disabled = false;
+                btn.textContent = '🔄';
+            }
+        }
+        
+        loadData().catch(function(err) { console.error(err); }).then(connectEvents);
     </script>
 </body>
 </html>'''
+
+
+def build_chart_payload(data):
+    """Turn dashboard data into the JSON document the page renders (data.json)."""
+    # Format days as DD-Mmm-YY
+    labels = [datetime.strptime(d, '%Y-%m-%d').strftime('%d-%b-%y') for d in data['days']]
+    
+    def series(by_source):
+        return {
+            name: {'label': name.split('/')[-1], 'data': info['data'], 'color': info['color']}
+            for name, info in by_source.items()
+        }
     
-    return html
+    # Pie chart data (models + APIs, all-time, no Kimi) with consistent colors
+    pie_data = data['pie_chart_data']
+    # API chart data with consistent colors
+    api_data = data['apis']
+    
+    return {
+        'generated_at': data['generated_at'],
+        'labels': labels,
+        'cost': series(data['daily_by_source']),
+        'usage': series(data['usage_by_source']),
+        'pie': {
+            'labels': [p['name'].split('/')[-1] for p in pie_data],
+            'data': [p['cost'] for p in pie_data],
+            'colors': [get_source_color(p['name']) for p in pie_data],
+        },
+        'api': {
+            'labels': [a['api_name'] for a in api_data],
+            'data': [a['cost'] for a in api_data],
+            'colors': [get_source_color(a['api_name']) for a in api_data],
+        },
+        'cards': {
+            'total_cost': data['totals'].get('total_cost') or 0,
+            'most_costly_name': data['most_costly']['name'].split('/')[-1],
+            'most_costly_cost': data['most_costly']['cost'] or 0,
+            'most_costly_pct': data['most_costly_pct'],
+            'most_used_name': data['most_used']['name'].split('/')[-1],
+            'most_used_calls': data['most_used']['calls'],
+            'most_used_pct': data['most_used_pct'],
+        },
+    }
+
+
+def diff_payload(old, new):
+    """
+    Return the parts of chart payload `new` that differ from `old`.
+
+    Per-source series and cards are compared one level down, so only changed
+    or new sources are included; removed sources map to None. Everything
+    else is included whole when it changed.
+    """
+    delta = {}
+    for key, value in new.items():
+        old_value = old.get(key)
+        if key in ('cost', 'usage', 'cards'):
+            old_value = old_value or {}
+            changed = {k: v for k, v in value.items() if old_value.get(k) != v}
+            changed.update((k, None) for k in old_value if k not in value)
+            if changed:
+                delta[key] = changed
+        elif old_value != value:
+            delta[key] = value
+    return delta
+
+
+def encode_payload(payload):
+    """Serialize a chart payload compactly. Returns (body bytes, ETag)."""
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    return body, etag
+
+
+def generate_html():
+    """Return the static dashboard page shell."""
+    return DASHBOARD_HTML
+
+
+def write_dashboard(output_path, payload):
+    """Write data.json next to output_path, and the page shell only if it changed."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    html = generate_html()
+    if not output_path.exists() or output_path.read_text() != html:
+        output_path.write_text(html)
+    data_path = output_path.with_name('data.json')
+    tmp_path = data_path.with_name('data.json.tmp')
+    tmp_path.write_bytes(encode_payload(payload)[0])
+    os.replace(tmp_path, data_path)
+    return data_path
 
 
 def main():
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
     
-    data = get_dashboard_data()
-    html = generate_html(data)
+    data = get_dashboard_data(state_path=STATE_PATH, full='--full' in sys.argv)
+    data_path = write_dashboard(OUTPUT_PATH, build_chart_payload(data))
     
-    OUTPUT_PATH.write_text(html)
     print(f"Dashboard generated: {OUTPUT_PATH}")
-    print(f"Open in browser: file://{OUTPUT_PATH}")
+    print(f"Data written: {data_path}")
+    print("The page loads data.json over HTTP; serve it with: generate_dashboard.py serve [port]")
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from dashboard_server import serve, DEFAULT_PORT, DEFAULT_HOST
+        serve(
+            int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT,
+            sys.argv[3] if len(sys.argv) > 3 else DEFAULT_HOST,
+        )
+    else:
+        main()
@@ -2,17 +2,47 @@
 """
 Bambu Printer MQTT Bridge for Pine A64
 Relays MQTT between printer and Tailscale network
+
+Usage:
+    python3 printer_bridge.py [--capture FILE] [--relay ADDRESS]
+
+--capture appends every raw report to FILE for bambu_capture.py replay.
+
+--relay serves the printer's report/request topics as plain MQTT on
+ADDRESS (a port, host:port or unix:/path; see bambu_relay), so any number
+of local scripts can share the bridge's single printer connection.
+Requests from them are forwarded upstream through the rate limiter, and
+a pushall is answered from the bridge's merged state once that is
+complete and fresh (after the bridge's own pushall, if one is needed or
+already in flight). Log in as bblp with the printer's access code.
+Consumers that only want the merged state subscribe to
+device/<serial>/state instead: a keyframe, then JSON merge patches of
+just the changed fields (bambu_patch.PatchFollower applies them).
 """
 
 import json
-import ssl
+import signal
 import sys
 import time
 import threading
 from datetime import datetime
+from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+from status_writer import StatusWriter
+
+# Shared Bambu modules live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bambu_capture import CaptureWriter
+from bambu_commands import DEFAULT_TIMEOUT, CommandTracker
+from bambu_pushall import PushallPolicy
+from bambu_patch import PatchStream
+from bambu_relay import RelayServer
+from bambu_scheduler import PRIORITY_CONTROL, CommandScheduler, merge_key, priority_for
+from bambu_state import PrinterState, PrinterStatus
+from bambu_tls import get_ssl_context
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_SERIAL = "03919c460100975"
@@ -28,12 +58,28 @@ STATUS_FILE = "/tmp/printer_status.json"
 
 
 class PrinterBridge:
-    def __init__(self):
+    def __init__(self, capture_path=None):
         # Use specific client ID format for Bambu
         self.client = mqtt.Client(client_id=f"bambu_pine_{int(time.time())}", callback_api_version=mqtt.CallbackAPIVersion.VERSION1)
-        self.status = {}
+        self.state = PrinterState()
+        self.printer_status = PrinterStatus()
         self.connected = False
+        self._lock = threading.Lock()
+        self.status_writer = StatusWriter(STATUS_FILE)
+        self.capture = CaptureWriter(capture_path) if capture_path else None
+        self.commands = CommandTracker()
+        # Rate-limits and orders everything sent to the printer
+        self.scheduler = CommandScheduler(self._publish)
+        # Only pull full reports when the merged state actually needs one
+        self.pushall = PushallPolicy()
+        self.relay = None
+        self.patches = PatchStream()
         
+    @property
+    def status(self):
+        """Latest merged state (a shared snapshot - do not modify)."""
+        return self.state.data
+
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"[{datetime.now()}] Connected to printer")
@@ -46,24 +92,68 @@ class PrinterBridge:
             print(f"[{datetime.now()}] Connection failed: {rc}")
             self.connected = False
     
-    def request_status(self):
-        """Request a full status update from printer"""
-        payload = json.dumps({"pushing": {"sequence_id": "0", "command": "pushall"}})
-        self.client.publish(TOPIC_REQUEST, payload)
-        print(f"[{datetime.now()}] Requested status update")
+    def request_status(self, force=False):
+        """
+        Request a full status update from printer if the state needs one.
+        
+        Returns a Future for the answer, or None when none was sent: the
+        state is complete and fresh, or a pushall is already in flight
+        (self.pushall.pending; see bambu_pushall). force=True always asks.
+        """
+        reason = self.pushall.check(self.state, force)
+        if reason is None:
+            return None
+        return self._request_pushall(reason)
+    
+    def _request_pushall(self, reason):
+        future = self._submit("pushing", "pushall", DEFAULT_TIMEOUT, {})
+        future.add_done_callback(self._pushall_done)
+        print(f"[{datetime.now()}] Requested status update ({reason})")
+        return future
+    
+    def _pushall_done(self, future):
+        if future.exception() is None:
+            self.pushall.answered()
+        else:
+            self.pushall.failed()
+    
+    def _submit(self, section, command, timeout, params):
+        def send(publish):
+            return self.commands.send(publish, section, command, timeout, **params)
+        return self.scheduler.submit(send, priority_for(section), merge_key(section, command))
+    
+    def _publish(self, payload):
+        return self.client.publish(TOPIC_REQUEST, payload).rc == 0
     
     def on_disconnect(self, client, userdata, rc):
         print(f"[{datetime.now()}] Disconnected from printer")
         self.connected = False
+        self.commands.cancel_all(ConnectionError("connection lost"))
     
     def on_message(self, client, userdata, msg):
+        if self.capture:
+            self.capture.write(msg.payload)
+        if self.relay:
+            self.relay.publish(msg.payload)
         try:
             data = json.loads(msg.payload.decode())
-            self.status.update(data)
+            with self._lock:
+                changed = self.state.merge(data)
+                self.printer_status.update(data)
+            if self.relay and changed:
+                message = self.patches.update(self.status, changed)
+                self.relay.publish(message, self.relay.topic_state)
+            # After the merge, so command callbacks see the answer in the state
+            self.commands.match(data)
+            self.pushall.observe(data)
+            if self.connected:
+                reason = self.pushall.due(self.state)
+                if reason:
+                    self._request_pushall(reason)
             
-            # Save status to file for other processes to read
-            with open(STATUS_FILE, 'w') as f:
-                json.dump(self.status, f, indent=2)
+            # Save status to file for other processes to read (debounced, atomic)
+            if changed:
+                self.status_writer.update(self.status)
                 
         except json.JSONDecodeError:
             pass
@@ -73,13 +163,8 @@ class PrinterBridge:
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
         
-        # TLS setup - Bambu uses TLS 1.2 with self-signed certs
-        import ssl
-        self.client.tls_set(
-            tls_version=ssl.PROTOCOL_TLSv1_2,
-            cert_reqs=ssl.CERT_NONE
-        )
-        self.client.tls_insecure_set(True)
+        # TLS 1.2, verified against the pinned Bambu CA bundle (shared context)
+        self.client.tls_set_context(get_ssl_context())
         
         # Auth (bblp as username, access code as password for local LAN mode)
         self.client.username_pw_set("bblp", PRINTER_ACCESS_CODE)
@@ -92,40 +177,100 @@ class PrinterBridge:
             print(f"[{datetime.now()}] Failed to connect: {e}")
             return False
     
+    def start_relay(self, address):
+        """Serve local MQTT clients on `address` (see bambu_relay)."""
+        self.relay = RelayServer(PRINTER_SERIAL, self._on_relay_request, PRINTER_ACCESS_CODE,
+                                 snapshot=self.patches.snapshot)
+        self.relay.start(address)
+    
+    def _on_relay_request(self, session, payload):
+        """A local client published a request (runs on the relay's thread)."""
+        try:
+            request = json.loads(payload)
+            section, body = next(iter(request.items()))
+        except (ValueError, AttributeError, StopIteration):
+            return
+        if section == "pushing" and isinstance(body, dict) and body.get("command") == "pushall":
+            sequence_id = str(body.get("sequence_id", "0"))
+            reason = self.pushall.check(self.state)
+            if reason is not None:
+                self._request_pushall(reason)
+            # The pushall just sent or one already in flight: reply once it's
+            # merged, not with the incomplete state we have now. If it fails
+            # (timeout, disconnect) the client still gets the best state we
+            # have rather than waiting on an answer that never comes.
+            pending = self.pushall.pending
+            if pending is None:
+                self._reply_full_report(session, sequence_id)
+            else:
+                pending.add_done_callback(
+                    lambda future: self._reply_full_report(session, sequence_id))
+            return
+        # Forwarded as-is: the answer carries the client's own sequence_id
+        # and reaches it through the report fan-out
+        self.scheduler.publish(payload, priority_for(section) if isinstance(body, dict)
+                               else PRIORITY_CONTROL)
+    
+    def _reply_full_report(self, session, sequence_id):
+        """Answer a local pushall from the merged state, as the printer would."""
+        report = dict(self.status.get("print", {}))
+        report.update(command="push_status", msg=0, sequence_id=sequence_id)
+        self.relay.reply(session, json.dumps({"print": report}).encode())
+    
     def disconnect(self):
+        if self.relay:
+            self.relay.stop()
         self.client.loop_stop()
         self.client.disconnect()
+        self.status_writer.close()
+        if self.capture:
+            self.capture.close()
     
     def get_status(self):
         """Get current printer status."""
-        print_data = self.status.get("print", {})
-        return {
-            "connected": self.connected,
-            "timestamp": datetime.now().isoformat(),
-            "state": print_data.get("gcode_state", "unknown"),
-            "progress": print_data.get("mc_percent", 0),
-            "time_remaining": print_data.get("mc_remaining_time", 0),
-            "layer": print_data.get("layer_num", 0),
-            "total_layers": print_data.get("total_layer_num", 0),
-            "bed_temp": print_data.get("bed_temper", 0),
-            "nozzle_temp": print_data.get("nozzle_temper", 0),
-            "filename": print_data.get("gcode_file", "unknown"),
-        }
-    
-    def send_command(self, command):
-        """Send a command to the printer."""
+        status = self.printer_status.as_dict()
+        del status["version"]  # only meaningful for published snapshots
+        status["connected"] = self.connected
+        status["timestamp"] = datetime.now().isoformat()
+        return status
+    
+    def send_command(self, command, timeout=DEFAULT_TIMEOUT):
+        """
+        Send a print command, e.g. {"command": "pause"}, to the printer.
+        
+        Returns a Future resolving to the printer's CommandResponse (its
+        latency is the round trip), or None if not connected. Raises
+        ValueError if `command` has no "command" name.
+        """
+        if not isinstance(command, dict) or not isinstance(command.get("command"), str):
+            raise ValueError(f"print command {command!r} is missing a \"command\" name")
         if not self.connected:
-            return False
-        payload = json.dumps({"print": command})
-        self.client.publish(TOPIC_REQUEST, payload)
-        return True
+            return None
+        params = dict(command)
+        name = params.pop("command")
+        params.pop("sequence_id", None)  # replaced with a unique one
+        return self._submit("print", name, timeout, params)
+
+
+def _terminate(signum, frame):
+    # Same shutdown path as Ctrl+C, so the capture and status file get closed
+    raise KeyboardInterrupt
 
 
 def main():
     print("Bambu Printer MQTT Bridge")
     print("=" * 40)
+    signal.signal(signal.SIGTERM, _terminate)
+    
+    capture_path = relay_address = None
+    if "--capture" in sys.argv:
+        capture_path = sys.argv[sys.argv.index("--capture") + 1]
+    if "--relay" in sys.argv:
+        relay_address = sys.argv[sys.argv.index("--relay") + 1]
     
-    bridge = PrinterBridge()
+    bridge = PrinterBridge(capture_path)
+    if relay_address:
+        bridge.start_relay(relay_address)
     
     if not bridge.connect():
         print("Failed to connect to printer. Retrying in 10 seconds...")
@@ -136,20 +281,29 @@ def main():
     
     print("Bridge running. Press Ctrl+C to stop.")
     print(f"Status file: {STATUS_FILE}")
+    if capture_path:
+        print(f"Capturing reports to: {capture_path}")
     
     try:
         while True:
             # Print status every 30 seconds
             status = bridge.get_status()
+            relay = f" | Relay clients: {bridge.relay.clients}" if bridge.relay else ""
             print(f"\r[{datetime.now().strftime('%H:%M:%S')}] "
                   f"State: {status['state']} | "
                   f"Progress: {status['progress']}% | "
-                  f"Connected: {status['connected']}", end='', flush=True)
+                  f"Connected: {status['connected']}{relay}", end='', flush=True)
             time.sleep(30)
     except KeyboardInterrupt:
         print("\n\nShutting down...")
     finally:
         bridge.disconnect()
+        print(f"Status file writes: {bridge.status_writer.stats()}")
+        if bridge.capture:
+            print(f"Captured {bridge.capture.records} reports ({bridge.capture.bytes:,} bytes)")
+        if bridge.relay:
+            print(f"Relay: {dict(bridge.relay.stats)}")
+            print(f"State stream: {bridge.patches.stats()}")
 
 
 if __name__ == "__main__":
@@ -4,14 +4,21 @@ Bambu Printer MQTT Bridge - Fixed version based on Home Assistant integration
 """
 
 import json
-import ssl
 import sys
 import time
 import threading
 from datetime import datetime
+from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+from status_writer import StatusWriter
+
+# Shared Bambu modules live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bambu_state import PrinterState, PrinterStatus
+from bambu_tls import get_ssl_context
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_SERIAL = "03919c460100975"
@@ -35,9 +42,17 @@ class PrinterBridge:
             callback_api_version=mqtt.CallbackAPIVersion.VERSION1
         )
         self.client.reconnect_delay_set(min_delay=1, max_delay=5)
-        self.status = {}
+        self.state = PrinterState()
+        self.printer_status = PrinterStatus()
         self.connected = False
+        self._lock = threading.Lock()
+        self.status_writer = StatusWriter(STATUS_FILE)
         
+    @property
+    def status(self):
+        """Latest merged state (a shared snapshot - do not modify)."""
+        return self.state.data
+
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"[{datetime.now()}] Connected to printer")
@@ -57,11 +72,13 @@ class PrinterBridge:
     def on_message(self, client, userdata, msg):
         try:
             data = json.loads(msg.payload.decode())
-            self.status.update(data)
+            with self._lock:
+                changed = self.state.merge(data)
+                self.printer_status.update(data)
             
-            # Save status to file
-            with open(STATUS_FILE, 'w') as f:
-                json.dump(self.status, f, indent=2)
+            # Save status to file for other processes to read (debounced, atomic)
+            if changed:
+                self.status_writer.update(self.status)
                 
         except json.JSONDecodeError:
             pass
@@ -77,11 +94,8 @@ class PrinterBridge:
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
         
-        # TLS setup - use TLS 1.2 without strict verification for now
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        self.client.tls_set_context(context)
+        # TLS 1.2, verified against the pinned Bambu CA bundle (shared context)
+        self.client.tls_set_context(get_ssl_context())
         
         # Auth
         self.client.username_pw_set("bblp", PRINTER_ACCESS_CODE)
@@ -98,22 +112,15 @@ class PrinterBridge:
     def disconnect(self):
         self.client.loop_stop()
         self.client.disconnect()
+        self.status_writer.close()
     
     def get_status(self):
         """Get current printer status."""
-        print_data = self.status.get("print", {})
-        return {
-            "connected": self.connected,
-            "timestamp": datetime.now().isoformat(),
-            "state": print_data.get("gcode_state", "unknown"),
-            "progress": print_data.get("mc_percent", 0),
-            "time_remaining": print_data.get("mc_remaining_time", 0),
-            "layer": print_data.get("layer_num", 0),
-            "total_layers": print_data.get("total_layer_num", 0),
-            "bed_temp": print_data.get("bed_temper", 0),
-            "nozzle_temp": print_data.get("nozzle_temper", 0),
-            "filename": print_data.get("gcode_file", "unknown"),
-        }
+        status = self.printer_status.as_dict()
+        del status["version"]  # only meaningful for published snapshots
+        status["connected"] = self.connected
+        status["timestamp"] = datetime.now().isoformat()
+        return status
 
 
 def main():
@@ -141,6 +148,7 @@ def main():
         print("\n\nShutting down...")
     finally:
         bridge.disconnect()
+        print(f"Status file writes: {bridge.status_writer.stats()}")
 
 
 if __name__ == "__main__":
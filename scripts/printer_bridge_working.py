@@ -1,17 +1,25 @@
 #!/usr/bin/env python3
 """
 Working Bambu Printer MQTT Bridge
-Uses proper SSL certificates like Home Assistant
+Uses proper SSL certificates like Home Assistant (pinned bundle, see bambu_tls)
 """
 
 import json
-import ssl
-import os
+import sys
 import time
 import threading
 from datetime import datetime
+from pathlib import Path
 import paho.mqtt.client as mqtt
 
+from status_writer import StatusWriter
+
+# Shared Bambu modules live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bambu_ready import ReadyEvent
+from bambu_state import PrinterState, touches
+from bambu_tls import get_ssl_context
+
 # Configuration
 PRINTER_IP = "192.168.1.140"
 PRINTER_SERIAL = "03919c460100975"
@@ -20,22 +28,7 @@ PRINTER_PORT = 8883
 TOPIC_REPORT = f"device/{PRINTER_SERIAL}/report"
 TOPIC_REQUEST = f"device/{PRINTER_SERIAL}/request"
 STATUS_FILE = "/tmp/printer_status.json"
-
-# Find certificate
-def find_cert():
-    paths = [
-        "/tmp/bambu.cert",
-        "/root/bambu_certs/bambu.cert",
-        "/home/jo/bambu_certs/bambu.cert",
-        "/home/jo/homeassistant/config/custom_components/bambu_lab/pybambu/bambu.cert"
-    ]
-    for path in paths:
-        if os.path.exists(path):
-            return path
-    raise FileNotFoundError("bambu.cert not found")
-
-CERT_FILE = find_cert()
-print(f"Using certificate: {CERT_FILE}")
+FIRST_REPORT_TIMEOUT = 10  # seconds to wait for an answer to the connect pushall
 
 class PrinterBridge:
     def __init__(self):
@@ -43,13 +36,26 @@ class PrinterBridge:
             client_id=f"mimir_bridge_{int(time.time())}",
             protocol=mqtt.MQTTv311
         )
-        self.status = {}
+        self.state = PrinterState()
         self.connected = False
+        # Set/cleared by the network thread so run() sleeps until something happens
+        self.connected_event = ReadyEvent()
+        self.disconnected_event = ReadyEvent()
+        self.first_report = ReadyEvent()
+        self._lock = threading.Lock()
+        self.status_writer = StatusWriter(STATUS_FILE)
         
+    @property
+    def status(self):
+        """Latest merged state (a shared snapshot - do not modify)."""
+        return self.state.data
+
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"[{datetime.now()}] Connected to printer!")
             self.connected = True
+            self.disconnected_event.clear()
+            self.connected_event.set()
             result, mid = client.subscribe(TOPIC_REPORT)
             print(f"[{datetime.now()}] Subscribed to {TOPIC_REPORT}")
             # Request full status
@@ -61,18 +67,23 @@ class PrinterBridge:
     def on_disconnect(self, client, userdata, rc):
         print(f"[{datetime.now()}] Disconnected: {rc}")
         self.connected = False
+        self.connected_event.clear()
+        self.first_report.clear()
+        self.disconnected_event.set()
     
     def on_message(self, client, userdata, msg):
         try:
             data = json.loads(msg.payload.decode())
-            self.status.update(data)
-            # Save to file
-            with open(STATUS_FILE, 'w') as f:
-                json.dump(self.status, f, indent=2)
-            # Print status update
-            if 'print' in data:
-                state = data['print'].get('gcode_state', 'unknown')
-                progress = data['print'].get('mc_percent', 0)
+            with self._lock:
+                changed = self.state.merge(data)
+            self.first_report.set()
+            # Save to file (debounced, atomic)
+            if changed:
+                self.status_writer.update(self.status)
+            # Print status update when state or progress moved
+            if touches(changed, ('print', 'gcode_state')) or touches(changed, ('print', 'mc_percent')):
+                state = self.state.get(('print', 'gcode_state'), 'unknown')
+                progress = self.state.get(('print', 'mc_percent'), 0)
                 print(f"[{datetime.now()}] State: {state} | Progress: {progress}%")
         except Exception as e:
             pass
@@ -87,12 +98,8 @@ class PrinterBridge:
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
         
-        # Setup TLS with proper certificates (like HA)
-        ctx = ssl.create_default_context()
-        ctx.load_verify_locations(cafile=CERT_FILE)
-        ctx.verify_flags &= ~ssl.VERIFY_X509_STRICT
-        ctx.check_hostname = False
-        self.client.tls_set_context(ctx)
+        # Setup TLS with proper certificates (like HA), shared per process
+        self.client.tls_set_context(get_ssl_context())
         
         # Auth
         self.client.username_pw_set("bblp", PRINTER_ACCESS_CODE)
@@ -106,13 +113,22 @@ class PrinterBridge:
     def run(self):
         try:
             while True:
-                if not self.connected:
+                if self.connected_event.wait(5):
+                    # The pushall sent on connect can go unanswered; ask
+                    # again until a report arrives or the connection drops
+                    while (not self.first_report.wait(FIRST_REPORT_TIMEOUT)
+                           and not self.disconnected_event.is_set()):
+                        print(f"[{datetime.now()}] No report yet")
+                        self.request_status()
+                    self.disconnected_event.wait()
+                else:
                     print(f"[{datetime.now()}] Waiting for connection...")
-                time.sleep(5)
         except KeyboardInterrupt:
             print("\nShutting down...")
             self.client.loop_stop()
             self.client.disconnect()
+            self.status_writer.close()
+            print(f"Status file writes: {self.status_writer.stats()}")
 
 def main():
     print("Bambu Printer MQTT Bridge")
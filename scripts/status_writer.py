@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Debounced, atomic writer for the printer status file.
+
+The A1 sends several reports per second while printing. Rewriting the
+status file on each one wastes I/O and lets readers see half-written JSON.
+StatusWriter writes at most once per min_interval, skips writes whose
+content did not change, and replaces the file atomically.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class StatusWriter:
+    """
+    Coalesce status updates into compact, atomic file writes.
+
+    Call update() after every merge. The first update after a quiet period
+    is written immediately; later ones within min_interval are folded into
+    a single trailing write. If the status dict is mutated by another
+    thread, pass the lock that guards it so serialization sees a consistent
+    view.
+    """
+
+    def __init__(self, path, min_interval=0.5, lock=None):
+        self.path = str(path)
+        self.min_interval = min_interval
+        self.writes = 0      # files actually written
+        self.skipped = 0     # writes skipped because content was unchanged
+        self.coalesced = 0   # updates folded into a later write
+        self._status_lock = lock or threading.Lock()
+        self._lock = threading.Lock()
+        self._status = None
+        self._dirty = False
+        self._last_body = None
+        self._last_write = 0.0
+        self._timer = None
+
+    def update(self, status):
+        """Schedule `status` (a JSON-serializable dict) to be written."""
+        with self._lock:
+            self._status = status
+            self._dirty = True
+            if self._timer is not None:
+                self.coalesced += 1
+                return
+            wait = self._last_write + self.min_interval - time.monotonic()
+            if wait > 0:
+                self._timer = threading.Timer(wait, self._trailing_write)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+            self._write_locked()
+
+    def _trailing_write(self):
+        with self._lock:
+            self._timer = None
+            self._write_locked()
+
+    def _write_locked(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        with self._status_lock:
+            body = json.dumps(self._status, separators=(",", ":"))
+        self._last_write = time.monotonic()
+        if body == self._last_body:
+            self.skipped += 1
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(body)
+        os.replace(tmp_path, self.path)
+        self._last_body = body
+        self.writes += 1
+
+    def flush(self):
+        """Write any pending update now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._write_locked()
+
+    close = flush
+
+    def stats(self):
+        return {"writes": self.writes, "skipped": self.skipped, "coalesced": self.coalesced}
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Schema bootstrap and migrations for mimir.db.
+
+The schema version is kept in PRAGMA user_version. Each entry in MIGRATIONS
+upgrades the database by one version, so an older database is brought up to
+date in place the next time init_db() runs against it.
+"""
+
+import sqlite3
+from pathlib import Path
+
+DB_PATH = Path("/root/.openclaw/workspace/mimir.db")
+
+# Recomputes both rollups from the raw logs
+REBUILD_ROLLUPS = """
+    DELETE FROM daily_usage_rollup;
+    INSERT INTO daily_usage_rollup (day, model, requests, input_tokens, output_tokens, cost)
+        SELECT date(timestamp), COALESCE(model, ''), COUNT(*),
+               TOTAL(input_tokens), TOTAL(output_tokens), TOTAL(estimated_cost_usd)
+        FROM usage_logs
+        GROUP BY 1, 2;
+    DELETE FROM daily_api_rollup;
+    INSERT INTO daily_api_rollup (day, api_name, calls, cost)
+        SELECT date(timestamp), COALESCE(api_name, ''), COUNT(*), TOTAL(cost_usd)
+        FROM api_calls
+        GROUP BY 1, 2;
+"""
+
+MIGRATIONS = [
+    # 1: base tables (IF NOT EXISTS so pre-versioned databases are adopted as-is)
+    """
+    CREATE TABLE IF NOT EXISTS usage_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        session_key TEXT,
+        model TEXT,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        total_tokens INTEGER DEFAULT 0,
+        estimated_cost_usd REAL DEFAULT 0,
+        tool_name TEXT,
+        description TEXT
+    );
+    CREATE TABLE IF NOT EXISTS api_calls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        api_name TEXT,
+        endpoint TEXT,
+        cost_usd REAL DEFAULT 0,
+        metadata TEXT
+    );
+    """,
+    # 2: indexes for the date-window and per-source queries. The grouped
+    # indexes carry the summed columns so those queries never touch the table.
+    """
+    CREATE INDEX IF NOT EXISTS idx_usage_logs_timestamp
+        ON usage_logs (timestamp);
+    CREATE INDEX IF NOT EXISTS idx_usage_logs_model_timestamp
+        ON usage_logs (model, timestamp, input_tokens, output_tokens, total_tokens, estimated_cost_usd);
+    CREATE INDEX IF NOT EXISTS idx_usage_logs_session_key
+        ON usage_logs (session_key);
+    CREATE INDEX IF NOT EXISTS idx_api_calls_timestamp
+        ON api_calls (timestamp);
+    CREATE INDEX IF NOT EXISTS idx_api_calls_api_name_timestamp
+        ON api_calls (api_name, timestamp, cost_usd);
+    """,
+    # 3: per-day rollups kept current by triggers, so reads never scan the raw logs
+    """
+    CREATE TABLE IF NOT EXISTS daily_usage_rollup (
+        day TEXT NOT NULL,
+        model TEXT NOT NULL,
+        requests INTEGER NOT NULL DEFAULT 0,
+        input_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, model)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS daily_api_rollup (
+        day TEXT NOT NULL,
+        api_name TEXT NOT NULL,
+        calls INTEGER NOT NULL DEFAULT 0,
+        cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, api_name)
+    ) WITHOUT ROWID;
+    """ + REBUILD_ROLLUPS + """
+    CREATE TRIGGER IF NOT EXISTS trg_usage_logs_rollup_insert AFTER INSERT ON usage_logs
+    BEGIN
+        INSERT INTO daily_usage_rollup (day, model, requests, input_tokens, output_tokens, cost)
+        VALUES (date(NEW.timestamp), COALESCE(NEW.model, ''), 1, COALESCE(NEW.input_tokens, 0),
+                COALESCE(NEW.output_tokens, 0), COALESCE(NEW.estimated_cost_usd, 0))
+        ON CONFLICT (day, model) DO UPDATE SET
+            requests = requests + 1,
+            input_tokens = input_tokens + excluded.input_tokens,
+            output_tokens = output_tokens + excluded.output_tokens,
+            cost = cost + excluded.cost;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_usage_logs_rollup_delete AFTER DELETE ON usage_logs
+    BEGIN
+        UPDATE daily_usage_rollup SET
+            requests = requests - 1,
+            input_tokens = input_tokens - COALESCE(OLD.input_tokens, 0),
+            output_tokens = output_tokens - COALESCE(OLD.output_tokens, 0),
+            cost = cost - COALESCE(OLD.estimated_cost_usd, 0)
+        WHERE day = date(OLD.timestamp) AND model = COALESCE(OLD.model, '');
+        DELETE FROM daily_usage_rollup
+        WHERE day = date(OLD.timestamp) AND model = COALESCE(OLD.model, '') AND requests <= 0;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_api_calls_rollup_insert AFTER INSERT ON api_calls
+    BEGIN
+        INSERT INTO daily_api_rollup (day, api_name, calls, cost)
+        VALUES (date(NEW.timestamp), COALESCE(NEW.api_name, ''), 1, COALESCE(NEW.cost_usd, 0))
+        ON CONFLICT (day, api_name) DO UPDATE SET
+            calls = calls + 1,
+            cost = cost + excluded.cost;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_api_calls_rollup_delete AFTER DELETE ON api_calls
+    BEGIN
+        UPDATE daily_api_rollup SET
+            calls = calls - 1,
+            cost = cost - COALESCE(OLD.cost_usd, 0)
+        WHERE day = date(OLD.timestamp) AND api_name = COALESCE(OLD.api_name, '');
+        DELETE FROM daily_api_rollup
+        WHERE day = date(OLD.timestamp) AND api_name = COALESCE(OLD.api_name, '') AND calls <= 0;
+    END;
+    """,
+    # 4: keep the rollups right when logged rows are edited (move OLD out of
+    # its day/key, add NEW to its own), and resync rollups that drifted
+    # before these triggers existed
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_usage_logs_rollup_update
+    AFTER UPDATE OF timestamp, model, input_tokens, output_tokens, estimated_cost_usd ON usage_logs
+    BEGIN
+        UPDATE daily_usage_rollup SET
+            requests = requests - 1,
+            input_tokens = input_tokens - COALESCE(OLD.input_tokens, 0),
+            output_tokens = output_tokens - COALESCE(OLD.output_tokens, 0),
+            cost = cost - COALESCE(OLD.estimated_cost_usd, 0)
+        WHERE day = date(OLD.timestamp) AND model = COALESCE(OLD.model, '');
+        DELETE FROM daily_usage_rollup
+        WHERE day = date(OLD.timestamp) AND model = COALESCE(OLD.model, '') AND requests <= 0;
+        INSERT INTO daily_usage_rollup (day, model, requests, input_tokens, output_tokens, cost)
+        VALUES (date(NEW.timestamp), COALESCE(NEW.model, ''), 1, COALESCE(NEW.input_tokens, 0),
+                COALESCE(NEW.output_tokens, 0), COALESCE(NEW.estimated_cost_usd, 0))
+        ON CONFLICT (day, model) DO UPDATE SET
+            requests = requests + 1,
+            input_tokens = input_tokens + excluded.input_tokens,
+            output_tokens = output_tokens + excluded.output_tokens,
+            cost = cost + excluded.cost;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_api_calls_rollup_update
+    AFTER UPDATE OF timestamp, api_name, cost_usd ON api_calls
+    BEGIN
+        UPDATE daily_api_rollup SET
+            calls = calls - 1,
+            cost = cost - COALESCE(OLD.cost_usd, 0)
+        WHERE day = date(OLD.timestamp) AND api_name = COALESCE(OLD.api_name, '');
+        DELETE FROM daily_api_rollup
+        WHERE day = date(OLD.timestamp) AND api_name = COALESCE(OLD.api_name, '') AND calls <= 0;
+        INSERT INTO daily_api_rollup (day, api_name, calls, cost)
+        VALUES (date(NEW.timestamp), COALESCE(NEW.api_name, ''), 1, COALESCE(NEW.cost_usd, 0))
+        ON CONFLICT (day, api_name) DO UPDATE SET
+            calls = calls + 1,
+            cost = cost + excluded.cost;
+    END;
+    """ + REBUILD_ROLLUPS,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply any pending migrations. Returns the resulting schema version."""
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})"
+        )
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        # executescript() commits first, so wrap each step in its own transaction
+        conn.executescript(
+            "BEGIN;\n"
+            + MIGRATIONS[target - 1]
+            + f"\nPRAGMA user_version = {target};\nCOMMIT;"
+        )
+        print(f"[usage_db] Migrated schema to version {target}")
+    return SCHEMA_VERSION
+
+
+def init_db(db_path=None) -> sqlite3.Connection:
+    """
+    Open the usage database, enable WAL mode and bring the schema up to date.
+
+    Returns the open connection.
+    """
+    path = Path(db_path or DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # WAL lets the dashboard read while agents are writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    return conn
+
+
+if __name__ == "__main__":
+    import sys
+    conn = init_db(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Schema version: {get_schema_version(conn)}")
+    conn.close()
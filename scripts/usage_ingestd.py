@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Single-writer ingest daemon for Mimir usage logging.
+
+Owns the only write connection to mimir.db. Agent processes send rows as
+newline-delimited JSON over a Unix domain socket (see
+usage_tracker.IngestClient) and the daemon batches them into transactions
+with a UsageWriter, so concurrent loggers never contend for the SQLite
+write lock.
+
+Records:
+    {"type": "usage", "timestamp": ..., "session_key": ..., "model": ...,
+     "input_tokens": ..., "output_tokens": ..., "tool_name": ..., "description": ...}
+    {"type": "api", "timestamp": ..., "api_name": ..., "endpoint": ...,
+     "cost_usd": ..., "metadata": ...}
+
+Rows clients spooled while the daemon was down are drained at startup and
+then every SPOOL_DRAIN_INTERVAL seconds.
+
+Usage:
+    python3 usage_ingestd.py [socket_path]
+    MIMIR_INGEST_SOCKET=<socket_path> <agent>   # clients
+"""
+
+import fcntl
+import json
+import os
+import signal
+import socketserver
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+from usage_db import DB_PATH
+from usage_tracker import SPOOL_PATH, UsageWriter
+
+DEFAULT_SOCKET = Path(f"{DB_PATH}.sock")
+SPOOL_DRAIN_INTERVAL = 10.0
+# Larger batches than in-process logging: one daemon serves every agent
+BATCH_ROWS = 500
+BATCH_DELAY = 1.0
+
+
+class Ingester:
+    """Validates records and feeds them to the batched writer."""
+
+    def __init__(self, writer, spool_path=SPOOL_PATH):
+        self.writer = writer
+        self.spool_path = Path(spool_path)
+        self.received = 0
+        self.rejected = 0
+        self._drain_lock = threading.Lock()
+
+    def ingest_line(self, line: bytes, writer=None) -> None:
+        writer = writer or self.writer
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            kind = record.get("type")
+            if kind == "usage":
+                writer.add_usage(
+                    record["session_key"], record["model"],
+                    int(record["input_tokens"]), int(record["output_tokens"]),
+                    record.get("tool_name"), record.get("description"),
+                    timestamp=record.get("timestamp"),
+                )
+            elif kind == "api":
+                writer.add_api_call(
+                    record["api_name"], record.get("endpoint", ""),
+                    float(record.get("cost_usd", 0.0)), record.get("metadata", ""),
+                    timestamp=record.get("timestamp"),
+                )
+            else:
+                raise ValueError(f"unknown record type {kind!r}")
+            self.received += 1
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.rejected += 1
+            print(f"[ingestd] Rejected record: {e}: {line[:200]!r}")
+        except sqlite3.Error as e:
+            # The record was queued; the failed flush put the batch back and
+            # the writer's flusher retries it
+            self.received += 1
+            print(f"[ingestd] Flush failed, will retry: {e}")
+
+    def drain_spool(self) -> int:
+        """Ingest rows clients spooled while the daemon was unreachable."""
+        draining = self.spool_path.with_name(self.spool_path.name + ".draining")
+        with self._drain_lock:
+            # A leftover .draining file means a previous run died mid-drain
+            if not draining.exists():
+                try:
+                    os.rename(self.spool_path, draining)
+                except FileNotFoundError:
+                    return 0
+            count = 0
+            # A batch of its own, committed all at once: if that fails nothing
+            # is written or left queued, and the next drain replays the file
+            batch = UsageWriter(self.writer.db_path, max_rows=None)
+            try:
+                with open(draining, "rb") as f:
+                    # Wait for any client still writing to the file we renamed
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    for line in f:
+                        self.ingest_line(line, batch)
+                        count += 1
+                batch.flush()
+            except sqlite3.Error as e:
+                print(f"[ingestd] Spool drain failed, will retry: {e}")
+                return 0
+            finally:
+                batch.discard()
+                batch.close()
+            # Commit before deleting so a crash cannot lose spooled rows
+            os.unlink(draining)
+        if count:
+            print(f"[ingestd] Drained {count} spooled records")
+        return count
+
+
+class IngestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            self.server.ingester.ingest_line(line)
+
+
+class IngestServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, ingester):
+        self.ingester = ingester
+        super().__init__(str(socket_path), IngestHandler)
+
+
+def run(socket_path=DEFAULT_SOCKET):
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        socket_path.unlink()
+
+    writer = UsageWriter(max_rows=BATCH_ROWS, max_delay=BATCH_DELAY)
+    ingester = Ingester(writer)
+    ingester.drain_spool()
+
+    server = IngestServer(socket_path, ingester)
+    os.chmod(socket_path, 0o660)
+
+    stop = threading.Event()
+
+    def drain_loop():
+        while not stop.wait(SPOOL_DRAIN_INTERVAL):
+            try:
+                ingester.drain_spool()
+            except Exception as e:
+                print(f"[ingestd] Spool drain failed: {e}")
+
+    threading.Thread(target=drain_loop, name="spool-drain", daemon=True).start()
+    # serve_forever() runs in the main thread, so shut it down from a helper
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+    print(f"[ingestd] Listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        writer.close()
+        socket_path.unlink(missing_ok=True)
+        print(f"[ingestd] Stopped ({ingester.received} records, {ingester.rejected} rejected)")
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOCKET)
@@ -4,13 +4,25 @@ Usage tracking and dashboard for Mimir.
 Log API calls and view cost/usage statistics.
 """
 
+import atexit
+import fcntl
+import json
+import socket
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from pathlib import Path
 
-DB_PATH = Path("/root/.openclaw/workspace/mimir.db")
+from usage_db import DB_PATH, init_db
+
+# When set, log_usage/log_api_call send rows to usage_ingestd.py over this
+# Unix socket instead of writing the database themselves
+INGEST_SOCKET = os.environ.get("MIMIR_INGEST_SOCKET")
+# Rows are appended here while the ingest daemon is unreachable
+SPOOL_PATH = Path(os.environ.get("MIMIR_INGEST_SPOOL", f"{DB_PATH}.spool"))
 
 # Cost per 1K tokens (approximate)
 MODEL_COSTS = {
@@ -36,6 +48,290 @@ API_COSTS = {
 }
 
 
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimate the USD cost of a model call from MODEL_COSTS."""
+    costs = MODEL_COSTS.get(model, {"input": 0.001, "output": 0.003})
+    return (input_tokens / 1000 * costs["input"]) + (output_tokens / 1000 * costs["output"])
+
+
+def _utc_timestamp() -> str:
+    """Timestamp in the same format as SQLite's CURRENT_TIMESTAMP."""
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class UsageWriter:
+    """
+    Batched writer for usage_logs and api_calls.
+
+    Keeps one connection open and queues rows in memory. Rows are flushed
+    with executemany() in a single transaction once max_rows are queued or
+    the oldest queued row is max_delay seconds old. Timestamps are taken
+    when a row is queued, not when it is flushed.
+
+    With max_rows=None rows are only written by flush() or close(), so a
+    caller can commit a whole batch or nothing (and discard() it on error).
+    """
+
+    def __init__(self, db_path=None, max_rows: Optional[int] = 100, max_delay: float = 2.0):
+        self.db_path = db_path or DB_PATH
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._conn = None
+        self._usage_rows = []
+        self._api_rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = None
+        atexit.register(self.close)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = init_db(self.db_path)
+        return self._conn
+
+    def _start_flusher(self):
+        # Background thread so queued rows are written even if no more calls arrive
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="usage-writer", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                if self._oldest is None:
+                    timeout = self.max_delay
+                else:
+                    timeout = self._oldest + self.max_delay - time.monotonic()
+                    if timeout <= 0:
+                        try:
+                            self._flush_locked()
+                        except sqlite3.Error as e:
+                            print(f"[usage_tracker] Flush failed, will retry: {e}")
+                        continue
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _queue(self, table: str, row: tuple) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("UsageWriter is closed")
+            # Look the list up under the lock: a flush swaps in a fresh one
+            (self._usage_rows if table == "usage_logs" else self._api_rows).append(row)
+            if self.max_rows is None:
+                return
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            pending = len(self._usage_rows) + len(self._api_rows)
+            if pending >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay:
+                self._flush_locked()
+                return
+        self._start_flusher()
+
+    def add_usage(
+        self,
+        session_key: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        tool_name: Optional[str] = None,
+        description: Optional[str] = None,
+        timestamp: Optional[str] = None
+    ) -> None:
+        """Queue a usage_logs row."""
+        self._queue("usage_logs", (
+            timestamp or _utc_timestamp(), session_key, model, input_tokens, output_tokens,
+            input_tokens + output_tokens, estimate_cost(model, input_tokens, output_tokens),
+            tool_name, description
+        ))
+
+    def add_api_call(
+        self,
+        api_name: str,
+        endpoint: str = "",
+        cost_usd: float = 0.0,
+        metadata: str = "",
+        timestamp: Optional[str] = None
+    ) -> None:
+        """Queue an api_calls row."""
+        self._queue("api_calls", (timestamp or _utc_timestamp(), api_name, endpoint, cost_usd, metadata))
+
+    def _flush_locked(self) -> int:
+        if not self._usage_rows and not self._api_rows:
+            return 0
+        usage_rows, self._usage_rows = self._usage_rows, []
+        api_rows, self._api_rows = self._api_rows, []
+        self._oldest = None
+        conn = self._connect()
+        try:
+            with conn:
+                if usage_rows:
+                    conn.executemany("""
+                        INSERT INTO usage_logs (timestamp, session_key, model, input_tokens, output_tokens,
+                                               total_tokens, estimated_cost_usd, tool_name, description)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, usage_rows)
+                if api_rows:
+                    conn.executemany("""
+                        INSERT INTO api_calls (timestamp, api_name, endpoint, cost_usd, metadata)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, api_rows)
+        except sqlite3.Error:
+            # Put the rows back so a later flush can retry them
+            self._usage_rows[:0] = usage_rows
+            self._api_rows[:0] = api_rows
+            self._oldest = time.monotonic()
+            raise
+        return len(usage_rows) + len(api_rows)
+
+    def flush(self) -> int:
+        """Write all queued rows now. Returns the number of rows written."""
+        with self._lock:
+            return self._flush_locked()
+
+    def discard(self) -> int:
+        """Drop all queued rows without writing them. Returns how many were dropped."""
+        with self._lock:
+            dropped = len(self._usage_rows) + len(self._api_rows)
+            self._usage_rows, self._api_rows = [], []
+            self._oldest = None
+            return dropped
+
+    def close(self) -> None:
+        """Flush queued rows and close the connection."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._flush_locked()
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+        self._wakeup.set()
+        atexit.unregister(self.close)
+
+
+def append_spool(spool_path, line: bytes) -> None:
+    """
+    Append one newline-terminated record to the spool file.
+
+    Holds an exclusive flock while writing and re-opens if the daemon
+    renamed the file away in between, so no record lands in a file that is
+    already being drained.
+    """
+    while True:
+        fd = os.open(spool_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.stat(spool_path)
+            except FileNotFoundError:
+                continue
+            if current.st_ino != os.fstat(fd).st_ino:
+                continue
+            os.write(fd, line)
+            return
+        finally:
+            os.close(fd)
+
+
+class IngestClient:
+    """
+    Sends usage rows to usage_ingestd.py as newline-delimited JSON over a
+    Unix socket. Has the same add_usage/add_api_call interface as
+    UsageWriter. While the daemon is unreachable, rows go to the spool file
+    and reconnects are retried at most every retry_delay seconds.
+    """
+
+    def __init__(self, socket_path, spool_path=None, retry_delay: float = 5.0):
+        self.socket_path = socket_path
+        self.spool_path = spool_path or SPOOL_PATH
+        self.retry_delay = retry_delay
+        self.spooled = 0
+        self._sock = None
+        self._next_retry = 0.0
+        self._lock = threading.Lock()
+
+    def _send(self, record: dict) -> None:
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._sock is None and time.monotonic() >= self._next_retry:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(str(self.socket_path))
+                    self._sock = sock
+                except OSError:
+                    sock.close()
+                    self._next_retry = time.monotonic() + self.retry_delay
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(line)
+                    return
+                except OSError:
+                    self._sock.close()
+                    self._sock = None
+                    self._next_retry = time.monotonic() + self.retry_delay
+            append_spool(self.spool_path, line)
+            self.spooled += 1
+
+    def add_usage(
+        self,
+        session_key: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        tool_name: Optional[str] = None,
+        description: Optional[str] = None
+    ) -> None:
+        self._send({
+            "type": "usage", "timestamp": _utc_timestamp(), "session_key": session_key,
+            "model": model, "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "tool_name": tool_name, "description": description,
+        })
+
+    def add_api_call(self, api_name: str, endpoint: str = "", cost_usd: float = 0.0, metadata: str = "") -> None:
+        self._send({
+            "type": "api", "timestamp": _utc_timestamp(), "api_name": api_name,
+            "endpoint": endpoint, "cost_usd": cost_usd, "metadata": metadata,
+        })
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+_writer: Optional[UsageWriter] = None
+_ingest_client: Optional[IngestClient] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> UsageWriter:
+    """Return the process-wide UsageWriter, creating it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer._closed:
+            _writer = UsageWriter()
+        return _writer
+
+
+def _get_sink():
+    """Where log_usage/log_api_call send rows: the ingest daemon if configured."""
+    global _ingest_client
+    if not INGEST_SOCKET:
+        return get_writer()
+    with _writer_lock:
+        if _ingest_client is None:
+            _ingest_client = IngestClient(INGEST_SOCKET)
+        return _ingest_client
+
+
 def log_usage(
     session_key: str,
     model: str,
@@ -44,42 +340,32 @@ def log_usage(
     tool_name: Optional[str] = None,
     description: Optional[str] = None
 ) -> None:
-    """Log a usage entry to the database."""
-    total_tokens = input_tokens + output_tokens
-    
-    # Calculate estimated cost
-    costs = MODEL_COSTS.get(model, {"input": 0.001, "output": 0.003})
-    estimated_cost = (input_tokens / 1000 * costs["input"]) + (output_tokens / 1000 * costs["output"])
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO usage_logs (session_key, model, input_tokens, output_tokens, total_tokens, 
-                               estimated_cost_usd, tool_name, description)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (session_key, model, input_tokens, output_tokens, total_tokens, 
-          estimated_cost, tool_name, description))
-    conn.commit()
-    conn.close()
+    """Log a usage entry (batched, via the ingest daemon or UsageWriter)."""
+    _get_sink().add_usage(session_key, model, input_tokens, output_tokens, tool_name, description)
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the usage database, creating or upgrading the schema if needed."""
+    return init_db(DB_PATH)
 
 
 def get_daily_stats(days: int = 7) -> list:
     """Get daily usage stats for the last N days."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT 
-            date(timestamp) as day,
-            COUNT(*) as requests,
+            day,
+            SUM(requests) as requests,
             SUM(input_tokens) as input_tokens,
             SUM(output_tokens) as output_tokens,
-            SUM(total_tokens) as total_tokens,
-            SUM(estimated_cost_usd) as cost_usd
-        FROM usage_logs
-        WHERE timestamp >= date('now', '-{} days')
-        GROUP BY date(timestamp)
+            SUM(input_tokens + output_tokens) as total_tokens,
+            SUM(cost) as cost_usd
+        FROM daily_usage_rollup
+        WHERE day >= date('now', ?)
+        GROUP BY day
         ORDER BY day DESC
-    """.format(days))
+    """, (f"-{int(days)} days",))
     results = cursor.fetchall()
     conn.close()
     return results
@@ -87,21 +373,21 @@ def get_daily_stats(days: int = 7) -> list:
 
 def get_model_stats(days: int = 7) -> list:
     """Get usage stats grouped by model."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT 
             model,
-            COUNT(*) as requests,
+            SUM(requests) as requests,
             SUM(input_tokens) as input_tokens,
             SUM(output_tokens) as output_tokens,
-            SUM(total_tokens) as total_tokens,
-            SUM(estimated_cost_usd) as cost_usd
-        FROM usage_logs
-        WHERE timestamp >= date('now', '-{} days')
+            SUM(input_tokens + output_tokens) as total_tokens,
+            SUM(cost) as cost_usd
+        FROM daily_usage_rollup
+        WHERE day >= date('now', ?)
         GROUP BY model
         ORDER BY total_tokens DESC
-    """.format(days))
+    """, (f"-{int(days)} days",))
     results = cursor.fetchall()
     conn.close()
     return results
@@ -109,16 +395,16 @@ def get_model_stats(days: int = 7) -> list:
 
 def get_total_stats() -> dict:
     """Get all-time totals."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT 
-            COUNT(*) as total_requests,
+            SUM(requests) as total_requests,
             SUM(input_tokens) as total_input,
             SUM(output_tokens) as total_output,
-            SUM(total_tokens) as total_tokens,
-            SUM(estimated_cost_usd) as total_cost
-        FROM usage_logs
+            SUM(input_tokens + output_tokens) as total_tokens,
+            SUM(cost) as total_cost
+        FROM daily_usage_rollup
     """)
     result = cursor.fetchone()
     conn.close()
@@ -190,31 +476,24 @@ def print_dashboard(days: int = 7):
 
 
 def log_api_call(api_name: str, endpoint: str = "", cost_usd: float = 0.0, metadata: str = "") -> None:
-    """Log an external API call."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO api_calls (api_name, endpoint, cost_usd, metadata)
-        VALUES (?, ?, ?, ?)
-    """, (api_name, endpoint, cost_usd, metadata))
-    conn.commit()
-    conn.close()
+    """Log an external API call (batched, via the ingest daemon or UsageWriter)."""
+    _get_sink().add_api_call(api_name, endpoint, cost_usd, metadata)
 
 
 def get_api_stats(days: int = 7) -> list:
     """Get API call stats for the last N days."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT 
             api_name,
-            COUNT(*) as calls,
-            SUM(cost_usd) as total_cost
-        FROM api_calls
-        WHERE timestamp >= date('now', '-{} days')
+            SUM(calls) as calls,
+            SUM(cost) as total_cost
+        FROM daily_api_rollup
+        WHERE day >= date('now', ?)
         GROUP BY api_name
         ORDER BY total_cost DESC
-    """.format(days))
+    """, (f"-{int(days)} days",))
     results = cursor.fetchall()
     conn.close()
     return results